@@ -4,6 +4,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from django.db.models import Count, Max
 from .models import ChatHistory, UserProfile
 
 
@@ -50,6 +51,7 @@ class CustomUserAdmin(UserAdmin):
         'is_active', 
         'date_joined_display',
         'get_total_queries',
+        'last_chat_display',
         'view_history_link'
     )
     list_filter = (
@@ -90,6 +92,13 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        """Chat count and last question computed in the list query, not per row"""
+        return super().get_queryset(request).annotate(
+            chat_count=Count('chat_history'),
+            last_chat=Max('chat_history__created_at')
+        )
+    
     def full_name_display(self, obj):
         """Display full name or N/A"""
         full_name = obj.get_full_name()
@@ -104,7 +113,7 @@ class CustomUserAdmin(UserAdmin):
     
     def get_total_queries(self, obj):
         """Get total queries with colored badge"""
-        count = obj.chat_history.count()
+        count = obj.chat_count
         if count > 100:
             color = 'green'
         elif count > 50:
@@ -120,10 +129,17 @@ class CustomUserAdmin(UserAdmin):
             color, count
         )
     get_total_queries.short_description = 'Questions'
+    get_total_queries.admin_order_field = 'chat_count'
+    
+    def last_chat_display(self, obj):
+        """Date of the user's last question"""
+        return obj.last_chat.strftime('%d/%m/%Y %H:%M') if obj.last_chat else '-'
+    last_chat_display.short_description = 'Dernière question'
+    last_chat_display.admin_order_field = 'last_chat'
     
     def view_history_link(self, obj):
         """Link to view all user's chat history"""
-        count = obj.chat_history.count()
+        count = obj.chat_count
         if count > 0:
             url = reverse('admin:chat_app_chathistory_changelist') + f'?user__id__exact={obj.id}'
             return format_html(
@@ -176,6 +192,7 @@ class ChatHistoryAdmin(admin.ModelAdmin):
         'response_length'
     )
     list_filter = ('created_at', 'user')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'query', 'response')
     date_hierarchy = 'created_at'
     readonly_fields = ('created_at', 'user', 'query', 'response')
@@ -231,6 +248,7 @@ class UserProfileAdmin(admin.ModelAdmin):
         'account_age'
     )
     list_filter = ('last_active',)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('last_active', 'total_queries')
     
@@ -1,81 +1,221 @@
 from django.apps import AppConfig
 from django.conf import settings
-import os
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
 
 
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat_app'
-    
+
+    # Readiness states of the chatbot components
+    NOT_LOADED = 'not_loaded'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    # Seconds before a failed initialization is attempted again
+    RETRY_AFTER = 30
+
     def ready(self):
-        """Initialize chatbot components when Django starts"""
+        """
+        Register signals only. The embedding model and Qdrant are loaded lazily on
+        first use (or by warm_up() from the web entry points), so management
+        commands never touch them.
+        """
         # Import signals to register them
         from . import models
-        
-        # Import here to avoid circular imports
-        from sentence_transformers import SentenceTransformer
+
+        self._init_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._client = None
+        self._embedding_model = None
+        self._collection_name = None
+        self._failed_at = None
+        self.qdrant_params = None
+        self.qdrant_copy_path = None
+        self.state = self.NOT_LOADED
+        self.error = None
+
+    # -------------------------
+    # Lazy components
+    # -------------------------
+    @property
+    def client(self):
+        self.ensure_ready()
+        return self._client
+
+    @property
+    def embedding_model(self):
+        self.ensure_ready()
+        return self._embedding_model
+
+    @property
+    def collection_name(self):
+        self.ensure_ready()
+        return self._collection_name
+
+    def ensure_ready(self, wait=True):
+        """
+        Initialize the components once (thread-safe). Returns True when ready.
+        With wait=False (request path), returns False at once while another
+        thread is loading them instead of waiting for it.
+        """
+        if self.state == self.READY:
+            return True
+        if self.state == self.FAILED and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+            return False
+        if not wait and self.state == self.LOADING:
+            return False
+
+        if not self._init_lock.acquire(blocking=wait):
+            return False
+        try:
+            if self.state != self.READY:
+                self._initialize()
+        finally:
+            self._init_lock.release()
+        return self.state == self.READY
+
+    def warm_up(self, background=False):
+        """Load the components ahead of the first request (used by web workers)"""
+        if background:
+            threading.Thread(target=self.ensure_ready, name='chatbot-warmup', daemon=True).start()
+        else:
+            self.ensure_ready()
+
+    def readiness(self):
+        return {
+            'state': self.state,
+            'error': self.error,
+            'collection': self._collection_name,
+        }
+
+    def get_async_client(self):
+        """
+        AsyncQdrantClient for the running event loop (one per loop, reused across requests).
+        None in embedded mode: the storage lock allows one client per process.
+        """
+        if self.client is None or self.qdrant_params is None:
+            return None
+        from qdrant_client import AsyncQdrantClient
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncQdrantClient(**self.qdrant_params)
+            self._async_clients[loop] = client
+        return client
+
+    def _initialize(self):
+        """Initialize chatbot components"""
+        # Import here to keep Django startup fast
         from qdrant_client import QdrantClient
         from qdrant_client.http.exceptions import ResponseHandlingException
-        from .utils import chunk_Embedd
-        
+        from .utils import chunk_Embedd, open_embedded_client, get_tokenizer
+        from .embedding import load_embedding_model
+
+        self.state = self.LOADING
+        self.error = None
+
         try:
-            print("Initializing ENSA Chatbot...")
-            
+            logger.info("Initializing ENSA Chatbot...")
+
             # Initialize embedding model
-            self.embedding_model = SentenceTransformer("dangvantuan/sentence-camembert-base")
-            print("Embedding model loaded")
-            
-            # Initialize Qdrant client (Cloud or Local)
-            if settings.QDRANT_USE_CLOUD:
-                print("Connecting to Qdrant Cloud...")
-                self.client = QdrantClient(
+            embedding_model = load_embedding_model(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND,
+                                                   settings.EMBEDDING_ONNX_DIR)
+            logger.info(f"Embedding model loaded ({settings.EMBEDDING_BACKEND} backend)")
+
+            # Initialize Qdrant client (Embedded, Cloud or Local)
+            if settings.QDRANT_MODE == 'embedded':
+                logger.info("Opening embedded Qdrant...")
+                self.qdrant_params = None
+                client, self.qdrant_copy_path = open_embedded_client(settings.QDRANT_PATH)
+                logger.info(f"Embedded Qdrant ready: {self.qdrant_copy_path or settings.QDRANT_PATH}")
+            elif settings.QDRANT_MODE == 'cloud':
+                logger.info("Connecting to Qdrant Cloud...")
+                self.qdrant_params = dict(
                     url=settings.QDRANT_URL,
                     api_key=settings.QDRANT_API_KEY,
                     timeout=60
                 )
-                print(f"Connected to Qdrant Cloud: {settings.QDRANT_URL}")
+                client = QdrantClient(**self.qdrant_params)
+                logger.info(f"Connected to Qdrant Cloud: {settings.QDRANT_URL}")
             else:
-                print("Connecting to Local Qdrant...")
-                self.client = QdrantClient(
-                    host=settings.QDRANT_HOST, 
+                logger.info("Connecting to Local Qdrant...")
+                self.qdrant_params = dict(
+                    host=settings.QDRANT_HOST,
                     port=settings.QDRANT_PORT
                 )
-                print(f"Connected to Local Qdrant: {settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
-            
-            self.collection_name = settings.COLLECTION_NAME
-            
+                client = QdrantClient(**self.qdrant_params)
+                logger.info(f"Connected to Local Qdrant: {settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
+
+            collection_name = settings.COLLECTION_NAME
+
             # Create or verify collection
             try:
-                collection_info = self.client.get_collection(self.collection_name)
-                print(f"Collection '{self.collection_name}' exists with {collection_info.points_count} points")
-            except Exception as e:
-                print(f"Collection not found. Creating new collection: {self.collection_name}")
+                collection_info = client.get_collection(collection_name)
+                logger.info(f"Collection '{collection_name}' exists with {collection_info.points_count} points")
+            except ResponseHandlingException:
+                raise
+            except Exception:
+                logger.info(f"Collection not found. Creating new collection: {collection_name}")
                 data_path = settings.DATA_DIR
-                chunk_Embedd(self.client, self.collection_name, self.embedding_model, data_path)
-                print("Collection created and data indexed successfully!")
-        
+                chunk_Embedd(client, collection_name, embedding_model, data_path,
+                             manifest_path=settings.INDEX_MANIFEST_PATH,
+                             lexical_index_path=settings.LEXICAL_INDEX_PATH,
+                             router_path=settings.ROUTER_PATH,
+                             quantization=settings.QDRANT_QUANTIZATION)
+                logger.info("Collection created and data indexed successfully!")
+
+            # Source documents served with the answers
+            from .sources import source_store
+            from .timetable import timetable_index
+            source_store.preload()
+            timetable_index.preload()
+
+            # Category centroids of the 'routed' search mode (None until the first re-index)
+            from .router import get_category_router
+            get_category_router()
+
+            # Tokenizer measuring the LLM context against CONTEXT_TOKEN_BUDGET
+            if settings.CONTEXT_TOKEN_BUDGET:
+                get_tokenizer()
+
+            # Cross-encoder loaded now rather than within the first query's rerank budget
+            if settings.RERANK_ENABLED:
+                from .rerank import get_reranker
+                get_reranker().preload()
+
+            self._embedding_model = embedding_model
+            self._client = client
+            self._collection_name = collection_name
+            self.state = self.READY
+            logger.info("ENSA Chatbot ready")
+
         except ResponseHandlingException as e:
-            print("=" * 70)
-            print("ERROR: Cannot connect to Qdrant!")
-            print("=" * 70)
+            logger.error("Cannot connect to Qdrant!")
             if settings.QDRANT_USE_CLOUD:
-                print("Qdrant Cloud connection failed.")
-                print("Check your QDRANT_URL and QDRANT_API_KEY in .env file")
+                logger.error("Qdrant Cloud connection failed. Check your QDRANT_URL and QDRANT_API_KEY in .env file")
             else:
-                print("Local Qdrant is not running. Start it with:")
-                print("  docker run -d -p 6333:6333 --name qdrant qdrant/qdrant")
-            print("=" * 70)
-            
-            # Set to None so views can check
-            self.client = None
-            self.embedding_model = None
-            self.collection_name = None
-            
+                logger.error("Local Qdrant is not running. Start it with: "
+                             "docker run -d -p 6333:6333 --name qdrant qdrant/qdrant")
+            self._fail(f"Cannot connect to Qdrant: {str(e)}")
+
         except Exception as e:
-            print(f"Error initializing chatbot: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            self.client = None
-            self.embedding_model = None
-            self.collection_name = None
\ No newline at end of file
+            logger.exception(f"Error initializing chatbot: {str(e)}")
+            self._fail(str(e))
+
+    def _fail(self, error):
+        # Components stay None so views can report the readiness state
+        self._client = None
+        self._embedding_model = None
+        self._collection_name = None
+        self.state = self.FAILED
+        self.error = error
+        self._failed_at = time.monotonic()
@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .utils import SECTION_CODES
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation before embedding"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+
+_ENTITY_RE = re.compile(r"[a-z]*\d+[a-z0-9]*")
+_SPACED_CODE_RE = re.compile(r"\b([a-z]{2,5})\s+(\d)\b")
+_ORDINALS = {"premiere": "1ere", "deuxieme": "2eme", "troisieme": "3eme"}
+# Letter part of the section codes ('gi', 'bdia', 'gscm', 'ap'...), also an entity without its year
+_SECTION_LETTERS = {re.sub(r"\d", "", code).lower() for code in SECTION_CODES}
+_DAYS = {"lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"}
+# The answer depends on the date the question is asked
+_RELATIVE_DAY_RE = re.compile(r"\b(aujourd ?hui|demain|hier|maintenant)\b")
+
+
+def _plain_words(query):
+    text = "".join(c for c in unicodedata.normalize("NFD", normalize_query(query))
+                   if unicodedata.category(c) != "Mn")
+    return [_ORDINALS.get(word, word) for word in re.findall(r"\w+", text)]
+
+
+def query_entities(query):
+    """
+    Section codes, numbers and weekdays of a query ('BDIA 1', '2ème année', 'S005', '10h', 'lundi'):
+    embeddings barely tell 'BDIA1' from 'BDIA2', so a cached answer must share them exactly
+    """
+    text = _SPACED_CODE_RE.sub(r"\1\2", " ".join(_plain_words(query)))
+    words = set(text.split())
+    return frozenset(_ENTITY_RE.findall(text)) | (_SECTION_LETTERS & words) | (_DAYS & words)
+
+
+def is_cacheable(query):
+    """False for questions relative to the current date ('aujourd'hui', 'demain'...)"""
+    return not _RELATIVE_DAY_RE.search(" ".join(_plain_words(query)))
+
+
+def embed_query(embedding_model, query):
+    """Unit-length embedding of the normalized query, used as the cache key"""
+    vector = np.asarray(embedding_model.encode(normalize_query(query)), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class SemanticCache:
+    """
+    In-memory answer cache keyed on normalized query embeddings.
+
+    A lookup is a hit when the cosine similarity between the query embedding
+    and a cached one reaches `threshold` and both queries mention the same
+    section codes, numbers and weekdays (query_entities). Entries expire after `ttl` seconds
+    and the least recently used entry is evicted once `max_entries` is reached.
+    When `index_stamp_path` (the index manifest) changes on disk, e.g. after a
+    re-index from another process, the whole cache is dropped.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000, index_stamp_path=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_stamp_path = index_stamp_path
+        self._index_stamp = self._read_index_stamp()
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_id = 0
+        # Stacked embeddings of the current entries, rebuilt lazily after writes
+        self._keys = []
+        self._matrix = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.entity_mismatches = 0
+
+    # -------------------------
+    # Internal helpers
+    # -------------------------
+    def _read_index_stamp(self):
+        if not self.index_stamp_path:
+            return None
+        try:
+            return os.stat(self.index_stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_index_stamp(self):
+        stamp = self._read_index_stamp()
+        if stamp != self._index_stamp:
+            self._index_stamp = stamp
+            if self._entries:
+                self._entries.clear()
+                self._matrix = None
+                self.invalidations += 1
+
+    def _purge_expired(self, now):
+        expired = [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _ensure_matrix(self):
+        if self._matrix is None and self._entries:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[k]["embedding"] for k in self._keys])
+
+    # -------------------------
+    # Public API
+    # -------------------------
+    def lookup(self, embedding, query):
+        """Return the closest cached entry for `query` (its normalized `embedding`), or None on a miss"""
+        entities = query_entities(query)
+        with self._lock:
+            self._check_index_stamp()
+            self._purge_expired(time.monotonic())
+            self._ensure_matrix()
+
+            if self._entries:
+                scores = self._matrix @ embedding
+                for best in np.argsort(-scores):
+                    if scores[best] < self.threshold:
+                        break
+                    key = self._keys[best]
+                    if self._entries[key]["entities"] != entities:
+                        # Same wording for another section, year, room or hour
+                        self.entity_mismatches += 1
+                        continue
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding, response, sources, query):
+        """Cache a generated answer for `query` and the source paths it was built from"""
+        if embedding is None or not response:
+            return
+        with self._lock:
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+            self._entries[self._next_id] = {
+                "embedding": np.asarray(embedding, dtype=np.float32),
+                "response": response,
+                "sources": list(sources),
+                "entities": query_entities(query),
+                "created_at": time.monotonic(),
+            }
+            self._next_id += 1
+            self._matrix = None
+
+    def invalidate(self):
+        """Drop every entry (called when the Qdrant collection is re-indexed)"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entity_mismatches": self.entity_mismatches,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+semantic_cache = SemanticCache(
+    threshold=getattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.95),
+    ttl=getattr(settings, "SEMANTIC_CACHE_TTL", 3600),
+    max_entries=getattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 1000),
+    index_stamp_path=getattr(settings, "INDEX_MANIFEST_PATH", None),
+)
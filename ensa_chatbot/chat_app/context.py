@@ -0,0 +1,161 @@
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+
+# One retrieved chunk; score is None when the ranking has no comparable score
+# (rank fusion, LangChain retrievers) and the given order is kept
+ContextChunk = namedtuple("ContextChunk", ["text", "source", "part", "score"])
+
+HEADER_RE = re.compile(r"^Cela concerne: (.*?)\n\n", re.DOTALL)
+PARAPHRASE_SUFFIX = "_reph"
+
+_WORD_RE = re.compile(r"[\w&]+", re.UNICODE)
+
+
+def chunk_from_payload(payload, score=None):
+    return ContextChunk(payload.get("chunk", ""), payload.get("source"), payload.get("part"), score)
+
+
+def _content_words(text):
+    text = "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+    return {w for w in _WORD_RE.findall(text) if len(w) > 3}
+
+
+def _document_family(source, header):
+    """'clubs/les clubs de l'ecole_reph.txt' and its original share one family"""
+    name = os.path.splitext(os.path.basename((source or header or "").replace("\\", "/")))[0]
+    if name.endswith(PARAPHRASE_SUFFIX):
+        name = name[:-len(PARAPHRASE_SUFFIX)]
+    return name.lower()
+
+
+def _overlap(a, b):
+    """Overlap coefficient of two word sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _trim_window_overlap(previous, text, min_chars=20, max_chars=400):
+    """Drop the start of `text` that repeats the end of `previous` (splitter chunk_overlap)"""
+    for size in range(min(len(previous), len(text), max_chars), min_chars - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+
+class _Candidate:
+    def __init__(self, chunk, rank):
+        match = HEADER_RE.match(chunk.text)
+        self.header = match.group(1) if match else None
+        self.body = chunk.text[match.end():] if match else chunk.text
+        self.source = chunk.source
+        self.part = chunk.part
+        self.rank = rank
+        self.family = _document_family(chunk.source, self.header)
+        self.words = _content_words(self.body)
+        self.tokens = 0
+
+
+def build_context(chunks, token_budget, tokenizer=None, sibling_overlap=0.5, duplicate_overlap=0.8):
+    """
+    Pack retrieved chunks into the LLM context, best first, within `token_budget`
+    tokens of the embedding tokenizer.
+
+    - chunks are taken by descending score (or in the given order);
+    - a chunk whose words mostly repeat a kept chunk is dropped: over
+      `sibling_overlap` within one document and its _reph paraphrase, over
+      `duplicate_overlap` across documents;
+    - the overlapping window shared with the neighbouring part of the same file
+      is cut;
+    - chunks are grouped under a single "Cela concerne:" header per document,
+      in reading order.
+
+    Returns (context, stats).
+    """
+    if tokenizer is None:
+        from .utils import get_tokenizer
+        tokenizer = get_tokenizer()
+
+    def count(text):
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    ordered = list(chunks)
+    if ordered and all(c.score is not None for c in ordered):
+        ordered.sort(key=lambda c: c.score, reverse=True)
+
+    kept = []
+    headers = set()
+    used = 0
+    duplicates = 0
+    over_budget = 0
+    for rank, chunk in enumerate(ordered):
+        candidate = _Candidate(chunk, rank)
+        if not candidate.body.strip():
+            continue
+
+        is_duplicate = False
+        # Kept chunks to shorten, applied only once the candidate itself is kept
+        trims = []
+        for other in kept:
+            if other.source and other.source == candidate.source and other.part is not None \
+                    and candidate.part is not None and abs(other.part - candidate.part) == 1:
+                first, second = (other, candidate) if other.part < candidate.part else (candidate, other)
+                trimmed = _trim_window_overlap(first.body, second.body)
+                if second is candidate:
+                    candidate.body = trimmed
+                elif trimmed != other.body:
+                    # The kept chunk comes second: cut the shared window from it instead
+                    trims.append((other, trimmed, count(trimmed)))
+                # Neighbouring windows of one file are complementary, not duplicates
+                continue
+            threshold = sibling_overlap if other.family == candidate.family else duplicate_overlap
+            if _overlap(candidate.words, other.words) >= threshold:
+                is_duplicate = True
+                break
+        if is_duplicate:
+            duplicates += 1
+            continue
+
+        header_tokens = 0
+        if candidate.header is not None and candidate.header not in headers:
+            header_tokens = count(f"Cela concerne: {candidate.header}\n\n")
+        candidate.tokens = count(candidate.body)
+        saved = sum(other.tokens - tokens for other, _, tokens in trims)
+        remaining = token_budget - used + saved - header_tokens
+        if candidate.tokens > remaining:
+            if kept or remaining <= 0:
+                over_budget += 1
+                continue
+            # Even the best chunk is too long: keep its beginning
+            ids = tokenizer.encode(candidate.body, add_special_tokens=False)[:remaining]
+            candidate.body = tokenizer.decode(ids)
+            candidate.tokens = remaining
+
+        for other, trimmed, tokens in trims:
+            other.body = trimmed
+            other.tokens = tokens
+        kept.append(candidate)
+        headers.add(candidate.header)
+        used += header_tokens + candidate.tokens - saved
+
+    # One block per document, documents by their best chunk, parts in reading order
+    groups = {}
+    for candidate in kept:
+        groups.setdefault(candidate.header, []).append(candidate)
+    blocks = []
+    for header, members in groups.items():
+        members.sort(key=lambda c: (c.source or "", c.part if c.part is not None else c.rank))
+        body = "\n".join(c.body.strip() for c in members)
+        blocks.append(f"Cela concerne: {header}\n\n{body}" if header is not None else body)
+    context = "\n---\n".join(blocks)
+
+    return context, {
+        "candidates": len(ordered),
+        "kept": len(kept),
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "tokens": used,
+    }
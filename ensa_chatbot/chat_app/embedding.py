@@ -0,0 +1,165 @@
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+# Dynamic int8 ONNX export; AVX2 runs on every x86 web node we have
+ONNX_QUANTIZATION = "avx2"
+ONNX_INT8_FILE = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+
+
+def load_embedding_model(model_name=None, backend=None, export_dir=None):
+    """
+    SentenceTransformer for CPU inference with the selected backend.
+    Every backend exposes the same encode() API, so Search, the semantic cache
+    and chunk_Embedd are unchanged.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if model_name is None or backend is None or export_dir is None:
+        from django.conf import settings
+        model_name = model_name or settings.EMBEDDING_MODEL
+        backend = backend or settings.EMBEDDING_BACKEND
+        export_dir = export_dir or settings.EMBEDDING_ONNX_DIR
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+
+    if backend == "int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    if backend == "onnx":
+        _require_onnxruntime(backend)
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+    if backend == "onnx-int8":
+        _require_onnxruntime(backend)
+        local_dir = _export_onnx_int8(model_name, Path(export_dir))
+        return SentenceTransformer(str(local_dir), device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": ONNX_INT8_FILE})
+
+    raise ValueError(f"Unknown embedding backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+
+def _require_onnxruntime(backend):
+    """The ONNX backends need optimum[onnxruntime], an optional dependency"""
+    try:
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured(
+            f"EMBEDDING_BACKEND='{backend}' needs ONNX Runtime: pip install \"optimum[onnxruntime]\" "
+            f"(see requirements.txt), or use the 'torch' or 'int8' backend"
+        ) from e
+
+
+def _export_onnx_int8(model_name, export_dir):
+    """Export and quantize the model once; concurrent workers export to a temp dir then rename"""
+    local_dir = export_dir / model_name.replace("/", "__")
+    if (local_dir / ONNX_INT8_FILE).exists():
+        return local_dir
+
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    logger.info(f"Exporting int8 ONNX model for {model_name} (first run only)...")
+    tmp_dir = export_dir / f"{local_dir.name}.tmp-{os.getpid()}"
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save(str(tmp_dir))
+    export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, str(tmp_dir))
+
+    try:
+        os.rename(tmp_dir, local_dir)
+    except OSError:
+        # Another worker finished first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return local_dir
+
+
+# -------------------------
+#   Backend comparison
+# -------------------------
+def rss_mb():
+    """Resident memory of the current process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_backend(backend, model_name, export_dir, queries, corpus, batch_size=64):
+    """
+    Load one backend and measure it. Meant to run in a fresh process so the
+    resident memory reflects this backend only.
+    """
+    baseline = rss_mb()
+    t0 = time.perf_counter()
+    model = load_embedding_model(model_name, backend, export_dir)
+    load_s = time.perf_counter() - t0
+
+    for query in queries[:3]:
+        model.encode(query)
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        t0 = time.perf_counter()
+        query_vectors.append(model.encode(query))
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    corpus_vectors = model.encode(corpus, batch_size=batch_size, show_progress_bar=False)
+    batch_s = time.perf_counter() - t0
+
+    latencies = np.array(latencies)
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "rss_mb": round(rss_mb() - baseline, 1),
+        "query_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "query_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "batch_texts_per_s": round(len(corpus) / batch_s, 1),
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+        "corpus_vectors": np.asarray(corpus_vectors, dtype=np.float32),
+    }
+
+
+def _unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def vector_agreement(reference, candidate, top_k=3):
+    """
+    How far a backend drifts from the reference vectors (the ones in Qdrant):
+    per-text cosine, and overlap of the top-k neighbours found when the
+    candidate's query vectors search the reference corpus vectors.
+    """
+    ref_q, cand_q = _unit(reference["query_vectors"]), _unit(candidate["query_vectors"])
+    ref_c, cand_c = _unit(reference["corpus_vectors"]), _unit(candidate["corpus_vectors"])
+
+    cosines = np.concatenate([(ref_q * cand_q).sum(axis=1), (ref_c * cand_c).sum(axis=1)])
+
+    ref_top = np.argsort(-(ref_q @ ref_c.T), axis=1)[:, :top_k]
+    cand_top = np.argsort(-(cand_q @ ref_c.T), axis=1)[:, :top_k]
+    overlap = [len(set(a) & set(b)) / top_k for a, b in zip(ref_top, cand_top)]
+
+    return {
+        "cosine_min": round(float(cosines.min()), 5),
+        "cosine_mean": round(float(cosines.mean()), 5),
+        f"top{top_k}_overlap": round(float(np.mean(overlap)), 4),
+    }
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from .utils import Search, get_tokenizer, query_keywords
+
+
+def load_qa_pairs(path, limit=None):
+    """Read (question, answer) pairs from a fine-tuning .jsonl file"""
+    pairs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            pairs.append((row["instruction"], row["output"]))
+            if limit and len(pairs) >= limit:
+                break
+    return pairs
+
+
+def document_key(source):
+    """
+    Identify a document independently of its format/paraphrase:
+    '.../GI1.json' and '.../GI1_reph.txt' both map to 'GI1'.
+    """
+    name = os.path.splitext(os.path.basename(source.replace("\\", "/")))[0]
+    return name[:-len("_reph")] if name.endswith("_reph") else name
+
+
+def load_documents(data_path):
+    """Map document_key → concatenated text of every file of that document"""
+    docs = {}
+    for root, _, files in os.walk(data_path):
+        for file_name in files:
+            if not file_name.endswith((".txt", ".json")):
+                continue
+            with open(os.path.join(root, file_name), "r", encoding="utf-8") as f:
+                text = f.read()
+            key = document_key(file_name)
+            docs[key] = docs.get(key, "") + "\n" + text
+    return docs
+
+
+def label_gold_sources(pairs, documents):
+    """
+    The QA sets carry no source, so the gold document of a pair is the one
+    whose vocabulary best covers the answer (IDF-weighted keyword overlap).
+    """
+    vocab = {key: set(query_keywords(text)) for key, text in documents.items()}
+    df = Counter(w for words in vocab.values() for w in words)
+    n_docs = len(vocab)
+
+    gold = []
+    for question, answer in pairs:
+        words = set(query_keywords(f"{question} {answer}"))
+        best_key, best_score = None, 0.0
+        for key, doc_words in vocab.items():
+            score = sum(math.log(n_docs / df[w]) for w in words & doc_words)
+            if score > best_score:
+                best_key, best_score = key, score
+        gold.append(best_key)
+    return gold
+
+
+def evaluate_mode(pairs, gold, client, collection_name, embedding_model, mode,
+                  groq_keys=None, top_k=3, **search_kwargs):
+    """
+    Run every question through Search(mode) and measure recall@k, MRR, latency
+    percentiles, sequential throughput and the size of the LLM context in tokens.
+    A question whose Search() raised counts as a miss in recall@k and MRR;
+    recall@k_answered leaves those questions out.
+    Extra keyword arguments go to Search().
+    """
+    tokenizer = get_tokenizer()
+    latencies = []
+    context_tokens = []
+    hits = 0
+    reciprocal_ranks = []
+    errors = 0
+
+    started = time.perf_counter()
+    for (question, _), gold_key in zip(pairs, gold):
+        t0 = time.perf_counter()
+        try:
+            context, sources = Search(question, client, collection_name, embedding_model,
+                                groq_keys=groq_keys, mode=mode, top_k=top_k, **search_kwargs)
+        except Exception:
+            errors += 1
+            reciprocal_ranks.append(0.0)
+            continue
+        latencies.append(time.perf_counter() - t0)
+        context_tokens.append(len(tokenizer.encode(context, add_special_tokens=False)))
+
+        ranked = [document_key(s) for s in sources if s][:top_k]
+        if gold_key in ranked:
+            hits += 1
+            reciprocal_ranks.append(1.0 / (ranked.index(gold_key) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+
+    wall = time.perf_counter() - started
+    answered = len(latencies)
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "mode": mode,
+        "questions": len(pairs),
+        "errors": errors,
+        f"recall@{top_k}": round(hits / len(pairs), 4) if pairs else 0.0,
+        f"recall@{top_k}_answered": round(hits / answered, 4) if answered else 0.0,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else 0.0,
+        "latency_ms_mean": round(float(lat_ms.mean()), 2),
+        "latency_ms_p50": round(float(np.percentile(lat_ms, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(lat_ms, 95)), 2),
+        "latency_ms_p99": round(float(np.percentile(lat_ms, 99)), 2),
+        "qps": round(answered / wall, 2) if wall else 0.0,
+        "context_tokens_mean": round(float(np.mean(context_tokens)), 1) if context_tokens else 0.0,
+    }
+
+
+# -------------------------
+#   Query routing
+# -------------------------
+TIMETABLE_CATEGORY = "emploi du temps"
+
+
+def document_categories(data_path):
+    """
+    Map document_key → `categorie` payloads of its files, derived like the loaders:
+    'emploi du temps' for the JSON schedules, the folder name for .txt files.
+    """
+    categories = {}
+    for root, _, files in os.walk(data_path):
+        for file_name in files:
+            if file_name.endswith(".json"):
+                category = TIMETABLE_CATEGORY
+            elif file_name.endswith(".txt"):
+                category = os.path.basename(root) or "txt"
+            else:
+                continue
+            categories.setdefault(document_key(file_name), set()).add(category)
+    return categories
+
+
+def _routing_result(name, predictions, gold_categories, latencies, errors, unit_scale):
+    """Coverage, accuracy and latency of category predictions (an empty prediction = no filter)"""
+    routed = [(p, g) for p, g in zip(predictions, gold_categories) if p]
+    correct = sum(1 for p, g in routed if set(p) & g)
+    lat = np.array(latencies) * unit_scale if latencies else np.zeros(1)
+    return {
+        "router": name,
+        "questions": len(gold_categories),
+        "errors": errors,
+        "coverage": round(len(routed) / len(predictions), 4) if predictions else 0.0,
+        "accuracy": round(correct / len(routed), 4) if routed else 0.0,
+        # Share of questions whose filter excludes the gold document
+        "misrouted": round((len(routed) - correct) / len(predictions), 4) if predictions else 0.0,
+        "latency_p50": round(float(np.percentile(lat, 50)), 3),
+        "latency_p95": round(float(np.percentile(lat, 95)), 3),
+        "latency_p99": round(float(np.percentile(lat, 99)), 3),
+    }
+
+
+def evaluate_router(pairs, gold_categories, embedding_model, router):
+    """
+    Predict the category of every question with the local router.
+    Latency (µs) covers routing only: the query embedding is shared with the search.
+    """
+    embeddings = embedding_model.encode(
+        [question for question, _ in pairs], convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=False
+    )
+    predictions = []
+    latencies = []
+    for embedding in embeddings:
+        t0 = time.perf_counter()
+        categories, _ = router.route(embedding)
+        latencies.append(time.perf_counter() - t0)
+        predictions.append(categories)
+    return _routing_result("centroid", predictions, gold_categories, latencies, 0, 1e6)
+
+
+def _filter_categories(node):
+    """`categorie` values compared in a self-query filter (Comparison/Operation tree)"""
+    if node is None:
+        return []
+    if hasattr(node, "arguments"):
+        return [c for argument in node.arguments for c in _filter_categories(argument)]
+    if getattr(node, "attribute", None) == "categorie":
+        value = node.value
+        return [str(v) for v in value] if isinstance(value, (list, tuple)) else [str(value)]
+    return []
+
+
+def evaluate_self_query(pairs, gold_categories, retriever):
+    """
+    Run the LLM query constructor of a SelfQueryRetriever on every question and
+    read the `categorie` filter it infers. Latency (ms) is the LLM call.
+    """
+    predictions = []
+    latencies = []
+    errors = 0
+    for question, _ in pairs:
+        t0 = time.perf_counter()
+        try:
+            structured = retriever.query_constructor.invoke({"query": question})
+        except Exception:
+            errors += 1
+            predictions.append([])
+            continue
+        latencies.append(time.perf_counter() - t0)
+        predictions.append(_filter_categories(structured.filter))
+    return _routing_result("self-query", predictions, gold_categories, latencies, errors, 1e3)
@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Groq reset headers look like '2m59.56s', '7.66s' or '120ms' → seconds"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(str(value))
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+class GroqKeyPool:
+    """
+    Load-balances Groq calls across API keys.
+
+    Keys are ordered by in-flight requests then total usage, so traffic is
+    spread instead of always hitting key #1. Rate-limit headers and 429s put a
+    key in cooldown until its reset time; cooling keys are only tried once all
+    healthy keys have failed. `None` keys (unset env variables) are skipped.
+    """
+
+    def __init__(self, keys, default_cooldown=60):
+        self.default_cooldown = default_cooldown
+        self._lock = threading.Lock()
+        self._keys = []
+        self._state = {}
+        for key in keys:
+            if key and key not in self._state:
+                self._keys.append(key)
+                self._state[key] = {
+                    "requests": 0,
+                    "in_flight": 0,
+                    "successes": 0,
+                    "errors": 0,
+                    "rate_limited": 0,
+                    "cooldown_until": 0.0,
+                    "remaining_requests": None,
+                    "remaining_tokens": None,
+                }
+
+    def __len__(self):
+        return len(self._keys)
+
+    def label(self, key):
+        """Position of the key in settings (#1..#8), never the key itself"""
+        return f"#{self._keys.index(key) + 1}"
+
+    def candidates(self):
+        """Keys in the order they should be tried for the next request"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [k for k in self._keys if self._state[k]["cooldown_until"] <= now]
+            cooling = [k for k in self._keys if self._state[k]["cooldown_until"] > now]
+            healthy.sort(key=lambda k: (self._state[k]["in_flight"], self._state[k]["requests"]))
+            cooling.sort(key=lambda k: self._state[k]["cooldown_until"])
+            return healthy + cooling
+
+    @contextmanager
+    def using(self, key):
+        """Count the key as in flight for the duration of the call"""
+        with self._lock:
+            state = self._state[key]
+            state["requests"] += 1
+            state["in_flight"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                state["in_flight"] -= 1
+
+    def _apply_headers(self, state, headers):
+        if not headers:
+            return
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            state["remaining_requests"] = int(float(remaining_requests))
+        if remaining_tokens is not None:
+            state["remaining_tokens"] = int(float(remaining_tokens))
+
+        # Quota exhausted: cool down until the window resets
+        if state["remaining_requests"] == 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests")) or self.default_cooldown
+            state["cooldown_until"] = max(state["cooldown_until"], time.monotonic() + reset)
+        elif state["remaining_tokens"] == 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-tokens")) or self.default_cooldown
+            state["cooldown_until"] = max(state["cooldown_until"], time.monotonic() + reset)
+
+    def record_success(self, key, headers=None):
+        with self._lock:
+            state = self._state[key]
+            state["successes"] += 1
+            self._apply_headers(state, headers)
+
+    def record_rate_limit(self, key, headers=None):
+        with self._lock:
+            state = self._state[key]
+            state["rate_limited"] += 1
+            self._apply_headers(state, headers)
+            retry_after = parse_duration(headers.get("retry-after")) if headers else None
+            cooldown = retry_after or self.default_cooldown
+            state["cooldown_until"] = max(state["cooldown_until"], time.monotonic() + cooldown)
+
+    def record_error(self, key):
+        with self._lock:
+            self._state[key]["errors"] += 1
+
+    def stats(self):
+        """Per-key counters, keys identified by their position only (see label)"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": f"#{i + 1}",
+                    "requests": s["requests"],
+                    "in_flight": s["in_flight"],
+                    "successes": s["successes"],
+                    "errors": s["errors"],
+                    "rate_limited": s["rate_limited"],
+                    "remaining_requests": s["remaining_requests"],
+                    "remaining_tokens": s["remaining_tokens"],
+                    "cooldown_seconds": round(max(0.0, s["cooldown_until"] - now), 1),
+                }
+                for i, (key, s) in enumerate((k, self._state[k]) for k in self._keys)
+            ]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_key_pool(keys):
+    """Shared pool for a list of keys (or a single key string), one per process"""
+    if isinstance(keys, str):
+        keys = [keys]
+    pool_key = tuple(keys or ())
+    pool = _pools.get(pool_key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(pool_key)
+            if pool is None:
+                pool = GroqKeyPool(pool_key)
+                _pools[pool_key] = pool
+    return pool
@@ -0,0 +1,124 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+
+from .utils import strip_accents, FRENCH_STOPWORDS
+
+
+# Same shape as the Qdrant ScoredPoint fields used by Search()
+LexicalHit = namedtuple("LexicalHit", ["id", "score", "payload"])
+
+# Underscores split tokens so 'BDIA1_reph' in file names still yields 'bdia1'
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def lexical_tokens(text):
+    """Lowercased, accent-free tokens; keeps codes such as '2ap1', 'bdia1', 's105'"""
+    words = _TOKEN_RE.findall(strip_accents(text.lower()))
+    return [w for w in words if w not in FRENCH_STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the chunks stored in Qdrant.
+    Built by chunk_Embedd at index time and persisted next to the index manifest.
+    """
+
+    def __init__(self, ids, payloads, doc_lengths, postings, k1=1.5, b=0.75):
+        self.ids = ids
+        self.payloads = payloads
+        self.doc_lengths = doc_lengths
+        self.postings = postings  # term → [[doc_index, term_frequency], ...]
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(ids)
+        self.avg_length = sum(doc_lengths) / n_docs if n_docs else 0.0
+        # BM25 length normalisation, precomputed per document
+        self.norms = [
+            k1 * (1 - b + b * length / self.avg_length) if self.avg_length else k1
+            for length in doc_lengths
+        ]
+        self.idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def build(cls, ids, texts, payloads):
+        postings = {}
+        doc_lengths = []
+        for doc_index, text in enumerate(texts):
+            tokens = lexical_tokens(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([doc_index, tf])
+        return cls(list(ids), list(payloads), doc_lengths, postings)
+
+    def search(self, query, limit=10, where=None):
+        """Return the `limit` best LexicalHit for the query; `where` filters on the payload"""
+        scores = {}
+        for term in set(lexical_tokens(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_index, tf in plist:
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.norms[doc_index])
+
+        if where is not None:
+            scores = {i: score for i, score in scores.items() if where(self.payloads[i])}
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [LexicalHit(self.ids[i], scores[i], self.payloads[i]) for i in best]
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": self.ids,
+                "payloads": self.payloads,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["payloads"], data["doc_lengths"], data["postings"])
+
+
+# -------------------------
+#   Process-wide index
+# -------------------------
+_index_lock = threading.Lock()
+_index = None
+_index_mtime = None
+
+
+def get_lexical_index(path=None):
+    """
+    Load the persisted BM25 index once per process.
+    Reloaded automatically when the file is rewritten by a re-index.
+    Returns None if the index has not been built yet.
+    """
+    global _index, _index_mtime
+    if path is None:
+        from django.conf import settings
+        path = settings.LEXICAL_INDEX_PATH
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    if _index is None or mtime != _index_mtime:
+        with _index_lock:
+            if _index is None or mtime != _index_mtime:
+                _index = BM25Index.load(path)
+                _index_mtime = mtime
+    return _index
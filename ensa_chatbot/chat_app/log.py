@@ -0,0 +1,31 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    Logging handler for the request path: records are put on an in-memory queue
+    and a listener thread writes them to the stream, so a view never blocks on
+    stdout. Used from the LOGGING setting.
+    """
+
+    def __init__(self, stream=None, format=None, max_queue=10000):
+        log_queue = queue.Queue(maxsize=max_queue)
+        super().__init__(log_queue)
+
+        target = logging.StreamHandler(stream or sys.stderr)
+        if format:
+            target.setFormatter(logging.Formatter(format))
+        self.listener = QueueListener(log_queue, target, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record):
+        # A full queue drops the record rather than stalling the request
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection
+
+from chat_app.models import ChatHistory, UserProfile
+from chat_app.persistence import ChatWriter, record_chat
+
+
+BENCH_USER_PREFIX = 'bench_chat_'
+
+
+def legacy_write(user_id, query, response, sources, sources_json):
+    """Previous path: INSERT, then COUNT + profile save twice (signal and view)"""
+    ChatHistory.objects.bulk_create([ChatHistory(user_id=user_id, query=query, response=response,
+                                                 sources=sources, sources_json=sources_json)])
+    for _ in range(2):
+        profile = UserProfile.objects.get(user_id=user_id)
+        profile.total_queries = ChatHistory.objects.filter(user_id=user_id).count()
+        profile.save()
+
+
+class Command(BaseCommand):
+    help = 'Mesurer le débit d\'écriture de l\'historique de chat sous utilisateurs simultanés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Utilisateurs simultanés (défaut: 20)')
+        parser.add_argument('--chats', type=int, default=25, help='Échanges par utilisateur (défaut: 25)')
+        parser.add_argument(
+            '--strategies',
+            type=str,
+            default='legacy,direct,batched',
+            help='Stratégies comparées: legacy (COUNT + save), direct (INSERT + F()), batched (écrivain en arrière-plan)',
+        )
+
+    def handle(self, *args, **options):
+        users = [
+            User.objects.create_user(username=f'{BENCH_USER_PREFIX}{i}', password=None)
+            for i in range(options['users'])
+        ]
+        response = 'Réponse de test. ' * 40
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 80))
+        self.stdout.write(self.style.SUCCESS(
+            f'ÉCRITURES DE CHAT - {len(users)} utilisateurs x {options["chats"]} échanges'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+
+        try:
+            for strategy in [s.strip() for s in options['strategies'].split(',') if s.strip()]:
+                writer = ChatWriter() if strategy == 'batched' else None
+                write = {
+                    'legacy': legacy_write,
+                    'direct': record_chat,
+                    'batched': writer.submit if writer else None,
+                }[strategy]
+
+                def simulate_user(user):
+                    latencies = []
+                    try:
+                        for n in range(options['chats']):
+                            t0 = time.perf_counter()
+                            write(user.id, f'Question {n}', response, 'emploi-temps/GI1.json', ['GI1.json'])
+                            latencies.append((time.perf_counter() - t0) * 1000)
+                    finally:
+                        connection.close()
+                    return latencies
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=len(users)) as executor:
+                    latencies = np.concatenate(list(executor.map(simulate_user, users)))
+                if writer:
+                    writer.flush()
+                wall = time.perf_counter() - started
+
+                total = len(users) * options['chats']
+                counted = sum(UserProfile.objects.filter(user__in=users).values_list('total_queries', flat=True))
+                self.stdout.write(
+                    f'{strategy:8s} | {total / wall:8.1f} écritures/s | '
+                    f'latence appelant p50: {np.percentile(latencies, 50):7.2f} ms '
+                    f'p95: {np.percentile(latencies, 95):7.2f} ms | '
+                    f'compteurs: {counted}/{total}'
+                )
+
+                ChatHistory.objects.filter(user__in=users).delete()
+                UserProfile.objects.filter(user__in=users).update(total_queries=0)
+        finally:
+            User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+
+        self.stdout.write('=' * 80 + '\n')
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from chat_app.embedding import BACKENDS, measure_backend, vector_agreement
+from chat_app.evaluation import load_qa_pairs
+
+
+DEFAULT_QUESTIONS = settings.BASE_DIR.parent / 'fine_tuning' / 'fine_tuning_data' / 'fine_tuning_Data_v2' / 'test.jsonl'
+
+
+def load_corpus_sample(data_path, size, chunk_chars=1500):
+    """Chunk-sized passages taken from the documents, for the batch throughput test"""
+    passages = []
+    for root, _, files in sorted(os.walk(data_path)):
+        for file_name in sorted(files):
+            if not file_name.endswith(".txt"):
+                continue
+            with open(os.path.join(root, file_name), "r", encoding="utf-8") as f:
+                text = f.read()
+            passages.extend(text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars))
+            if len(passages) >= size:
+                return passages[:size]
+    return passages
+
+
+class Command(BaseCommand):
+    help = 'Comparer les backends d\'embedding CPU (latence, débit, mémoire, compatibilité des vecteurs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            type=str,
+            default=','.join(BACKENDS),
+            help=f'Backends comparés, séparés par des virgules (défaut: {",".join(BACKENDS)})',
+        )
+        parser.add_argument('--questions', type=str, default=str(DEFAULT_QUESTIONS))
+        parser.add_argument('--queries', type=int, default=200, help='Nombre de requêtes encodées une à une')
+        parser.add_argument('--corpus', type=int, default=256, help='Nombre de passages encodés par lots')
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.99,
+            help='Cosinus minimal avec le backend torch pour rester compatible avec la collection (défaut: 0.99)',
+        )
+
+    def handle(self, *args, **options):
+        backends = [b.strip() for b in options['backends'].split(',') if b.strip()]
+        unknown = set(backends) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f'Backend inconnu: {", ".join(sorted(unknown))}')
+        # The collection was indexed with torch: it is always the reference
+        if 'torch' not in backends:
+            backends.insert(0, 'torch')
+
+        queries = [q for q, _ in load_qa_pairs(options['questions'], limit=options['queries'])]
+        corpus = load_corpus_sample(settings.DATA_DIR, options['corpus'])
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 100))
+        self.stdout.write(self.style.SUCCESS(
+            f'BACKENDS D\'EMBEDDING - {settings.EMBEDDING_MODEL} | '
+            f'{len(queries)} requêtes | {len(corpus)} passages | lots de {options["batch_size"]}'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 100))
+
+        # One fresh process per backend so resident memory is not shared between them
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    results[backend] = executor.submit(
+                        measure_backend, backend, settings.EMBEDDING_MODEL, settings.EMBEDDING_ONNX_DIR,
+                        queries, corpus, options['batch_size'],
+                    ).result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'{backend:10s} | indisponible: {e}'))
+
+        reference = results.get('torch')
+        if reference is None:
+            raise CommandError('Le backend de référence (torch) a échoué')
+
+        for backend, result in results.items():
+            agreement = vector_agreement(reference, result)
+            compatible = agreement['cosine_min'] >= options['tolerance']
+            line = (
+                f'{backend:10s} | chargement: {result["load_s"]:5.1f}s | RSS: {result["rss_mb"]:7.1f} MB | '
+                f'requête p50: {result["query_ms_p50"]:6.1f} ms p95: {result["query_ms_p95"]:6.1f} ms | '
+                f'débit: {result["batch_texts_per_s"]:6.1f} textes/s | '
+                f'cos min: {agreement["cosine_min"]:.4f} moy: {agreement["cosine_mean"]:.4f} | '
+                f'top3: {agreement["top3_overlap"]:.3f}'
+            )
+            style = self.style.SUCCESS if compatible else self.style.WARNING
+            self.stdout.write(style(line + ('' if compatible else '  (hors tolérance)')))
+
+        self.stdout.write('=' * 100 + '\n')
@@ -0,0 +1,165 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from chat_app.evaluation import load_qa_pairs
+from chat_app.management.commands.benchmark_qdrant import DEFAULT_QUESTIONS, BENCHMARK_COLLECTION, time_calls
+
+
+def corpus_points(client, collection_name):
+    """(vector, payload) of every point of the indexed corpus"""
+    points = []
+    offset = None
+    while True:
+        records, offset = client.scroll(collection_name, limit=256, offset=offset,
+                                        with_payload=True, with_vectors=True)
+        points.extend((np.asarray(r.vector["default"], dtype=np.float32), r.payload) for r in records)
+        if offset is None:
+            return points
+
+
+def wait_until_indexed(client, collection_name, timeout=600):
+    """Wait for the optimizer to finish building HNSW/payload indexes (status green)"""
+    from qdrant_client.models import CollectionStatus
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == CollectionStatus.GREEN:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+class Command(BaseCommand):
+    help = ('Comparer la latence de recherche filtrée (catégorie, section) et non filtrée, '
+            'avec et sans index de payload, sur une collection agrandie synthétiquement')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=str, default=str(DEFAULT_QUESTIONS))
+        parser.add_argument('--limit', type=int, default=200, help='Nombre de requêtes (défaut: 200)')
+        parser.add_argument('--top-k', type=int, default=5)
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='10000,50000,100000,200000',
+            help='Tailles de collection mesurées, séparées par des virgules (défaut: 10k à 200k points)',
+        )
+        parser.add_argument(
+            '--noise',
+            type=float,
+            default=0.01,
+            help='Écart-type du bruit ajouté aux vecteurs dupliqués (défaut: 0.01)',
+        )
+        parser.add_argument('--batch-size', type=int, default=512)
+
+    def _server_client(self):
+        from qdrant_client import QdrantClient
+        if settings.QDRANT_USE_CLOUD:
+            return QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, timeout=120)
+        return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT, timeout=120)
+
+    def handle(self, *args, **options):
+        from qdrant_client.models import VectorParams, Distance, HnswConfigDiff, PointStruct
+        from chat_app.embedding import load_embedding_model
+        from chat_app.utils import (chunk_Embedd, open_embedded_client, ensure_payload_indexes,
+                                    search_filter, PAYLOAD_INDEXES)
+
+        embedding_model = load_embedding_model()
+        questions = [q for q, _ in load_qa_pairs(options['questions'], limit=options['limit'])]
+        vectors = embedding_model.encode(questions, normalize_embeddings=True, show_progress_bar=False)
+        top_k = options['top_k']
+        sizes = sorted(int(s) for s in options['sizes'].split(','))
+        rng = np.random.default_rng(0)
+
+        # The real corpus, scaled up with jittered copies of its points
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            embedded, _ = open_embedded_client(tmp_dir, allow_copy=False)
+            chunk_Embedd(embedded, BENCHMARK_COLLECTION, embedding_model, settings.DATA_DIR)
+            corpus = corpus_points(embedded, BENCHMARK_COLLECTION)
+            embedded.close()
+
+        categories = sorted({p["categorie"] for _, p in corpus if p.get("categorie")})
+        sections = sorted({p["section"] for _, p in corpus if p.get("section")})
+        # Filters cycle over the values so every query hits a different subset
+        scenarios = [
+            ('non filtré', [None] * len(questions)),
+            ('catégorie', [search_filter({'category': categories[i % len(categories)]})
+                           for i in range(len(questions))]),
+            ('section', [search_filter({'section': sections[i % len(sections)]})
+                         for i in range(len(questions))]),
+        ]
+
+        try:
+            client = self._server_client()
+            client.get_collections()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(
+                f'Serveur Qdrant indisponible ({e}): les index de payload n\'existent pas en mode embarqué'
+            ))
+            return
+
+        if client.collection_exists(BENCHMARK_COLLECTION):
+            client.delete_collection(BENCHMARK_COLLECTION)
+        client.create_collection(
+            collection_name=BENCHMARK_COLLECTION,
+            vectors_config={"default": VectorParams(size=len(corpus[0][0]), distance=Distance.COSINE)},
+            hnsw_config=HnswConfigDiff(ef_construct=300),
+        )
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 100))
+        self.stdout.write(self.style.SUCCESS(
+            f'RECHERCHE FILTRÉE - {len(corpus)} chunks réels | {len(questions)} requêtes | top_k={top_k} | '
+            f'{len(categories)} catégories | {len(sections)} sections'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 100))
+
+        try:
+            count = 0
+            for size in sizes:
+                # Grow the collection up to `size` points
+                while count < size:
+                    batch = []
+                    for _ in range(min(options['batch_size'], size - count)):
+                        vector, payload = corpus[count % len(corpus)]
+                        if count >= len(corpus):
+                            vector = vector + rng.normal(0, options['noise'], vector.shape).astype(np.float32)
+                            vector /= np.linalg.norm(vector)
+                        batch.append(PointStruct(id=count, vector={"default": vector.tolist()}, payload=payload))
+                        count += 1
+                    client.upsert(BENCHMARK_COLLECTION, points=batch, wait=True)
+
+                for indexed in (False, True):
+                    if indexed:
+                        ensure_payload_indexes(client, BENCHMARK_COLLECTION)
+                    else:
+                        for field in PAYLOAD_INDEXES:
+                            if field in (client.get_collection(BENCHMARK_COLLECTION).payload_schema or {}):
+                                client.delete_payload_index(BENCHMARK_COLLECTION, field, wait=True)
+                    wait_until_indexed(client, BENCHMARK_COLLECTION)
+
+                    for label, filters in scenarios:
+                        if label == 'non filtré' and indexed:
+                            continue
+
+                        def search(i):
+                            return client.search(
+                                collection_name=BENCHMARK_COLLECTION,
+                                query_vector=("default", vectors[i]),
+                                query_filter=filters[i],
+                                limit=top_k
+                            )
+
+                        stats = time_calls(search, list(range(len(questions))))
+                        index_label = 'indexé' if indexed else ('-' if label == 'non filtré' else 'sans index')
+                        self.stdout.write(
+                            f'{size:>8d} pts | {label:10s} | {index_label:10s} | '
+                            f'p50: {stats["p50"]:7.2f} ms | p95: {stats["p95"]:7.2f} ms | '
+                            f'p99: {stats["p99"]:7.2f} ms | {stats["qps"]:8.1f} req/s'
+                        )
+        finally:
+            client.delete_collection(BENCHMARK_COLLECTION)
+
+        self.stdout.write('=' * 100 + '\n')
@@ -0,0 +1,137 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from chat_app.evaluation import load_qa_pairs
+
+
+DEFAULT_QUESTIONS = settings.BASE_DIR.parent / 'fine_tuning' / 'fine_tuning_data' / 'fine_tuning_Data_v2' / 'test.jsonl'
+BENCHMARK_COLLECTION = 'ENSA_chatbot_benchmark'
+
+
+def copy_collection(source, target, collection_name):
+    """Copy every point (vectors + payload) so both deployments search identical data"""
+    from qdrant_client.models import VectorParams, Distance, PointStruct
+
+    info = source.get_collection(collection_name)
+    size = info.config.params.vectors["default"].size
+    if target.collection_exists(collection_name):
+        target.delete_collection(collection_name)
+    target.create_collection(
+        collection_name=collection_name,
+        vectors_config={"default": VectorParams(size=size, distance=Distance.COSINE)},
+    )
+
+    offset = None
+    while True:
+        points, offset = source.scroll(collection_name, limit=256, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        target.upsert(collection_name, points=[
+            PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points
+        ], wait=True)
+        if offset is None:
+            break
+
+
+def time_calls(fn, inputs):
+    """Latency percentiles (ms) and sequential throughput of fn over inputs"""
+    for x in inputs[:3]:
+        fn(x)
+    latencies = []
+    started = time.perf_counter()
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    wall = time.perf_counter() - started
+    latencies = np.array(latencies)
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+        "qps": len(inputs) / wall,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Comparer la latence de recherche: Qdrant embarqué (en processus) vs serveur Qdrant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=str, default=str(DEFAULT_QUESTIONS))
+        parser.add_argument('--limit', type=int, default=300, help='Nombre de requêtes (défaut: 300)')
+        parser.add_argument('--top-k', type=int, default=3)
+
+    def _server_client(self):
+        from qdrant_client import QdrantClient
+        if settings.QDRANT_USE_CLOUD:
+            return QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, timeout=60)
+        return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+
+    def handle(self, *args, **options):
+        from qdrant_client.models import SearchRequest, NamedVector
+        from chat_app.embedding import load_embedding_model
+        from chat_app.utils import chunk_Embedd, expand_query, open_embedded_client
+
+        embedding_model = load_embedding_model()
+        questions = [q for q, _ in load_qa_pairs(options['questions'], limit=options['limit'])]
+        top_k = options['top_k']
+
+        # Query vectors are computed once: only the Qdrant round trip is measured
+        single = embedding_model.encode(questions, normalize_embeddings=True, show_progress_bar=False)
+        batches = [
+            embedding_model.encode(expand_query(q), normalize_embeddings=True, show_progress_bar=False)
+            for q in questions
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            embedded, _ = open_embedded_client(tmp_dir, allow_copy=False)
+            chunk_Embedd(embedded, BENCHMARK_COLLECTION, embedding_model, settings.DATA_DIR)
+
+            clients = {'embarqué': embedded}
+            try:
+                server = self._server_client()
+                copy_collection(embedded, server, BENCHMARK_COLLECTION)
+                clients['serveur'] = server
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'Serveur Qdrant indisponible, mesure embarquée seule: {e}'))
+
+            self.stdout.write(self.style.SUCCESS('\n' + '=' * 90))
+            self.stdout.write(self.style.SUCCESS(f'LATENCE QDRANT - {len(questions)} requêtes | top_k={top_k}'))
+            self.stdout.write(self.style.SUCCESS('=' * 90))
+
+            try:
+                for name, client in clients.items():
+                    def search(vector, client=client):
+                        return client.search(
+                            collection_name=BENCHMARK_COLLECTION,
+                            query_vector=("default", vector),
+                            limit=top_k
+                        )
+
+                    def search_batch(vectors, client=client):
+                        return client.search_batch(
+                            collection_name=BENCHMARK_COLLECTION,
+                            requests=[
+                                SearchRequest(vector=NamedVector(name="default", vector=v.tolist()),
+                                              limit=top_k * 2, with_payload=True)
+                                for v in vectors
+                            ]
+                        )
+
+                    for label, fn, inputs in (('search', search, list(single)),
+                                              ('search_batch', search_batch, batches)):
+                        stats = time_calls(fn, inputs)
+                        self.stdout.write(
+                            f'{name:9s} | {label:12s} | p50: {stats["p50"]:7.2f} ms | '
+                            f'p95: {stats["p95"]:7.2f} ms | p99: {stats["p99"]:7.2f} ms | '
+                            f'{stats["qps"]:8.1f} req/s'
+                        )
+            finally:
+                if 'serveur' in clients:
+                    clients['serveur'].delete_collection(BENCHMARK_COLLECTION)
+                embedded.close()
+
+            self.stdout.write('=' * 90 + '\n')
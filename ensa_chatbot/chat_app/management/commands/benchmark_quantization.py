@@ -0,0 +1,133 @@
+import tempfile
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from chat_app.evaluation import load_qa_pairs, load_documents, label_gold_sources, evaluate_mode
+from chat_app.management.commands.benchmark_filters import corpus_points, wait_until_indexed
+from chat_app.management.commands.benchmark_search import QUESTION_SETS, BENCHMARK_COLLECTION
+
+
+def vector_memory_mb(points, dim, quantization):
+    """Estimated RAM of the vectors (HNSW graph excluded); originals of a quantized collection are on disk"""
+    if quantization == "scalar":
+        per_vector = dim
+    elif quantization == "binary":
+        per_vector = (dim + 7) // 8
+    else:
+        per_vector = dim * 4
+    return points * per_vector / 1024 ** 2
+
+
+class Command(BaseCommand):
+    help = ('Comparer les collections quantifiées (scalar int8, binary) à la collection float32: '
+            'mémoire, latence et recall@k sur les questions de test')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--questions',
+            type=str,
+            default='v2-test',
+            help=f'Jeux de questions ({", ".join(QUESTION_SETS)}), séparés par des virgules (défaut: v2-test)',
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Nombre maximum de questions par fichier')
+        parser.add_argument('--top-k', type=int, default=3)
+        parser.add_argument(
+            '--oversampling',
+            type=str,
+            default='1,2,4',
+            help='Facteurs de sur-échantillonnage avant rescoring, séparés par des virgules (défaut: 1,2,4)',
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=0,
+            help='Agrandir la collection à ce nombre de points avec des copies bruitées du corpus (défaut: 0)',
+        )
+        parser.add_argument('--noise', type=float, default=0.01)
+
+    def _server_client(self):
+        from qdrant_client import QdrantClient
+        if settings.QDRANT_USE_CLOUD:
+            return QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, timeout=120)
+        return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT, timeout=120)
+
+    def handle(self, *args, **options):
+        from qdrant_client.models import PointStruct
+        from chat_app.embedding import load_embedding_model
+        from chat_app.utils import chunk_Embedd, open_embedded_client, create_collection
+
+        pairs = []
+        for name in [s.strip() for s in options['questions'].split(',') if s.strip()]:
+            if name not in QUESTION_SETS:
+                raise CommandError(f'Jeu de questions introuvable: {name}')
+            for path in QUESTION_SETS[name]:
+                pairs.extend(load_qa_pairs(path, limit=options['limit']))
+        gold = label_gold_sources(pairs, load_documents(settings.DATA_DIR))
+        top_k = options['top_k']
+        oversampling = [float(x) for x in options['oversampling'].split(',')]
+
+        try:
+            client = self._server_client()
+            client.get_collections()
+        except Exception as e:
+            raise CommandError(f'Serveur Qdrant indisponible ({e}): la quantification est ignorée en mode embarqué')
+
+        # Embed the corpus once, then load it into one collection per quantization
+        embedding_model = load_embedding_model()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            embedded, _ = open_embedded_client(tmp_dir, allow_copy=False)
+            chunk_Embedd(embedded, BENCHMARK_COLLECTION, embedding_model, settings.DATA_DIR)
+            corpus = corpus_points(embedded, BENCHMARK_COLLECTION)
+            embedded.close()
+
+        size = max(options['scale'], len(corpus))
+        dim = len(corpus[0][0])
+        rng = np.random.default_rng(0)
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 110))
+        self.stdout.write(self.style.SUCCESS(
+            f'QUANTIFICATION - {size} points ({len(corpus)} chunks réels) | {len(pairs)} questions | top_k={top_k}'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 110))
+
+        baseline = None
+        for quantization in (None, 'scalar', 'binary'):
+            collection_name = f'{BENCHMARK_COLLECTION}_{quantization or "float32"}'
+            if client.collection_exists(collection_name):
+                client.delete_collection(collection_name)
+            create_collection(client, collection_name, dim, quantization=quantization)
+            try:
+                for start in range(0, size, 512):
+                    batch = []
+                    for i in range(start, min(start + 512, size)):
+                        vector, payload = corpus[i % len(corpus)]
+                        if i >= len(corpus):
+                            vector = vector + rng.normal(0, options['noise'], vector.shape).astype(np.float32)
+                            vector /= np.linalg.norm(vector)
+                        batch.append(PointStruct(id=i, vector={"default": vector.tolist()}, payload=payload))
+                    client.upsert(collection_name, points=batch, wait=True)
+                wait_until_indexed(client, collection_name)
+
+                memory = vector_memory_mb(size, dim, quantization)
+                for factor in ([None] if quantization is None else oversampling):
+                    result = evaluate_mode(pairs, gold, client, collection_name, embedding_model, 'default',
+                                           top_k=top_k, oversampling=factor)
+                    if baseline is None:
+                        baseline = dict(result, memory=memory)
+                    label = f'{quantization or "float32"}' + (f' x{factor:g}' if factor else '')
+                    self.stdout.write(
+                        f'{label:12s} | RAM vecteurs: {memory:8.1f} Mo ({memory - baseline["memory"]:+8.1f}) | '
+                        f'recall@{top_k}: {result[f"recall@{top_k}"]:.3f} '
+                        f'({result[f"recall@{top_k}"] - baseline[f"recall@{top_k}"]:+.3f}) | '
+                        f'MRR: {result["mrr"]:.3f} ({result["mrr"] - baseline["mrr"]:+.3f}) | '
+                        f'p50: {result["latency_ms_p50"]:6.1f} ms '
+                        f'({result["latency_ms_p50"] - baseline["latency_ms_p50"]:+6.1f}) | '
+                        f'p95: {result["latency_ms_p95"]:6.1f} ms'
+                    )
+            finally:
+                client.delete_collection(collection_name)
+
+        self.stdout.write('=' * 110)
+        self.stdout.write('Latences: embedding de la question compris; RAM estimée hors graphe HNSW.\n')
@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.apps import apps
+from django.conf import settings
+
+from chat_app.evaluation import (
+    load_qa_pairs, load_documents, label_gold_sources, document_categories,
+    evaluate_router, evaluate_self_query,
+)
+from chat_app.management.commands.benchmark_search import QUESTION_SETS
+
+
+class Command(BaseCommand):
+    help = 'Comparer le routeur local de catégories au filtre self-query (LLM): précision, couverture, latence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--questions',
+            type=str,
+            default='v2-test',
+            help=f'Jeux de questions ({", ".join(QUESTION_SETS)}), séparés par des virgules (défaut: v2-test)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Nombre maximum de questions par fichier',
+        )
+        parser.add_argument(
+            '--margins',
+            type=str,
+            default=None,
+            help=f'Valeurs de ROUTER_MARGIN à comparer, séparées par des virgules (défaut: {settings.ROUTER_MARGIN})',
+        )
+        parser.add_argument(
+            '--groq',
+            action='store_true',
+            help='Mesurer aussi le filtre inféré par le self-query retriever (appels Groq)',
+        )
+
+    def handle(self, *args, **options):
+        from chat_app.router import get_category_router, build_category_router
+
+        chatbot_config = apps.get_app_config('chat_app')
+        if chatbot_config.client is None or chatbot_config.embedding_model is None:
+            raise CommandError('Qdrant ou le modèle d\'embedding n\'est pas disponible')
+        client = chatbot_config.client
+        embedding_model = chatbot_config.embedding_model
+
+        pairs = []
+        for name in [s.strip() for s in options['questions'].split(',') if s.strip()]:
+            if name not in QUESTION_SETS:
+                raise CommandError(f'Jeu de questions introuvable: {name}')
+            for path in QUESTION_SETS[name]:
+                pairs.extend(load_qa_pairs(path, limit=options['limit']))
+
+        gold = label_gold_sources(pairs, load_documents(settings.DATA_DIR))
+        categories = document_categories(settings.DATA_DIR)
+        gold_categories = [categories.get(key, set()) for key in gold]
+
+        router = get_category_router()
+        if router is None:
+            self.stdout.write(self.style.WARNING(
+                f'{settings.ROUTER_PATH} absent (lancez reindex): centroïdes calculés depuis la collection'
+            ))
+            router = build_category_router(
+                client, chatbot_config.collection_name,
+                min_score=settings.ROUTER_MIN_SCORE, margin=settings.ROUTER_MARGIN,
+                max_categories=settings.ROUTER_MAX_CATEGORIES,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{len(pairs)} questions | {len(router.categories)} catégories | '
+            f'score min: {router.min_score} | max catégories: {router.max_categories}\n'
+        ))
+
+        margins = [float(m) for m in options['margins'].split(',')] if options['margins'] else [router.margin]
+        for margin in margins:
+            router.margin = margin
+            result = evaluate_router(pairs, gold_categories, embedding_model, router)
+            self._print(f'centroïde (marge {margin:g})', result, 'µs')
+
+        if options['groq']:
+            from chat_app.key_pool import get_key_pool
+            from chat_app.retrievers import retriever_registry
+
+            key_pool = get_key_pool(settings.GROQ_API_KEY)
+            if not len(key_pool):
+                raise CommandError('Aucune clé Groq configurée')
+            retriever = retriever_registry.retriever(
+                'self', client, chatbot_config.collection_name, embedding_model, key_pool.candidates()[0]
+            )
+            result = evaluate_self_query(pairs, gold_categories, retriever)
+            self._print('self-query (LLM)', result, 'ms')
+
+    def _print(self, label, result, unit):
+        self.stdout.write(
+            f'{label:24s} | couverture: {result["coverage"]:.3f} | '
+            f'précision: {result["accuracy"]:.3f} | '
+            f'mal routées: {result["misrouted"]:.3f} | '
+            f'p50: {result["latency_p50"]:9.3f} {unit} | '
+            f'p95: {result["latency_p95"]:9.3f} {unit} | '
+            f'p99: {result["latency_p99"]:9.3f} {unit} | '
+            f'erreurs: {result["errors"]}'
+        )
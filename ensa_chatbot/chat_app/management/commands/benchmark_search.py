@@ -0,0 +1,232 @@
+import json
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.apps import apps
+from django.conf import settings
+
+from chat_app.evaluation import load_qa_pairs, load_documents, label_gold_sources, evaluate_mode
+
+
+QA_DIR = settings.BASE_DIR.parent / 'fine_tuning' / 'fine_tuning_data'
+QUESTION_SETS = {
+    'v2-train': [QA_DIR / 'fine_tuning_Data_v2' / 'train.jsonl'],
+    'v2-val': [QA_DIR / 'fine_tuning_Data_v2' / 'val.jsonl'],
+    'v2-test': [QA_DIR / 'fine_tuning_Data_v2' / 'test.jsonl'],
+    'v1': sorted((QA_DIR / 'fine_tuning_Data_v1').glob('*_QA.jsonl')),
+}
+QUESTION_SETS['all'] = [p for name in ('v2-train', 'v2-val', 'v2-test', 'v1') for p in QUESTION_SETS[name]]
+
+BENCHMARK_COLLECTION = 'ENSA_chatbot_benchmark'
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Command(BaseCommand):
+    help = 'Comparer les modes de Search (recall@k, MRR, latence p50/p95/p99, requêtes/s) sur les questions de test'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--questions',
+            type=str,
+            default='v2-test',
+            help=f'Jeux de questions ({", ".join(QUESTION_SETS)}) ou fichiers .jsonl, séparés par des virgules '
+                 f'(défaut: v2-test)',
+        )
+        parser.add_argument(
+            '--modes',
+            type=str,
+            default='default,routed,hybrid,expand,self,multi',
+            help='Modes à comparer, séparés par des virgules (défaut: tous)',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=3,
+            help='Nombre de résultats évalués (défaut: 3)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Nombre maximum de questions par fichier',
+        )
+        parser.add_argument(
+            '--live',
+            action='store_true',
+            help='Interroger la collection Qdrant configurée au lieu d\'un index en mémoire',
+        )
+        parser.add_argument(
+            '--groq',
+            action='store_true',
+            help='Utiliser Groq pour les modes self/multi (par défaut: substitut local sans API)',
+        )
+        parser.add_argument(
+            '--rerank',
+            action='store_true',
+            help='Activer le reranking cross-encoder (modes default/hybrid/expand)',
+        )
+        parser.add_argument(
+            '--context-budget',
+            type=int,
+            default=0,
+            help='Dédupliquer et limiter le contexte à ce nombre de tokens (défaut: 0, contexte brut)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Fichier JSON des résultats (défaut: benchmarks/search-<commit>.json)',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            default=None,
+            help='Fichier JSON d\'un run précédent à comparer',
+        )
+
+    def _question_files(self, spec):
+        files = []
+        for name in [s.strip() for s in spec.split(',') if s.strip()]:
+            if name in QUESTION_SETS:
+                files.extend(QUESTION_SETS[name])
+            elif Path(name).exists():
+                files.append(Path(name))
+            else:
+                raise CommandError(f'Jeu de questions introuvable: {name}')
+        return files
+
+    def _in_memory_index(self, tmp_dir):
+        """Index data_final into an in-process Qdrant with the configured embedding backend"""
+        from qdrant_client import QdrantClient
+        from chat_app.embedding import load_embedding_model
+        from chat_app.lexical import BM25Index
+        from chat_app.router import CategoryRouter
+        from chat_app.utils import chunk_Embedd
+
+        embedding_model = load_embedding_model()
+        client = QdrantClient(':memory:')
+        lexical_path = Path(tmp_dir) / 'lexical_index.json'
+        router_path = Path(tmp_dir) / 'category_router.json'
+        chunk_Embedd(client, BENCHMARK_COLLECTION, embedding_model, settings.DATA_DIR,
+                     lexical_index_path=lexical_path, router_path=router_path)
+        router = CategoryRouter.load(
+            router_path, min_score=settings.ROUTER_MIN_SCORE, margin=settings.ROUTER_MARGIN,
+            max_categories=settings.ROUTER_MAX_CATEGORIES,
+        )
+        return client, BENCHMARK_COLLECTION, embedding_model, BM25Index.load(lexical_path), router
+
+    def handle(self, *args, **options):
+        from chat_app.lexical import get_lexical_index
+        from chat_app.router import get_category_router
+        from chat_app.retrievers import retriever_registry, LocalQueryLLM
+
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        top_k = options['top_k']
+
+        pairs = []
+        files = self._question_files(options['questions'])
+        for path in files:
+            pairs.extend(load_qa_pairs(path, limit=options['limit']))
+        gold = label_gold_sources(pairs, load_documents(settings.DATA_DIR))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if options['live']:
+                chatbot_config = apps.get_app_config('chat_app')
+                if chatbot_config.client is None or chatbot_config.embedding_model is None:
+                    raise CommandError('Qdrant ou le modèle d\'embedding n\'est pas disponible')
+                client = chatbot_config.client
+                collection_name = chatbot_config.collection_name
+                embedding_model = chatbot_config.embedding_model
+                lexical_index = get_lexical_index()
+                router = get_category_router()
+            else:
+                self.stdout.write('Indexation de data_final dans un Qdrant en mémoire...')
+                client, collection_name, embedding_model, lexical_index, router = self._in_memory_index(tmp_dir)
+
+            groq_keys = settings.GROQ_API_KEY
+            if not options['groq']:
+                retriever_registry.use_llm_factory(lambda groq_key: LocalQueryLLM())
+                groq_keys = ['local']
+
+            self.stdout.write(self.style.SUCCESS(
+                f'\n{len(pairs)} questions | top_k={top_k} | '
+                f'{"Qdrant configuré" if options["live"] else "Qdrant en mémoire"} | '
+                f'LLM: {"Groq" if options["groq"] else "substitut local"}\n'
+            ))
+
+            results = []
+            try:
+                for mode in modes:
+                    result = evaluate_mode(
+                        pairs, gold, client, collection_name, embedding_model, mode,
+                        groq_keys=groq_keys, top_k=top_k,
+                        lexical_index=lexical_index, router=router, rerank=options['rerank'],
+                        rerank_candidates=settings.RERANK_CANDIDATES,
+                        context_budget=options['context_budget'],
+                    )
+                    results.append(result)
+                    self.stdout.write(
+                        f'{mode:10s} | recall@{top_k}: {result[f"recall@{top_k}"]:.3f} | '
+                        f'MRR: {result["mrr"]:.3f} | '
+                        f'p50: {result["latency_ms_p50"]:7.1f} ms | '
+                        f'p95: {result["latency_ms_p95"]:7.1f} ms | '
+                        f'p99: {result["latency_ms_p99"]:7.1f} ms | '
+                        f'{result["qps"]:6.1f} req/s | '
+                        f'contexte: {result["context_tokens_mean"]:6.1f} tokens | '
+                        f'erreurs: {result["errors"]}'
+                    )
+            finally:
+                retriever_registry.use_llm_factory(None)
+
+        commit = git_commit()
+        report = {
+            'commit': commit,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'questions': [str(p) for p in files],
+            'n_questions': len(pairs),
+            'top_k': top_k,
+            'index': 'live' if options['live'] else 'in-memory',
+            'llm': 'groq' if options['groq'] else 'local',
+            'rerank': options['rerank'],
+            'context_budget': options['context_budget'],
+            'embedding_backend': settings.EMBEDDING_BACKEND,
+            'modes': results,
+        }
+
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'search-{commit}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\nRésultats écrits dans {output}'))
+
+        if options['compare']:
+            self._compare(options['compare'], report)
+
+    def _compare(self, path, report):
+        """Print the change of every metric against a previous run"""
+        with open(path, 'r', encoding='utf-8') as f:
+            previous = {m['mode']: m for m in json.load(f)['modes']}
+
+        self.stdout.write(f'\nComparaison avec {path}:')
+        for current in report['modes']:
+            before = previous.get(current['mode'])
+            if before is None:
+                continue
+            deltas = [
+                f'{metric}: {current[metric] - before[metric]:+.3f}'
+                for metric in current
+                if metric in before and isinstance(current[metric], (int, float)) and metric != 'questions'
+            ]
+            self.stdout.write(f'{current["mode"]:10s} | ' + ' | '.join(deltas))
@@ -0,0 +1,107 @@
+import asyncio
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat_app.evaluation import load_qa_pairs
+from chat_app.management.commands.benchmark_qdrant import DEFAULT_QUESTIONS
+from chat_app.streams import ResponseStream, TokenCoalescer
+
+
+def answer_deltas(path, tokens):
+    """Groq-like deltas (about 4 characters each) cut from the reference answers, `tokens` in total"""
+    deltas = []
+    for _, answer in load_qa_pairs(path):
+        deltas.extend(re.findall(r"\s*\S{1,4}", answer))
+        if len(deltas) >= tokens:
+            return deltas[:tokens]
+    if not deltas:
+        raise CommandError(f'Aucune réponse dans {path}')
+    return (deltas * (tokens // len(deltas) + 1))[:tokens]
+
+
+async def fake_generation(deltas, max_chars, max_ms, delta_ms):
+    """Same events as views.generate_stream, fed by a simulated Groq stream"""
+    frames = TokenCoalescer(max_chars, max_ms)
+    for delta in deltas:
+        if delta_ms:
+            await asyncio.sleep(delta_ms / 1000)
+        content = frames.add(delta)
+        if content:
+            yield {'content': content, 'type': 'token'}
+    content = frames.flush()
+    if content:
+        yield {'content': content, 'type': 'token'}
+    yield {'type': 'done'}
+    yield {'sources': ['source.txt'], 'type': 'sources'}
+    yield {'type': 'metadata', 'timings': {}}
+
+
+async def measure_stream(deltas, max_chars, max_ms, delta_ms):
+    """(events, bytes, CPU seconds) of one stream produced and read to the end"""
+    stream = ResponseStream(fake_generation(deltas, max_chars, max_ms, delta_ms), user_id=None,
+                            buffer_size=len(deltas) + 8)
+    events = 0
+    size = 0
+    cpu = time.process_time()
+    async for event in stream.read(heartbeat=60):
+        events += 1
+        size += len(event.encode('utf-8'))
+    return events, size, time.process_time() - cpu
+
+
+class Command(BaseCommand):
+    help = 'Mesurer les octets et le CPU par réponse streamée (SSE) selon le regroupement des tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=str, default=str(DEFAULT_QUESTIONS),
+                            help='Fichier .jsonl dont les réponses servent de texte généré')
+        parser.add_argument('--tokens', type=int, default=1500, help='Deltas par réponse (défaut: 1500)')
+        parser.add_argument('--streams', type=int, default=5, help='Réponses mesurées par configuration (défaut: 5)')
+        parser.add_argument(
+            '--configs',
+            type=str,
+            default='0/0,32/25,64/50,128/100',
+            help='Configurations caractères/ms à comparer, séparées par des virgules (0/0: un événement par delta)',
+        )
+        parser.add_argument(
+            '--delta-ms',
+            type=float,
+            default=3.0,
+            help='Intervalle simulé entre deux deltas Groq en ms (défaut: 3, environ 330 tokens/s)',
+        )
+
+    def handle(self, *args, **options):
+        deltas = answer_deltas(options['questions'], options['tokens'])
+        configs = []
+        for spec in options['configs'].split(','):
+            chars, _, ms = spec.strip().partition('/')
+            configs.append((int(chars), int(ms or 0)))
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 90))
+        self.stdout.write(self.style.SUCCESS(
+            f'SSE - {len(deltas)} deltas ({sum(len(d) for d in deltas)} caractères) par réponse | '
+            f'{options["streams"]} réponses | 1 delta / {options["delta_ms"]:g} ms'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 90))
+
+        baseline = None
+        for max_chars, max_ms in configs:
+            runs = [
+                asyncio.run(measure_stream(deltas, max_chars, max_ms, options['delta_ms']))
+                for _ in range(options['streams'])
+            ]
+            events = sum(r[0] for r in runs) / len(runs)
+            size = sum(r[1] for r in runs) / len(runs)
+            cpu_ms = sum(r[2] for r in runs) / len(runs) * 1000
+            if baseline is None:
+                baseline = (events, size, cpu_ms)
+            label = 'par delta' if (max_chars, max_ms) == (0, 0) else f'{max_chars} car. / {max_ms} ms'
+            self.stdout.write(
+                f'{label:18s} | événements: {events:7.0f} | octets: {size / 1024:8.1f} Ko '
+                f'({size / baseline[1] - 1:+.0%}) | CPU: {cpu_ms:7.1f} ms ({cpu_ms / baseline[2] - 1:+.0%})'
+            )
+
+        self.stdout.write('=' * 90)
+        self.stdout.write('CPU: production et lecture des événements (hors Django et hors proxy).\n')
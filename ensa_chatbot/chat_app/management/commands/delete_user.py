@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+
+class Command(BaseCommand):
+    help = 'Supprimer un utilisateur et son historique'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'username',
+            type=str,
+            help='Nom d\'utilisateur à supprimer'
+        )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='Ne pas demander de confirmation',
+        )
+
+    def handle(self, *args, **options):
+        username = options['username']
+        no_input = options.get('no_input', False)
+        
+        # Check if user exists
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Utilisateur "{username}" introuvable')
+        
+        # Display user info
+        chat_count = user.chat_history.count()
+        
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.WARNING(
+            f'SUPPRESSION DE L\'UTILISATEUR: {username}'
+        ))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'Email: {user.email}')
+        self.stdout.write(f'Questions: {chat_count}')
+        self.stdout.write(f'Staff: {"Oui" if user.is_staff else "Non"}')
+        self.stdout.write(f'Superuser: {"Oui" if user.is_superuser else "Non"}')
+        self.stdout.write('=' * 60 + '\n')
+        
+        # Confirm deletion
+        if not no_input:
+            self.stdout.write(self.style.ERROR(
+                '⚠️  ATTENTION: Cette action est irréversible!'
+            ))
+            confirm = input(
+                f'\nTapez "{username}" pour confirmer la suppression: '
+            )
+            if confirm != username:
+                self.stdout.write(self.style.WARNING('Suppression annulée'))
+                return
+        
+        # Delete user
+        try:
+            user.delete()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\n✓ Utilisateur "{username}" supprimé avec succès\n'
+                )
+            )
+        except Exception as e:
+            raise CommandError(f'Erreur lors de la suppression: {str(e)}')
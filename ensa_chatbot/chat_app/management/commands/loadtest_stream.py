@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import httpx
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Test de charge: flux SSE simultanés sur /query/stream/ d\'un serveur en marche'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='http://127.0.0.1:8000',
+            help='URL du serveur (défaut: http://127.0.0.1:8000)',
+        )
+        parser.add_argument('--username', type=str, default='student1')
+        parser.add_argument('--password', type=str, default='student123')
+        parser.add_argument(
+            '--concurrency',
+            type=str,
+            default='1,10,50,100,200',
+            help='Niveaux de concurrence testés, séparés par des virgules',
+        )
+        parser.add_argument(
+            '--query',
+            type=str,
+            default='Quand commence le CC1 ?',
+        )
+        parser.add_argument(
+            '--metrics-token',
+            type=str,
+            default=None,
+            help='METRICS_TOKEN du serveur, pour relever les requêtes regroupées sur /metrics/',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=120.0,
+            help='Délai maximal par flux en secondes',
+        )
+
+    def handle(self, *args, **options):
+        levels = [int(c) for c in options['concurrency'].split(',') if c.strip()]
+        asyncio.run(self._run(options, levels))
+
+    async def _login(self, client, username, password):
+        await client.get('/login/')
+        response = await client.post('/login/', data={
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': client.cookies.get('csrftoken', ''),
+        })
+        if 'sessionid' not in client.cookies:
+            raise CommandError(f'Connexion impossible pour "{username}" ({response.status_code})')
+
+    async def _one_stream(self, client, query, timeout):
+        """Return (time to first byte, total time, ok)"""
+        started = time.perf_counter()
+        first_byte = None
+        try:
+            async with client.stream('POST', '/query/stream/', json={'query': query}, timeout=timeout) as response:
+                if response.status_code != 200:
+                    return None, time.perf_counter() - started, False
+                async for chunk in response.aiter_bytes():
+                    if first_byte is None and chunk:
+                        first_byte = time.perf_counter() - started
+            return first_byte, time.perf_counter() - started, True
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            return first_byte, time.perf_counter() - started, False
+
+    async def _coalesced(self, client, token):
+        """Coalesced-request counter of the server process answering /metrics/ (None if unavailable)"""
+        if not token:
+            return None
+        try:
+            response = await client.get('/metrics/', headers={'Authorization': f'Bearer {token}'})
+        except httpx.HTTPError:
+            return None
+        for line in response.text.splitlines():
+            if line.startswith('ensa_chatbot_coalesced_requests_total '):
+                return int(float(line.split()[1]))
+        return None
+
+    async def _run(self, options, levels):
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=options['url'], limits=limits, follow_redirects=True) as client:
+            await self._login(client, options['username'], options['password'])
+
+            self.stdout.write(self.style.SUCCESS('\n' + '=' * 80))
+            self.stdout.write(self.style.SUCCESS(f'TEST DE CHARGE SSE - {options["url"]}'))
+            self.stdout.write(self.style.SUCCESS('=' * 80))
+
+            for level in levels:
+                coalesced_before = await self._coalesced(client, options['metrics_token'])
+                started = time.perf_counter()
+                results = await asyncio.gather(*[
+                    self._one_stream(client, options['query'], options['timeout'])
+                    for _ in range(level)
+                ])
+                wall = time.perf_counter() - started
+                coalesced_after = await self._coalesced(client, options['metrics_token'])
+
+                ok = [r for r in results if r[2]]
+                ttfb = np.array([r[0] for r in ok if r[0] is not None]) * 1000
+                total = np.array([r[1] for r in ok]) * 1000
+
+                line = f'{level:4d} flux | réussis: {len(ok):4d}/{level:<4d} | durée: {wall:6.1f}s'
+                if len(ttfb):
+                    line += (
+                        f' | TTFB p50: {np.percentile(ttfb, 50):7.0f} ms'
+                        f' p95: {np.percentile(ttfb, 95):7.0f} ms'
+                        f' | total p95: {np.percentile(total, 95):7.0f} ms'
+                    )
+                if coalesced_before is not None and coalesced_after is not None:
+                    # Same question sent by every stream: all but the first should join it
+                    line += f' | regroupés: {coalesced_after - coalesced_before:4d}'
+                self.stdout.write(line)
+
+            self.stdout.write('=' * 80 + '\n')
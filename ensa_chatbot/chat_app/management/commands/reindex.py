@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.apps import apps
+from django.conf import settings
+
+from chat_app.utils import chunk_Embedd, LAST_INDEX_STATS
+
+
+class Command(BaseCommand):
+    help = 'Indexer les documents dans Qdrant (incrémental par défaut)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Supprimer et recréer la collection au lieu d\'une mise à jour incrémentale',
+        )
+        parser.add_argument(
+            '--data-path',
+            type=str,
+            default=str(settings.DATA_DIR),
+            help='Dossier des données (défaut: DATA_DIR)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=64,
+            help='Taille des lots d\'encodage (défaut: 64)',
+        )
+        parser.add_argument(
+            '--encode-workers',
+            type=int,
+            default=1,
+            help='Nombre de threads d\'encodage (défaut: 1)',
+        )
+        parser.add_argument(
+            '--upsert-workers',
+            type=int,
+            default=2,
+            help='Nombre de threads d\'envoi vers Qdrant (défaut: 2)',
+        )
+        parser.add_argument(
+            '--quantization',
+            choices=['none', 'scalar', 'binary'],
+            default=settings.QDRANT_QUANTIZATION or 'none',
+            help='Quantification des vecteurs: none, scalar (int8) ou binary (défaut: QDRANT_QUANTIZATION)',
+        )
+
+    def handle(self, *args, **options):
+        chatbot_config = apps.get_app_config('chat_app')
+        if chatbot_config.client is None or chatbot_config.embedding_model is None:
+            raise CommandError('Qdrant ou le modèle d\'embedding n\'est pas disponible')
+        if chatbot_config.qdrant_copy_path:
+            # Writes would only reach this process' private copy
+            raise CommandError(
+                f'Le Qdrant embarqué ({settings.QDRANT_PATH}) est verrouillé par un autre processus: '
+                f'arrêtez le serveur web avant de réindexer'
+            )
+
+        mode = 'complète' if options['full'] else 'incrémentale'
+        self.stdout.write(self.style.WARNING(f'Indexation {mode} de {options["data_path"]}'))
+
+        count = chunk_Embedd(
+            chatbot_config.client,
+            settings.COLLECTION_NAME,
+            chatbot_config.embedding_model,
+            options['data_path'],
+            batch_size=options['batch_size'],
+            incremental=not options['full'],
+            manifest_path=settings.INDEX_MANIFEST_PATH,
+            lexical_index_path=settings.LEXICAL_INDEX_PATH,
+            router_path=settings.ROUTER_PATH,
+            quantization=None if options['quantization'] == 'none' else options['quantization'],
+            encode_workers=options['encode_workers'],
+            upsert_workers=options['upsert_workers'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {count} chunks indexés dans "{settings.COLLECTION_NAME}"'))
+        if LAST_INDEX_STATS:
+            self.stdout.write(
+                f'   Embeddés: {LAST_INDEX_STATS["chunks"]} | supprimés: {LAST_INDEX_STATS["stale"]}\n'
+                f'   Débit: {LAST_INDEX_STATS["chunks_per_second"]:.1f} chunks/s '
+                f'(encodage {LAST_INDEX_STATS["encode_seconds"]:.2f}s, '
+                f'upsert {LAST_INDEX_STATS["upsert_seconds"]:.2f}s)\n'
+                f'   Durée totale: {LAST_INDEX_STATS["wall_clock_seconds"]:.2f}s'
+            )
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.db.models import Count
+from datetime import timedelta
+
+from chat_app.models import ChatHistory
+
+
+class Command(BaseCommand):
+    help = 'Afficher les statistiques des utilisateurs'
+
+    def handle(self, *args, **options):
+        self.stdout.write('\n' + '=' * 80)
+        self.stdout.write(self.style.SUCCESS('STATISTIQUES DES UTILISATEURS'))
+        self.stdout.write('=' * 80 + '\n')
+        
+        # Total users
+        total_users = User.objects.count()
+        active_users = User.objects.filter(is_active=True).count()
+        staff_users = User.objects.filter(is_staff=True).count()
+        
+        self.stdout.write('📊 Utilisateurs:')
+        self.stdout.write(f'   Total: {total_users}')
+        self.stdout.write(f'   Actifs: {active_users}')
+        self.stdout.write(f'   Staff: {staff_users}')
+        self.stdout.write(f'   Inactifs: {total_users - active_users}')
+        
+        # Recent activity
+        now = timezone.now()
+        week_ago = now - timedelta(days=7)
+        month_ago = now - timedelta(days=30)
+        
+        recent_week = User.objects.filter(last_login__gte=week_ago).count()
+        recent_month = User.objects.filter(last_login__gte=month_ago).count()
+        
+        self.stdout.write('\n🕐 Activité récente:')
+        self.stdout.write(f'   Dernière semaine: {recent_week}')
+        self.stdout.write(f'   Dernier mois: {recent_month}')
+        
+        # Chat statistics
+        total_chats = ChatHistory.objects.count()
+        
+        avg_chats = total_chats / total_users if total_users > 0 else 0
+        
+        self.stdout.write('\n💬 Questions:')
+        self.stdout.write(f'   Total: {total_chats}')
+        self.stdout.write(f'   Moyenne par utilisateur: {avg_chats:.1f}')
+        
+        # Top users
+        self.stdout.write('\n🏆 Top 5 utilisateurs:')
+        top_users = User.objects.annotate(
+            chat_count=Count('chat_history')
+        ).order_by('-chat_count')[:5]
+        
+        for i, user in enumerate(top_users, 1):
+            self.stdout.write(
+                f'   {i}. {user.username:20s} - {user.chat_count} questions'
+            )
+        
+        self.stdout.write('\n' + '=' * 80 + '\n')
@@ -0,0 +1,192 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Seconds; covers a cached embedding (~ms) up to a slow multi-query LLM call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKENS_PER_SECOND_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, safe across threads"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """(cumulative counts per bucket, sum, count)"""
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class MetricsRegistry:
+    """Per-process aggregates of the pipeline stages, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.stage_seconds = {}
+        self.tokens_per_second = Histogram(TOKENS_PER_SECOND_BUCKETS)
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage, seconds):
+        histogram = self.stage_seconds.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stage_seconds.setdefault(stage, Histogram(LATENCY_BUCKETS))
+        histogram.observe(seconds)
+
+    def count_request(self, endpoint, outcome):
+        with self._lock:
+            key = (endpoint, outcome)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def render(self, extra=None):
+        """`extra`: {name: (type, help, value)} for values kept elsewhere (cache, writer)"""
+        lines = [
+            "# HELP ensa_chatbot_stage_seconds Duration of each RAG pipeline stage",
+            "# TYPE ensa_chatbot_stage_seconds histogram",
+        ]
+        for stage in sorted(self.stage_seconds):
+            lines += _histogram_lines("ensa_chatbot_stage_seconds", f'stage="{stage}"',
+                                      self.stage_seconds[stage])
+
+        lines += [
+            "# HELP ensa_chatbot_generation_tokens_per_second Streamed LLM tokens per second",
+            "# TYPE ensa_chatbot_generation_tokens_per_second histogram",
+        ]
+        lines += _histogram_lines("ensa_chatbot_generation_tokens_per_second", "", self.tokens_per_second)
+
+        lines += [
+            "# HELP ensa_chatbot_requests_total Chatbot queries by endpoint and outcome",
+            "# TYPE ensa_chatbot_requests_total counter",
+        ]
+        with self._lock:
+            requests = sorted(self.requests.items())
+        for (endpoint, outcome), n in requests:
+            lines.append(f'ensa_chatbot_requests_total{{endpoint="{endpoint}",outcome="{outcome}"}} {n}')
+
+        for name, (kind, help_text, value) in sorted((extra or {}).items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative, total, count = histogram.snapshot()
+    sep = "," if labels else ""
+    lines = [
+        f'{name}_bucket{{{labels}{sep}le="{_format_bound(bound)}"}} {n}'
+        for bound, n in zip(histogram.buckets, cumulative)
+    ]
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {total:.6f}")
+    lines.append(f"{name}_count{suffix} {count}")
+    return lines
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+registry = MetricsRegistry()
+
+
+# -------------------------
+#   Per-request timings
+# -------------------------
+class StageTimer:
+    """Stage durations of one request, reported in Server-Timing and the SSE metadata event"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.values = {}
+
+    def record(self, stage, seconds):
+        # A stage run several times (e.g. retried on another key) adds up
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        registry.observe_stage(stage, seconds)
+
+    def finish(self):
+        """Record the request's total time (once)"""
+        if "total" not in self.stages:
+            self.record("total", time.perf_counter() - self.started)
+
+    def as_dict(self):
+        """Stage durations in milliseconds, plus extra values such as tokens/s"""
+        timings = {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()}
+        timings.update(self.values)
+        return timings
+
+    def server_timing(self):
+        """Value of the Server-Timing header (durations in ms)"""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+# Propagated by asyncio.to_thread and sync_to_async, not by executor.submit
+current_timer = ContextVar("current_timer", default=None)
+
+
+def start_request_timer():
+    timer = StageTimer()
+    current_timer.set(timer)
+    return timer
+
+
+@contextmanager
+def timed(stage, timer=None):
+    """
+    Time a block into the global histograms and into `timer` (default: the
+    current request's timer, if any)
+    """
+    timer = timer or current_timer.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        if timer is not None:
+            timer.record(stage, seconds)
+        else:
+            registry.observe_stage(stage, seconds)
+
+
+def observe_generation(started, first_token_at, tokens, timer=None):
+    """Record time-to-first-token, generation time and tokens/s of one LLM stream ending now"""
+    timer = timer or current_timer.get()
+    record = timer.record if timer is not None else registry.observe_stage
+    finished = time.perf_counter()
+
+    if first_token_at is not None:
+        record("ttft", first_token_at - started)
+    record("generation", finished - started)
+
+    rate = None
+    if first_token_at is not None and tokens and finished > first_token_at:
+        rate = tokens / (finished - first_token_at)
+        registry.tokens_per_second.observe(rate)
+    if timer is not None:
+        timer.values["tokens"] = tokens
+        if rate is not None:
+            timer.values["tokens_per_s"] = round(rate, 1)
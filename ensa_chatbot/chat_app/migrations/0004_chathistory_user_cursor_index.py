@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0003_chathistory_sources_json'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chathistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='chat_app_ch_user_cursor_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='chathistory',
+            name='chat_app_ch_user_id_b8d55d_idx',
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class ChatHistory(models.Model):
@@ -25,7 +30,8 @@ class ChatHistory(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['user', '-created_at']),
+            # Keyset pagination of a user's history on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='chat_app_ch_user_cursor_idx'),
         ]
     
     def __str__(self):
@@ -55,6 +61,19 @@ class UserProfile(models.Model):
         self.total_queries = self.user.chat_history.count()
         self.save(update_fields=['total_queries', 'last_active'])
 
+    @classmethod
+    def increment_query_count(cls, user_id, n=1):
+        """Atomic total_queries += n (single UPDATE, no COUNT)"""
+        updated = cls.objects.filter(user_id=user_id).update(
+            total_queries=F('total_queries') + n,
+            last_active=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(
+                user_id=user_id,
+                defaults={'total_queries': ChatHistory.objects.filter(user_id=user_id).count()}
+            )
+
 
 # ============================================================================
 # Signals for automatic UserProfile management
@@ -69,10 +88,12 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=ChatHistory)
 def update_profile_on_chat(sender, instance, created, **kwargs):
-    """Update user profile stats when new chat is created"""
+    """
+    Count a chat saved one by one (views, admin, shell).
+    Batched writes use bulk_create, which sends no signal, and count their own.
+    """
     if created:
         try:
-            profile, created = UserProfile.objects.get_or_create(user=instance.user)
-            profile.update_query_count()
+            UserProfile.increment_query_count(instance.user_id)
         except Exception as e:
-            print(f"Error updating profile: {e}")
\ No newline at end of file
+            logger.error(f"Error updating profile: {e}")
\ No newline at end of file
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ChatHistory, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+def record_chat(user_id, query, response, sources, sources_json):
+    """Synchronous write: one INSERT, the post_save signal increments the counter once"""
+    return ChatHistory.objects.create(
+        user_id=user_id,
+        query=query,
+        response=response,
+        sources=sources,
+        sources_json=sources_json
+    )
+
+
+class ChatWriter:
+    """
+    Background writer for chat history, off the response path.
+
+    Views enqueue exchanges; a daemon thread groups what arrives within
+    `flush_interval` (up to `batch_size`) into one transaction: a single
+    bulk INSERT plus one F() counter UPDATE per user. submit() never touches
+    the database, so it is safe in async code; when the queue is full it waits
+    for room rather than dropping the exchange.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=0.2, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+
+    def _running(self):
+        # A forked worker does not inherit the thread
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def _ensure_started(self):
+        if self._running():
+            return
+        with self._lock:
+            if not self._running():
+                if self._thread is not None and self._pid == os.getpid():
+                    logger.error("Chat writer thread died, restarting it")
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.flush)
+                    self._atexit_registered = True
+
+    def submit(self, user_id, query, response, sources, sources_json):
+        self._ensure_started()
+        item = (user_id, query, response, sources, sources_json)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.backpressure_waits += 1
+            self._queue.put(item)
+        with self._lock:
+            self.submitted += 1
+
+    def flush(self):
+        """Block until everything submitted so far is written"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                # Same connection lifecycle as a request (CONN_MAX_AGE, health checks)
+                close_old_connections()
+            except Exception as e:
+                logger.error(f"Closing stale database connections failed: {e}")
+            try:
+                self._write(batch)
+            except Exception as e:
+                # The only writer thread must survive any batch
+                self.failed += len(batch)
+                logger.exception(f"Chat batch lost ({len(batch)} chats): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        try:
+            with transaction.atomic():
+                ChatHistory.objects.bulk_create([
+                    ChatHistory(user_id=user_id, query=query, response=response,
+                                sources=sources, sources_json=sources_json)
+                    for user_id, query, response, sources, sources_json in batch
+                ])
+                for user_id, n in Counter(item[0] for item in batch).items():
+                    UserProfile.increment_query_count(user_id, n)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            logger.error(f"Batched chat write failed ({len(batch)} chats), writing one by one: {e}")
+            for item in batch:
+                try:
+                    with transaction.atomic():
+                        record_chat(*item)
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to save chat: {e}")
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "pending": self._queue.qsize(),
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+chat_writer = ChatWriter(
+    batch_size=getattr(settings, "CHAT_WRITE_BATCH_SIZE", 50),
+    flush_interval=getattr(settings, "CHAT_WRITE_FLUSH_INTERVAL", 0.2),
+)
+
+
+def save_chat(user_id, query, response, sources, sources_json):
+    """Persist one exchange: queued to the background writer, or inline if batching is off"""
+    if getattr(settings, "CHAT_WRITE_BATCHING", True):
+        chat_writer.submit(user_id, query, response, sources, sources_json)
+    else:
+        record_chat(user_id, query, response, sources, sources_json)
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    CPU cross-encoder reranking with a hard latency budget.
+
+    Candidates are scored in one batched forward pass on a worker thread; if
+    the pass does not finish within `budget_ms` the original vector order is
+    kept. When every worker is still busy with earlier passes, reranking is
+    skipped rather than queued. Recent rerank times and scores are kept for tuning.
+    """
+
+    def __init__(self, model_name, budget_ms=300, history=1000, max_workers=2):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.max_workers = max_workers
+
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._running = 0
+
+        self._times_ms = deque(maxlen=history)
+        self._scores = deque(maxlen=history * 20)
+        self.calls = 0
+        self.fallbacks = 0
+        self.saturated = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def preload(self):
+        """Load the cross-encoder ahead of the first query (warm-up)"""
+        return self.model
+
+    def _score(self, pairs):
+        # On the worker: a model still loading counts against the budget, not before it
+        return self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    def _done(self, future):
+        with self._lock:
+            self._running -= 1
+
+    def rerank(self, query, results, top_k):
+        """Reorder Qdrant points by cross-encoder score and keep the best `top_k`"""
+        if len(results) <= 1:
+            return results[:top_k]
+
+        with self._lock:
+            saturated = self._running >= self.max_workers
+            if saturated:
+                self.calls += 1
+                self.fallbacks += 1
+                self.saturated += 1
+            else:
+                self._running += 1
+        if saturated:
+            # Passes that exceeded their budget still hold every worker: don't queue behind them
+            logger.warning("Rerank workers busy, keeping vector order")
+            return results[:top_k]
+
+        pairs = [(query, r.payload["chunk"]) for r in results]
+        started = time.perf_counter()
+        future = self._executor.submit(self._score, pairs)
+        future.add_done_callback(self._done)
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.calls += 1
+                self.fallbacks += 1
+            logger.warning(f"Rerank exceeded {self.budget_ms} ms budget, keeping vector order")
+            return results[:top_k]
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.calls += 1
+            self._times_ms.append(elapsed_ms)
+            self._scores.extend(float(s) for s in scores)
+
+        order = np.argsort(-np.asarray(scores))[:top_k]
+        return [results[i] for i in order]
+
+    def stats(self):
+        with self._lock:
+            times = np.array(self._times_ms) if self._times_ms else np.zeros(1)
+            scores = np.array(self._scores) if self._scores else np.zeros(1)
+            return {
+                "model": self.model_name,
+                "budget_ms": self.budget_ms,
+                "calls": self.calls,
+                "fallbacks": self.fallbacks,
+                "saturated": self.saturated,
+                "time_ms": {
+                    "p50": round(float(np.percentile(times, 50)), 2),
+                    "p95": round(float(np.percentile(times, 95)), 2),
+                    "max": round(float(times.max()), 2),
+                },
+                "scores": {
+                    "min": round(float(scores.min()), 4),
+                    "p25": round(float(np.percentile(scores, 25)), 4),
+                    "p50": round(float(np.percentile(scores, 50)), 4),
+                    "p75": round(float(np.percentile(scores, 75)), 4),
+                    "max": round(float(scores.max()), 4),
+                },
+            }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Process-wide Reranker configured from settings"""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker(
+                    settings.RERANK_MODEL,
+                    budget_ms=settings.RERANK_BUDGET_MS,
+                )
+    return _reranker
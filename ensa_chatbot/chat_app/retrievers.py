@@ -0,0 +1,149 @@
+import json
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_qdrant import QdrantVectorStore
+from langchain_groq import ChatGroq
+from langchain.retrievers.self_query.base import SelfQueryRetriever
+from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain.chains.query_constructor.schema import AttributeInfo
+from sentence_transformers import SentenceTransformer
+
+from .utils import expand_query
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """LangChain embeddings backed by an already-loaded SentenceTransformer"""
+
+    def __init__(self, model: SentenceTransformer):
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embs = self.model.encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+        return embs.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.encode(text, convert_to_numpy=True, show_progress_bar=False).tolist()
+
+
+class LocalQueryLLM(LLM):
+    """
+    Deterministic stand-in for ChatGroq in the 'self' and 'multi' retrievers.
+    Answers the multi-query prompt with expand_query() variants and the
+    self-query prompt with the unfiltered question, so benchmarks can run
+    these modes offline without API quotas.
+    """
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-query"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        if "Structured Request" in prompt:
+            # Self-query prompt: the last 'User Query:' block is the real question
+            question = prompt.rsplit("User Query:", 1)[-1].split("Structured Request:", 1)[0].strip()
+            return "```json\n" + json.dumps({"query": question, "filter": "NO_FILTER"}, ensure_ascii=False) + "\n```"
+
+        # Multi-query prompt: one variant per line
+        question = prompt.rsplit("Original question:", 1)[-1].strip()
+        return "\n".join(expand_query(question, max_variants=3))
+
+
+# -------------------------
+#   Retriever registry
+# -------------------------
+class RetrieverRegistry:
+    """
+    Process-wide cache of the LangChain objects used by Search() in 'self' and 'multi' modes.
+    Vector stores, Groq LLMs and retrievers are built once and reused across requests.
+    Safe to share between threads of a WSGI/ASGI worker.
+    """
+
+    def __init__(self):
+        # Guards creation only; retriever() builds its dependencies before taking it,
+        # reentrancy just keeps a factory that calls back into the registry from deadlocking
+        self._lock = threading.RLock()
+        self._objects = {}
+        self._llm_factory = _groq_llm
+
+    def _get_or_create(self, key, factory):
+        obj = self._objects.get(key)
+        if obj is None:
+            with self._lock:
+                obj = self._objects.get(key)
+                if obj is None:
+                    obj = factory()
+                    self._objects[key] = obj
+        return obj
+
+    def vectorstore(self, client, collection_name, embedding_model):
+        """QdrantVectorStore sharing the SentenceTransformer loaded by the app"""
+        key = ("vectorstore", id(client), collection_name, id(embedding_model))
+        return self._get_or_create(key, lambda: QdrantVectorStore(
+            client=client,
+            embedding=SentenceTransformerEmbeddings(embedding_model),
+            collection_name=collection_name,
+            vector_name="default",
+            content_payload_key="chunk"
+        ))
+
+    def llm(self, groq_key):
+        """ChatGroq client used for query rewriting / metadata filtering"""
+        return self._get_or_create(("llm", groq_key), lambda: self._llm_factory(groq_key))
+
+    def use_llm_factory(self, factory=None):
+        """Swap the LLM behind the retrievers (None restores ChatGroq); drops cached objects"""
+        with self._lock:
+            self._llm_factory = factory or _groq_llm
+            self._objects.clear()
+
+    def retriever(self, mode, client, collection_name, embedding_model, groq_key):
+        """Self-query or multi-query retriever bound to one API key"""
+        key = ("retriever", mode, id(client), collection_name, id(embedding_model), groq_key)
+        obj = self._objects.get(key)
+        if obj is None:
+            # Dependencies first, so the retriever factory runs without nested creations
+            vectorstore = self.vectorstore(client, collection_name, embedding_model)
+            llm = self.llm(groq_key)
+            obj = self._get_or_create(key, lambda: _build_retriever(mode, vectorstore, llm))
+        return obj
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+def _groq_llm(groq_key):
+    return ChatGroq(
+        groq_api_key=groq_key,
+        model_name="openai/gpt-oss-20b",
+        temperature=0
+    )
+
+
+def _build_retriever(mode, vectorstore, llm):
+    if mode == "self":
+        metadata_fields = [
+            AttributeInfo(name="name", description="Document name", type="string"),
+            AttributeInfo(name="categorie", description="Document category", type="string"),
+            AttributeInfo(name="source", description="Original file path", type="string"),
+            AttributeInfo(name="part", description="Chunk part number", type="integer"),
+        ]
+        return SelfQueryRetriever.from_llm(
+            llm=llm,
+            vectorstore=vectorstore,
+            document_contents="ENSA documents",
+            metadata_field_info=metadata_fields,
+            verbose=True
+        )
+    if mode == "multi":
+        return MultiQueryRetriever.from_llm(
+            retriever=vectorstore.as_retriever(),
+            llm=llm
+        )
+    raise ValueError(f"Unknown retriever mode: {mode}")
+
+
+retriever_registry = RetrieverRegistry()
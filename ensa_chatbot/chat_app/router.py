@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+class CategoryRouter:
+    """
+    Nearest-centroid classifier of queries over the `categorie` payload.
+
+    Each category is represented by the normalized mean of its chunk embeddings,
+    computed at index time, so routing a query costs one small matrix product on
+    the query embedding the search computes anyway (no LLM call).
+    Built by chunk_Embedd and persisted next to the index manifest.
+    """
+
+    def __init__(self, categories, centroids, counts=None, min_score=0.3, margin=0.02, max_categories=2):
+        self.categories = list(categories)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        if self.categories:
+            self.centroids = self.centroids.reshape(len(self.categories), -1)
+        self.counts = list(counts) if counts is not None else [0] * len(self.categories)
+        # Routing is confident when the best category scores at least `min_score`
+        # and at most `max_categories` categories lie within `margin` of it
+        self.min_score = min_score
+        self.margin = margin
+        self.max_categories = max_categories
+
+    @classmethod
+    def build(cls, categories, vectors, **kwargs):
+        """One centroid per distinct category of the (category, vector) pairs"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        rows = {}
+        for i, category in enumerate(categories):
+            if category:
+                rows.setdefault(category, []).append(i)
+
+        labels = sorted(rows)
+        centroids = []
+        for label in labels:
+            centroid = vectors[rows[label]].mean(axis=0)
+            centroids.append(centroid / max(np.linalg.norm(centroid), 1e-12))
+        return cls(labels, np.array(centroids, dtype=np.float32).reshape(len(labels), vectors.shape[1]),
+                   counts=[len(rows[label]) for label in labels], **kwargs)
+
+    def scores(self, query_embedding):
+        """Cosine similarity of the query to every category centroid"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        return self.centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+    def route(self, query_embedding):
+        """
+        Categories to filter the search on, best first, with the best score.
+        An empty list means the router is not confident: search unfiltered.
+        """
+        if not self.categories:
+            return [], 0.0
+        scores = self.scores(query_embedding)
+        best = float(scores.max())
+        close = [i for i in np.argsort(-scores) if scores[i] >= best - self.margin]
+        if best < self.min_score or len(close) > self.max_categories:
+            return [], best
+        return [self.categories[i] for i in close], best
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "categories": self.categories,
+                "counts": self.counts,
+                "centroids": self.centroids.tolist(),
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["categories"], data["centroids"], counts=data.get("counts"), **kwargs)
+
+
+def build_category_router(client, collection_name, extra=(), skip_ids=(), batch_size=512, **kwargs):
+    """
+    Centroids of every point stored in the collection, read back with their vectors.
+    extra: (category, vector) pairs just upserted (not yet visible to a scroll);
+    skip_ids: IDs to leave out (those same points, stale points).
+    """
+    categories = [category for category, _ in extra]
+    vectors = [vector for _, vector in extra]
+    skip_ids = set(skip_ids)
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["categorie"],
+            with_vectors=["default"]
+        )
+        for r in records:
+            vector = r.vector.get("default") if isinstance(r.vector, dict) else r.vector
+            if vector is not None and str(r.id) not in skip_ids:
+                categories.append((r.payload or {}).get("categorie"))
+                vectors.append(vector)
+        if offset is None:
+            break
+    if not vectors:
+        return CategoryRouter([], np.zeros((0, 0), dtype=np.float32), **kwargs)
+    return CategoryRouter.build(categories, vectors, **kwargs)
+
+
+# -------------------------
+#   Shared instance (reloaded after a re-index)
+# -------------------------
+_router_lock = threading.Lock()
+_router = None
+_router_mtime = None
+
+
+def get_category_router(path=None):
+    """
+    Load the persisted router once per process, with the ROUTER_* thresholds.
+    Reloaded automatically when the file is rewritten by a re-index.
+    Returns None if it has not been built yet.
+    """
+    global _router, _router_mtime
+    from django.conf import settings
+    if path is None:
+        path = settings.ROUTER_PATH
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    if _router is None or mtime != _router_mtime:
+        with _router_lock:
+            if _router is None or mtime != _router_mtime:
+                _router = CategoryRouter.load(
+                    path,
+                    min_score=settings.ROUTER_MIN_SCORE,
+                    margin=settings.ROUTER_MARGIN,
+                    max_categories=settings.ROUTER_MAX_CATEGORIES,
+                )
+                _router_mtime = mtime
+    return _router
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# content is the parsed JSON for .json files, the text for .txt files
+SourceDocument = namedtuple("SourceDocument", ["key", "path", "name", "content"])
+
+SOURCE_EXTENSIONS = (".json", ".txt")
+
+
+def normalize_source(source):
+    """Qdrant payloads may carry Windows paths from the indexing machine"""
+    return source.replace("\\", "/")
+
+
+class SourceStore:
+    """
+    Documents of the data folder, loaded once per process.
+
+    Documents are keyed by their path relative to the data folder
+    ('emploi-temps/GI1.json'); a payload source from any machine resolves to
+    that key through its trailing path components, and resolutions are
+    memoized. The folder is re-stat'ed at most every `check_interval` seconds
+    and reloaded when a file is added, removed or modified.
+    """
+
+    def __init__(self, data_path, check_interval=5.0):
+        self.data_path = str(data_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._documents = None
+        self._aliases = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def _scan(self):
+        """(relative key, absolute path) of every source file, plus a signature of their mtimes/sizes"""
+        files = []
+        digest = hashlib.sha256()
+        for root, _, names in os.walk(self.data_path):
+            for name in sorted(names):
+                if not name.endswith(SOURCE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                key = normalize_source(os.path.relpath(path, self.data_path))
+                stat = os.stat(path)
+                files.append((key, path))
+                digest.update(f"{key}|{stat.st_mtime_ns}|{stat.st_size}\n".encode("utf-8"))
+        return files, digest.hexdigest()
+
+    def _load(self, files):
+        documents = {}
+        for key, path in files:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = json.load(f) if path.endswith(".json") else f.read()
+            except Exception as e:
+                logger.error(f"Error loading source {key}: {str(e)}")
+                continue
+            documents[key] = SourceDocument(key, normalize_source(path), os.path.basename(path), content)
+        return documents
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._documents is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._documents is not None and now - self._checked_at < self.check_interval:
+                return
+            files, signature = self._scan()
+            if signature != self._signature:
+                self._documents = self._load(files)
+                self._aliases = {}
+                self._signature = signature
+                self.reloads += 1
+            self._checked_at = time.monotonic()
+
+    def preload(self):
+        """Load the documents now rather than on the first request"""
+        self._ensure_fresh()
+
+    def documents(self):
+        """{key: SourceDocument} of the current load; a new dict after every reload"""
+        self._ensure_fresh()
+        return self._documents
+
+    def invalidate(self):
+        """Force a re-stat on the next lookup (called after a re-index)"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def get(self, source):
+        """SourceDocument for a payload source, or None if the file is not in the data folder"""
+        if not source:
+            return None
+        self._ensure_fresh()
+        documents = self._documents
+
+        key = self._aliases.get(source)
+        if key is None:
+            parts = normalize_source(source).split("/")
+            # Longest trailing match first: '.../data_final/emploi-temps/GI1.json' → 'emploi-temps/GI1.json'
+            for start in range(len(parts)):
+                candidate = "/".join(parts[start:])
+                if candidate in documents:
+                    key = candidate
+                    break
+            self._aliases[source] = key or ""
+        return documents.get(key) if key else None
+
+    def valid_sources(self, sources):
+        """Normalized payload sources that resolve to a loaded document, in order"""
+        return [normalize_source(s) for s in sources if self.get(s) is not None]
+
+    def display_name(self, source):
+        document = self.get(source)
+        return document.name if document else normalize_source(source).split("/")[-1]
+
+    def stats(self):
+        return {
+            "documents": len(self._documents or {}),
+            "aliases": len(self._aliases),
+            "reloads": self.reloads,
+        }
+
+
+source_store = SourceStore(settings.DATA_DIR)
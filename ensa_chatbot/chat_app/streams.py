@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCoalescer:
+    """
+    Groups streamed LLM deltas into fewer SSE frames: text is flushed once it
+    reaches `max_chars` characters (0: no size limit) or `max_ms` milliseconds
+    after the last flush. max_ms=0 sends every delta as its own frame.
+    """
+
+    def __init__(self, max_chars=64, max_ms=50):
+        self.max_chars = max_chars
+        self.max_seconds = max_ms / 1000
+        self._pending = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, text):
+        """Buffer a delta; returns the text to send now, or None"""
+        self._pending.append(text)
+        self._size += len(text)
+        if (self.max_chars and self._size >= self.max_chars) \
+                or time.monotonic() - self._last_flush >= self.max_seconds:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Buffered text (None if empty)"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return None
+        text = "".join(self._pending)
+        self._pending = []
+        self._size = 0
+        return text
+
+
+def coalescer():
+    return TokenCoalescer(settings.SSE_COALESCE_CHARS, settings.SSE_COALESCE_MS)
+
+
+class Flight:
+    """
+    Users sharing one in-flight answer (single-flight): the first request
+    produces it, identical requests arriving meanwhile join and read the same
+    events. Joins are refused once the answer is being saved.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.followers = []  # (user, query) of the joined requests
+        self.open = True
+
+    def join(self, user, query):
+        if not self.open:
+            return False
+        self.followers.append((user, query))
+        return True
+
+    def seal(self):
+        """Close the flight to new users; returns the joined (user, query) pairs"""
+        self.open = False
+        return list(self.followers)
+
+    @property
+    def user_ids(self):
+        return {user.id for user, _ in self.followers}
+
+
+class ResponseStream:
+    """
+    SSE events of one answer, produced once by a background task and replayable.
+
+    Every event carries an `id: <stream>:<seq>` field and the last
+    `buffer_size` events are kept, so a client reconnecting with Last-Event-ID
+    resumes where it stopped instead of triggering a new retrieval and
+    generation. Generation continues if the client goes away.
+    """
+
+    def __init__(self, producer, user_id, buffer_size=512, flight=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.flight = flight
+        self.registry = None
+        self.events = deque(maxlen=buffer_size)  # (seq, payload type, encoded event)
+        self.next_seq = 0
+        self.text = ""  # token content so far, sent when a resume point was evicted
+        self.closed = False
+        self.closed_at = None
+        self.bytes = 0
+        self._producer = producer
+        self._task = None
+        self._changed = None
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def append(self, payload):
+        if payload.get("type") == "token":
+            self.text += payload.get("content", "")
+        seq = self.next_seq
+        self.next_seq += 1
+        event = f"id: {self.id}:{seq}\ndata: {json.dumps(payload)}\n\n"
+        self.events.append((seq, payload.get("type"), event))
+        self.bytes += len(event.encode("utf-8"))
+        self._notify()
+
+    def allows(self, user_id):
+        """Whether `user_id` started or joined this answer"""
+        return user_id == self.user_id or (self.flight is not None and user_id in self.flight.user_ids)
+
+    def close(self):
+        self.closed = True
+        self.closed_at = time.monotonic()
+        self._notify()
+
+    async def _pump(self):
+        try:
+            async for payload in self._producer:
+                self.append(payload)
+        except Exception as e:
+            logger.exception(f"Stream {self.id} failed: {e}")
+            self.append({"content": "Erreur lors de la génération de la réponse.", "done": True})
+        finally:
+            self.close()
+            if self.registry is not None:
+                self.registry.finished(self)
+
+    def start(self):
+        """Run the producer on the current event loop (once)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def read(self, after=None, heartbeat=15.0):
+        """
+        Encoded events following sequence number `after` (None: from the start),
+        then the live ones; a comment line is sent every `heartbeat` idle seconds.
+        """
+        self.start()
+        last = -1 if after is None else after
+        if self.events and self.events[0][0] > last + 1:
+            # The resume point (or the start, for a late joiner) left the buffer:
+            # resend the whole answer so far instead
+            last = max((seq for seq, kind, _ in self.events if kind == "token"), default=last)
+            yield f"id: {self.id}:{last}\ndata: {json.dumps({'type': 'replace', 'content': self.text})}\n\n"
+
+        while True:
+            pending = [(seq, event) for seq, _, event in self.events if seq > last]
+            for seq, event in pending:
+                yield event
+                last = seq
+            if self.closed and last >= self.next_seq - 1:
+                return
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+
+class StreamRegistry:
+    """
+    Streams of this process by id, kept `ttl` seconds after they end for late
+    resumes, and in-flight answers by flight key for request coalescing
+    """
+
+    def __init__(self, ttl=120):
+        self.ttl = ttl
+        self._streams = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.resumed = 0
+        self.coalesced = 0
+        self.events = 0
+        self.bytes = 0
+
+    def _purge(self, now):
+        expired = [sid for sid, s in self._streams.items() if s.closed and now - s.closed_at > self.ttl]
+        for sid in expired:
+            del self._streams[sid]
+
+    def create(self, producer, user_id, flight=None):
+        stream = ResponseStream(producer, user_id, buffer_size=settings.SSE_RESUME_BUFFER, flight=flight)
+        stream.registry = self
+        with self._lock:
+            self._purge(time.monotonic())
+            self._streams[stream.id] = stream
+            if flight is not None:
+                self._flights[flight.key] = stream
+            self.started += 1
+        return stream
+
+    def join(self, key, user, query):
+        """In-flight stream answering the same question, now shared with `user`, or None"""
+        with self._lock:
+            stream = self._flights.get(key)
+            if stream is None or stream.closed or not stream.flight.join(user, query):
+                return None
+            self.coalesced += 1
+        return stream
+
+    def finished(self, stream):
+        with self._lock:
+            self.events += stream.next_seq
+            self.bytes += stream.bytes
+            if stream.flight is not None and self._flights.get(stream.flight.key) is stream:
+                del self._flights[stream.flight.key]
+
+    def resume(self, last_event_id, user_id):
+        """(stream, seq) for a Last-Event-ID header of this user, or None"""
+        stream_id, _, seq = (last_event_id or "").partition(":")
+        with self._lock:
+            self._purge(time.monotonic())
+            stream = self._streams.get(stream_id)
+        if stream is None or not stream.allows(user_id) or not seq.isdigit():
+            return None
+        with self._lock:
+            self.resumed += 1
+        return stream, int(seq)
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for s in self._streams.values() if not s.closed)
+            return {
+                "active": active,
+                "buffered": len(self._streams),
+                "started": self.started,
+                "resumed": self.resumed,
+                "in_flight": len(self._flights),
+                "coalesced": self.coalesced,
+                "events": self.events,
+                "bytes": self.bytes,
+            }
+
+
+stream_registry = StreamRegistry(ttl=settings.SSE_RESUME_TTL)
@@ -0,0 +1,806 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from qdrant_client.models import UpdateStatus
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cache import SemanticCache, is_cacheable, query_entities
+from .context import ContextChunk, build_context
+from .embedding import load_embedding_model
+from .evaluation import evaluate_mode
+from .key_pool import GroqKeyPool, parse_duration
+from .models import ChatHistory, UserProfile
+from .persistence import ChatWriter
+from .rerank import Reranker
+from . import retrievers
+from .apps import ChatbotConfig
+from .lexical import BM25Index
+from .router import CategoryRouter
+from .sources import SourceStore
+from .streams import Flight, ResponseStream, StreamRegistry, TokenCoalescer, stream_registry
+from .timetable import TimetableIndex
+from .utils import (GenerationGroq, embed_and_upsert, payload_matches, quantization_config, quantization_search_params,
+                    search_filter, section_code)
+
+
+class ConstantQueryCountTests(TestCase):
+    """Listing users must cost the same number of queries for 2 or 20 users"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@ensa.ma', 'admin123')
+        self.created = 0
+
+    def add_users(self, count, chats_per_user=3):
+        for _ in range(count):
+            self.created += 1
+            user = User.objects.create_user(f'student{self.created}', password='student123')
+            ChatHistory.objects.bulk_create([
+                ChatHistory(user=user, query=f'Question {n}', response='Réponse')
+                for n in range(chats_per_user)
+            ])
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, func):
+        self.add_users(2)
+        small = self.count_queries(func)
+        self.add_users(18)
+        self.assertEqual(self.count_queries(func), small)
+
+    def test_list_users_detailed(self):
+        self.assertConstantQueries(lambda: call_command('list_users', stdout=StringIO()))
+
+    def test_list_users_simple(self):
+        self.assertConstantQueries(lambda: call_command('list_users', '--format', 'simple', stdout=StringIO()))
+
+    def test_list_users_totals(self):
+        self.add_users(4)
+        out = StringIO()
+        call_command('list_users', stdout=out)
+        self.assertIn('Total: 5 utilisateur(s)', out.getvalue())
+        self.assertIn('Questions totales: 12', out.getvalue())
+
+    def test_user_stats(self):
+        self.assertConstantQueries(lambda: call_command('user_stats', stdout=StringIO()))
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for name in ('admin:auth_user_changelist',
+                     'admin:chat_app_chathistory_changelist',
+                     'admin:chat_app_userprofile_changelist'):
+            with self.subTest(changelist=name):
+                url = reverse(name)
+                self.assertConstantQueries(lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+
+class WhitespaceTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+class ContextBuilderTests(SimpleTestCase):
+    """Duplicated and overlapping chunks must not reach the prompt"""
+
+    clubs = ("Presse ENSA Tétouan regroupe des étudiants qui publient les informations des clubs "
+             "et les communiqués de l'administration sur le site web de l'école.")
+    clubs_reph = ("Le club Presse ENSA Tétouan regroupe des étudiants publiant sur le site web de "
+                  "l'école les informations des clubs et les communiqués de l'administration.")
+    calendar = "Les examens du semestre de printemps commencent le lundi 9 juin."
+
+    def build(self, chunks, budget=500):
+        return build_context(chunks, budget, tokenizer=WhitespaceTokenizer())
+
+    def test_paraphrase_of_same_document_is_dropped(self):
+        context, stats = self.build([
+            ContextChunk(f"Cela concerne: les clubs\n\n{self.clubs}", "clubs/les clubs.txt", 1, None),
+            ContextChunk(f"Cela concerne: les clubs_reph\n\n{self.clubs_reph}", "clubs/les clubs_reph.txt", 1, None),
+            ContextChunk(f"Cela concerne: calendrier\n\n{self.calendar}", "calendrier/calendrier.txt", 1, None),
+        ])
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertNotIn(self.clubs_reph, context)
+        self.assertIn(self.calendar, context)
+
+    def test_neighbouring_windows_are_trimmed_and_share_a_header(self):
+        first = "Lundi 08:30 Analyse numérique salle A1. Lundi 10:15 Réseaux salle B2."
+        second = "Lundi 10:15 Réseaux salle B2. Lundi 14:00 Base de données salle C3."
+        context, stats = self.build([
+            ContextChunk(f"Cela concerne: GI1\n\n{second}", "emploi-temps/GI1.json", 2, None),
+            ContextChunk(f"Cela concerne: GI1\n\n{first}", "emploi-temps/GI1.json", 1, None),
+        ])
+        self.assertEqual(stats["kept"], 2)
+        self.assertEqual(context.count("Cela concerne: GI1"), 1)
+        self.assertEqual(context.count("Lundi 10:15 Réseaux salle B2."), 1)
+        self.assertLess(context.index("Analyse"), context.index("Base de données"))
+
+    def test_rejected_neighbour_does_not_cut_the_kept_window(self):
+        first = "Lundi 08:30 Analyse numérique salle A1. Lundi 10:15 Réseaux salle B2."
+        second = "Lundi 10:15 Réseaux salle B2. Lundi 14:00 Base de données salle C3."
+        context, stats = self.build([
+            ContextChunk(f"Cela concerne: GI1\n\n{second}", "emploi-temps/GI1.json", 2, 0.9),
+            ContextChunk(f"Cela concerne: GI1\n\n{first}", "emploi-temps/GI1.json", 1, 0.5),
+        ], budget=17)
+        self.assertEqual((stats["kept"], stats["over_budget"]), (1, 1))
+        self.assertIn("Lundi 10:15 Réseaux salle B2.", context)
+        self.assertEqual(stats["tokens"], 15)  # header + the untouched part 2
+
+    def test_packs_best_chunks_within_budget(self):
+        chunks = [
+            ContextChunk(f"Cela concerne: doc{n}\n\n" + " ".join(f"mot{n}_{i}" for i in range(40)),
+                         f"doc{n}.txt", 1, score)
+            for n, score in enumerate([0.2, 0.9, 0.5])
+        ]
+        context, stats = self.build(chunks, budget=100)
+        self.assertLessEqual(stats["tokens"], 100)
+        self.assertEqual(stats["kept"], 2)
+        self.assertIn("doc1", context)
+        self.assertIn("doc2", context)
+        self.assertNotIn("doc0", context)
+
+
+class TimetableTests(SimpleTestCase):
+    """Timetable questions answered from the emploi-temps files, everything else left to RAG"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = TimetableIndex(SourceStore(settings.DATA_DIR))
+
+    def test_section_day_and_time(self):
+        response, sources = self.index.answer("quel cours a GI1 mardi à 11h")
+        self.assertIn("| 10h30 - 12h00 | Développement Web | Jourani | STPI7 |", response)
+        self.assertNotIn("Langues", response)
+        self.assertEqual(len(sources), 1)
+        self.assertTrue(sources[0].endswith("GI1.json"))
+
+    def test_section_by_name(self):
+        response, _ = self.index.answer("Quel est l'emploi du temps de génie informatique 1ère année jeudi ?")
+        self.assertIn("GI1", response)
+        self.assertIn("Programmation Orientée Objet Java", response)
+
+    def test_module_location(self):
+        response, _ = self.index.answer("où est le cours de Développement Web")
+        self.assertIn("STPI7", response)
+
+    def test_empty_day(self):
+        response, _ = self.index.answer("emploi du temps GI1 samedi")
+        self.assertIn("Aucune séance", response)
+
+    def test_other_questions_fall_back(self):
+        for query in ("Quels sont les clubs de l'école ?",
+                      "Qui est le chef du département génie informatique ?",
+                      "quand commencent les examens ?"):
+            with self.subTest(query=query):
+                self.assertIsNone(self.index.answer(query))
+
+    def test_general_questions_naming_a_module_or_section_fall_back(self):
+        for query in ("Quand commence la formation continue en management ?",
+                      "Quels cours sont enseignés dans le département intelligence artificielle ?",
+                      "Quand a lieu l'examen de Java avancé ?",
+                      "Quand commencent les cours du semestre de printemps pour GI1 ?"):
+            with self.subTest(query=query):
+                self.assertIsNone(self.index.answer(query))
+
+
+class CategoryRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = CategoryRouter.build(
+            ['clubs', 'clubs', 'calendrier', 'emploi du temps', 'emploi-temps'],
+            [[1, 0.1, 0, 0], [1, -0.1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0.05], [0, 0, 1, -0.05]],
+        )
+
+    def test_centroid_per_category(self):
+        self.assertEqual(self.router.categories, ['calendrier', 'clubs', 'emploi du temps', 'emploi-temps'])
+        self.assertEqual(self.router.counts, [1, 2, 1, 1])
+
+    def test_routes_to_nearest_category(self):
+        categories, score = self.router.route([0.9, 0.1, 0, 0])
+        self.assertEqual(categories, ['clubs'])
+        self.assertGreater(score, 0.9)
+
+    def test_twin_categories_are_routed_together(self):
+        categories, _ = self.router.route([0, 0, 1, 0])
+        self.assertEqual(sorted(categories), ['emploi du temps', 'emploi-temps'])
+
+    def test_unsure_query_is_not_filtered(self):
+        # Closest to nothing in particular
+        self.assertEqual(self.router.route([0, 0, 0, 1])[0], [])
+        # Equally close to three categories
+        self.assertEqual(self.router.route([1, 1, 1, 0])[0], [])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'router.json')
+            self.router.save(path)
+            loaded = CategoryRouter.load(path, margin=0.5)
+        self.assertEqual(loaded.categories, self.router.categories)
+        self.assertEqual(loaded.margin, 0.5)
+        self.assertEqual(loaded.route([0.9, 0.1, 0, 0])[0], ['clubs'])
+
+
+class SearchFilterTests(SimpleTestCase):
+    def test_section_code(self):
+        self.assertEqual(section_code('emploi du temps-genie informatique-1ere annee-GI1.json'), 'GI1')
+        self.assertEqual(section_code('emploi du temps-Big data & IA-1ere annee-BDIA1_reph.txt'), 'BDIA1')
+        self.assertIsNone(section_code('les clubs de l\'ecole.txt'))
+
+    def test_qdrant_filter(self):
+        self.assertIsNone(search_filter({'category': None}))
+        conditions = search_filter({'category': 'clubs', 'section': ['gi1', 'GI2']}).must
+        self.assertEqual([c.key for c in conditions], ['categorie', 'section'])
+        self.assertEqual(conditions[0].match.value, 'clubs')
+        self.assertEqual(conditions[1].match.any, ['GI1', 'GI2'])
+        with self.assertRaises(ValueError):
+            search_filter({'departement': 'GI'})
+
+    def test_lexical_search_is_filtered(self):
+        index = BM25Index.build(
+            ['a', 'b'],
+            ['cours de java GI1', 'cours de java GI2'],
+            [{'section': 'GI1', 'categorie': 'emploi du temps'}, {'section': 'GI2', 'categorie': 'emploi du temps'}],
+        )
+        hits = index.search('cours java', where=payload_matches({'section': 'gi2'}))
+        self.assertEqual([h.id for h in hits], ['b'])
+
+
+class QuantizationTests(SimpleTestCase):
+    def test_configs(self):
+        self.assertIsNone(quantization_config(None))
+        self.assertTrue(quantization_config('scalar').scalar.always_ram)
+        self.assertTrue(quantization_config('binary').binary.always_ram)
+        with self.assertRaises(ValueError):
+            quantization_config('int4')
+
+    def test_search_params_rescore(self):
+        self.assertIsNone(quantization_search_params(None))
+        params = quantization_search_params(2.0).quantization
+        self.assertTrue(params.rescore)
+        self.assertEqual(params.oversampling, 2.0)
+
+
+class IndexingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.upserted = []
+        self.status = UpdateStatus.COMPLETED
+
+        def upsert(collection_name, points, wait):
+            self.upserted.extend(points)
+            return SimpleNamespace(status=self.status if wait else UpdateStatus.ACKNOWLEDGED)
+
+        self.client = SimpleNamespace(upsert=upsert)
+        self.encoded = threading.Event()
+
+        def encode(texts, **kwargs):
+            self.encoded.set()
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+        self.model = SimpleNamespace(encode=encode)
+
+    def test_encoding_starts_while_items_are_still_loading(self):
+        waited = []
+
+        def items():
+            for i in range(4):
+                yield str(i), f'chunk {i}', {'part': i}
+            # the next file is only read once the first batch has been encoded
+            waited.append(self.encoded.wait(5))
+            for i in range(4, 6):
+                yield str(i), f'chunk {i}', {'part': i}
+
+        stats = embed_and_upsert(self.client, 'test', self.model, items(), batch_size=4)
+        self.assertEqual(waited, [True])
+        self.assertEqual(stats['chunks'], 6)
+        self.assertEqual(sorted(p.id for p in self.upserted), ['0', '1', '2', '3', '4', '5'])
+
+    def test_loading_errors_are_raised(self):
+        def items():
+            yield '0', 'chunk 0', {}
+            raise OSError('unreadable file')
+
+        with self.assertRaises(OSError):
+            embed_and_upsert(self.client, 'test', self.model, items(), batch_size=4)
+
+    def test_upserts_not_applied_by_qdrant_are_raised(self):
+        self.status = UpdateStatus.ACKNOWLEDGED
+        items = [(str(i), f'chunk {i}', {}) for i in range(3)]
+        with self.assertRaises(RuntimeError):
+            embed_and_upsert(self.client, 'test', self.model, items, batch_size=2)
+
+
+class EmbeddingBackendTests(SimpleTestCase):
+    def test_onnx_without_optimum_is_a_configuration_error(self):
+        with mock.patch.dict('sys.modules', {'optimum': None, 'optimum.onnxruntime': None}):
+            for backend in ('onnx', 'onnx-int8'):
+                with self.assertRaisesMessage(ImproperlyConfigured, 'optimum[onnxruntime]'):
+                    load_embedding_model('camembert-base', backend, tempfile.gettempdir())
+
+
+class EvaluationTests(SimpleTestCase):
+    def test_errors_count_as_misses(self):
+        def search(question, *args, **kwargs):
+            if question == 'difficile':
+                raise ValueError('no retriever')
+            return 'contexte', ['clubs/clubs.txt']
+
+        pairs = [('clubs', ''), ('clubs encore', ''), ('difficile', '')]
+        with mock.patch('chat_app.evaluation.Search', search), \
+                mock.patch('chat_app.evaluation.get_tokenizer', return_value=WhitespaceTokenizer()):
+            result = evaluate_mode(pairs, ['clubs', 'clubs', 'clubs'], None, 'test', None, 'default')
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['recall@3'], 0.6667)
+        self.assertEqual(result['recall@3_answered'], 1.0)
+        self.assertEqual(result['mrr'], 0.6667)
+
+
+class StreamTests(SimpleTestCase):
+    def test_coalescer_groups_deltas(self):
+        frames = TokenCoalescer(max_chars=8, max_ms=60000)
+        self.assertIsNone(frames.add('Bon'))
+        self.assertEqual(frames.add('jour !'), 'Bonjour !')
+        self.assertIsNone(frames.add(' Ok'))
+        self.assertEqual(frames.flush(), ' Ok')
+        self.assertIsNone(frames.flush())
+
+    def test_coalescing_disabled(self):
+        frames = TokenCoalescer(max_chars=0, max_ms=0)
+        self.assertEqual(frames.add('a'), 'a')
+        self.assertEqual(frames.add('b'), 'b')
+
+    @staticmethod
+    def _collect(stream, after=None):
+        async def read():
+            return [event async for event in stream.read(after=after, heartbeat=1)]
+        return asyncio.run(read())
+
+    @staticmethod
+    async def _answer():
+        for word in ['Le ', 'club ', 'robotique.']:
+            yield {'content': word, 'type': 'token'}
+        yield {'type': 'done'}
+
+    def test_resume_after_last_event_id(self):
+        stream = ResponseStream(self._answer(), user_id=1)
+        events = self._collect(stream)
+        self.assertEqual(len(events), 4)
+        self.assertTrue(events[0].startswith(f'id: {stream.id}:0\n'))
+
+        resumed = self._collect(stream, after=1)
+        self.assertEqual(resumed, events[2:])
+
+    def test_evicted_resume_point_resends_text(self):
+        stream = ResponseStream(self._answer(), user_id=1, buffer_size=2)
+        self._collect(stream)
+        resumed = self._collect(stream, after=0)
+        self.assertIn('"type": "replace"', resumed[0])
+        self.assertIn('Le club robotique.', resumed[0])
+        self.assertTrue(resumed[0].startswith(f'id: {stream.id}:2\n'))
+        self.assertIn('"type": "done"', resumed[-1])
+
+    def test_identical_questions_share_one_stream(self):
+        registry = StreamRegistry()
+        flight = Flight('default:le club robotique')
+        stream = registry.create(self._answer(), 1, flight=flight)
+        self.assertIs(registry.join(flight.key, SimpleNamespace(id=2), 'Le club robotique ?'), stream)
+        self.assertIsNone(registry.join('default:autre question', SimpleNamespace(id=3), 'Autre question'))
+
+        # Followers read the whole answer and may resume it; other users may not
+        self.assertEqual(len(self._collect(stream)), 4)
+        self.assertIsNotNone(registry.resume(f'{stream.id}:1', 2))
+        self.assertIsNone(registry.resume(f'{stream.id}:1', 3))
+
+        self.assertEqual([user.id for user, _ in flight.seal()], [2])
+        self.assertIsNone(registry.join(flight.key, SimpleNamespace(id=4), 'le club robotique'))
+        stats = registry.stats()
+        self.assertEqual((stats['coalesced'], stats['in_flight']), (1, 0))
+
+
+class RetrieverRegistryTests(SimpleTestCase):
+    def test_retriever_is_built_once_without_deadlock(self):
+        registry = retrievers.RetrieverRegistry()
+        registry.use_llm_factory(lambda key: f'llm-{key}')
+        built = []
+
+        def build(mode, vectorstore, llm):
+            built.append((mode, vectorstore, llm))
+            return object()
+
+        results = []
+        with mock.patch.object(retrievers, 'QdrantVectorStore', lambda **kw: f'store-{kw["collection_name"]}'), \
+                mock.patch.object(retrievers, '_build_retriever', build):
+            worker = threading.Thread(
+                target=lambda: results.extend(
+                    registry.retriever('multi', 'client', 'ensa', 'model', 'key') for _ in range(2)
+                ),
+                daemon=True,
+            )
+            worker.start()
+            worker.join(5)
+
+        self.assertFalse(worker.is_alive(), 'retriever() deadlocked')
+        self.assertEqual(built, [('multi', 'store-ensa', 'llm-key')])
+        self.assertIs(results[0], results[1])
+
+
+class ReadinessTests(SimpleTestCase):
+    def test_requests_do_not_wait_for_the_warm_up(self):
+        config = ChatbotConfig('chat_app', import_module('chat_app'))
+        config.ready()
+        release = threading.Event()
+
+        def initialize():
+            # A warm-up that does not finish before the end of the test
+            config.state = config.LOADING
+            release.wait(10)
+
+        with mock.patch.object(config, '_initialize', initialize):
+            config.warm_up(background=True)
+            deadline = time.monotonic() + 5
+            while config.state != config.LOADING and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            started = time.monotonic()
+            self.assertFalse(config.ensure_ready(wait=False))
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(config.readiness()['state'], 'loading')
+            release.set()
+
+
+class RerankerTests(SimpleTestCase):
+    def setUp(self):
+        self.results = [SimpleNamespace(payload={'chunk': chunk}) for chunk in ('a', 'b', 'c')]
+
+    def test_reorders_by_score(self):
+        reranker = Reranker('fake', budget_ms=1000)
+        reranker._model = SimpleNamespace(predict=lambda pairs, **kwargs: [0.1, 0.9, 0.5])
+        self.assertEqual([r.payload['chunk'] for r in reranker.rerank('q', self.results, 2)], ['b', 'c'])
+
+    def test_busy_workers_are_not_queued_behind(self):
+        release = threading.Event()
+
+        def predict(pairs, **kwargs):
+            release.wait(5)
+            return [0.0] * len(pairs)
+
+        reranker = Reranker('fake', budget_ms=50, max_workers=2)
+        reranker._model = SimpleNamespace(predict=predict)
+        try:
+            # Two passes over budget keep both workers busy
+            for _ in range(2):
+                self.assertEqual(reranker.rerank('q', self.results, 2), self.results[:2])
+            started = time.monotonic()
+            self.assertEqual(reranker.rerank('q', self.results, 2), self.results[:2])
+            self.assertLess(time.monotonic() - started, 0.04)
+            stats = reranker.stats()
+            self.assertEqual((stats['calls'], stats['fallbacks'], stats['saturated']), (3, 3, 1))
+        finally:
+            release.set()
+
+    def test_model_loading_counts_against_the_budget(self):
+        release = threading.Event()
+
+        class SlowCrossEncoder:
+            def __init__(self, *args, **kwargs):
+                release.wait(5)
+
+        reranker = Reranker('fake', budget_ms=50)
+        with mock.patch('sentence_transformers.CrossEncoder', SlowCrossEncoder):
+            try:
+                started = time.monotonic()
+                self.assertEqual(reranker.rerank('q', self.results, 2), self.results[:2])
+                self.assertLess(time.monotonic() - started, 1)
+            finally:
+                release.set()
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = [1000.0]
+        patcher = mock.patch('chat_app.cache.time', SimpleNamespace(monotonic=lambda: self.clock[0]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = SemanticCache(threshold=0.95, ttl=60, max_entries=2)
+
+    @staticmethod
+    def vector(*values):
+        vector = np.asarray(values, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def test_threshold(self):
+        self.cache.store(self.vector(1, 0, 0), 'Réponse clubs', ['clubs.txt'], 'Quels sont les clubs ?')
+        self.assertEqual(self.cache.lookup(self.vector(1, 0.1, 0), 'quels sont les clubs')['response'], 'Réponse clubs')
+        self.assertIsNone(self.cache.lookup(self.vector(1, 1, 0), 'quels sont les clubs'))
+
+    def test_ttl(self):
+        self.cache.store(self.vector(1, 0, 0), 'Réponse', [], 'question')
+        self.clock[0] += 59
+        self.assertIsNotNone(self.cache.lookup(self.vector(1, 0, 0), 'question'))
+        self.clock[0] += 2
+        self.assertIsNone(self.cache.lookup(self.vector(1, 0, 0), 'question'))
+
+    def test_lru_eviction(self):
+        self.cache.store(self.vector(1, 0, 0), 'a', [], 'question a')
+        self.cache.store(self.vector(0, 1, 0), 'b', [], 'question b')
+        self.cache.lookup(self.vector(1, 0, 0), 'question a')  # 'a' becomes the most recently used
+        self.cache.store(self.vector(0, 0, 1), 'c', [], 'question c')
+        self.assertIsNone(self.cache.lookup(self.vector(0, 1, 0), 'question b'))
+        self.assertEqual(self.cache.lookup(self.vector(1, 0, 0), 'question a')['response'], 'a')
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_manifest_change_invalidates(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest = os.path.join(tmp_dir, 'manifest.json')
+            with open(manifest, 'w') as f:
+                f.write('{}')
+            cache = SemanticCache(index_stamp_path=manifest)
+            cache.store(self.vector(1, 0, 0), 'Réponse', [], 'question')
+            stat = os.stat(manifest)
+            os.utime(manifest, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertIsNone(cache.lookup(self.vector(1, 0, 0), 'question'))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_other_section_is_not_a_hit(self):
+        self.assertEqual(query_entities('Emploi du temps bdia 2 ?'), query_entities('emploi du temps BDIA2'))
+        self.assertNotEqual(query_entities('GI 1ère année'), query_entities('GC première année'))
+
+        # Identical embeddings: only the section code tells the questions apart
+        self.cache.store(self.vector(1, 0, 0), 'Réponse BDIA1', [], 'emploi du temps BDIA1')
+        self.assertIsNone(self.cache.lookup(self.vector(1, 0, 0), 'emploi du temps BDIA2'))
+        self.assertIsNone(self.cache.lookup(self.vector(1, 0, 0), 'salle S005 à 10h'))
+        self.assertEqual(self.cache.lookup(self.vector(1, 0, 0), 'Emploi du temps bdia 1 ?')['response'],
+                         'Réponse BDIA1')
+        self.assertEqual(self.cache.stats()['entity_mismatches'], 2)
+
+    def test_weekdays_are_entities(self):
+        self.assertEqual(query_entities('Emploi du temps BDIA1 lundi'), {'bdia1', 'lundi'})
+        self.cache.store(self.vector(1, 0, 0), 'Lundi BDIA1', [], 'emploi du temps BDIA1 lundi')
+        self.assertIsNone(self.cache.lookup(self.vector(1, 0, 0), 'emploi du temps BDIA1 mardi'))
+        self.assertEqual(self.cache.lookup(self.vector(1, 0, 0), 'Emploi du temps BDIA1 Lundi ?')['response'],
+                         'Lundi BDIA1')
+
+    def test_relative_days_are_not_cached(self):
+        self.assertFalse(is_cacheable("Quels cours a GI2 aujourd'hui ?"))
+        self.assertFalse(is_cacheable('emploi du temps BDIA1 demain'))
+        self.assertFalse(is_cacheable('Où est le cours maintenant ?'))
+        self.assertTrue(is_cacheable('emploi du temps BDIA1 lundi'))
+
+
+class GroqKeyPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = [1000.0]
+        patcher = mock.patch('chat_app.key_pool.time', SimpleNamespace(monotonic=lambda: self.clock[0]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = GroqKeyPool(['key-1', None, 'key-2', 'key-3', 'key-1'], default_cooldown=60)
+
+    def test_parse_duration(self):
+        self.assertAlmostEqual(parse_duration('2m59.56s'), 179.56)
+        self.assertAlmostEqual(parse_duration('7.66s'), 7.66)
+        self.assertAlmostEqual(parse_duration('120ms'), 0.12)
+        self.assertAlmostEqual(parse_duration('1h'), 3600)
+        self.assertEqual(parse_duration('30'), 30)
+        self.assertIsNone(parse_duration(None))
+        self.assertIsNone(parse_duration('bientôt'))
+
+    def test_keys_ordered_by_in_flight_then_usage(self):
+        self.assertEqual(len(self.pool), 3)
+        self.assertEqual(self.pool.candidates(), ['key-1', 'key-2', 'key-3'])
+        with self.pool.using('key-1'):
+            self.assertEqual(self.pool.candidates(), ['key-2', 'key-3', 'key-1'])
+            with self.pool.using('key-2'):
+                self.assertEqual(self.pool.candidates(), ['key-3', 'key-1', 'key-2'])
+        with self.pool.using('key-3'):
+            pass
+        # Nothing in flight: least used first, settings order on ties
+        with self.pool.using('key-1'):
+            pass
+        self.assertEqual(self.pool.candidates(), ['key-2', 'key-3', 'key-1'])
+
+    def test_exhausted_request_quota_cools_the_key_down(self):
+        self.pool.record_success('key-1', {
+            'x-ratelimit-remaining-requests': '0',
+            'x-ratelimit-remaining-tokens': '5000',
+            'x-ratelimit-reset-requests': '2m30s',
+        })
+        self.assertEqual(self.pool.candidates(), ['key-2', 'key-3', 'key-1'])
+        stats = self.pool.stats()[0]
+        self.assertEqual((stats['remaining_requests'], stats['remaining_tokens']), (0, 5000))
+        self.assertEqual(stats['cooldown_seconds'], 150)
+        self.clock[0] += 149
+        self.assertEqual(self.pool.candidates()[-1], 'key-1')
+        self.clock[0] += 2
+        self.assertEqual(self.pool.candidates()[0], 'key-1')
+
+    def test_exhausted_token_quota_cools_the_key_down(self):
+        self.pool.record_success('key-2', {
+            'x-ratelimit-remaining-requests': '100',
+            'x-ratelimit-remaining-tokens': '0',
+            'x-ratelimit-reset-tokens': '7.66s',
+        })
+        self.assertEqual(self.pool.stats()[1]['cooldown_seconds'], 7.7)
+        self.clock[0] += 8
+        self.assertEqual(self.pool.candidates(), ['key-1', 'key-2', 'key-3'])
+
+    def test_remaining_quota_keeps_the_key_healthy(self):
+        self.pool.record_success('key-1', {'x-ratelimit-remaining-requests': '12', 'x-ratelimit-remaining-tokens': '900'})
+        self.pool.record_success('key-2')
+        self.assertEqual(self.pool.candidates(), ['key-1', 'key-2', 'key-3'])
+
+    def test_rate_limit_uses_retry_after_then_default_cooldown(self):
+        self.pool.record_rate_limit('key-1', {'retry-after': '10'})
+        self.pool.record_rate_limit('key-2')
+        self.assertEqual([s['cooldown_seconds'] for s in self.pool.stats()], [10, 60, 0])
+        # Cooling keys are still tried once the healthy ones failed, soonest reset first
+        self.assertEqual(self.pool.candidates(), ['key-3', 'key-1', 'key-2'])
+        self.clock[0] += 11
+        self.assertEqual(self.pool.candidates(), ['key-1', 'key-3', 'key-2'])
+        self.assertEqual(self.pool.stats()[1]['rate_limited'], 1)
+
+    def test_stats_never_expose_the_keys(self):
+        pool = GroqKeyPool(['gsk_secretAAAA', 'gsk_secretBBBB'])
+        self.assertEqual([s['key'] for s in pool.stats()], ['#1', '#2'])
+        self.assertNotIn('AAAA', repr(pool.stats()))
+
+    def test_generation_fails_over_to_the_next_key(self):
+        import httpx
+        from groq import RateLimitError
+
+        calls = []
+
+        def create(api_key, **kwargs):
+            calls.append(api_key)
+            if api_key == 'failover-1':
+                response = httpx.Response(429, headers={'retry-after': '30'},
+                                          request=httpx.Request('POST', 'https://api.groq.com'))
+                raise RateLimitError('rate limited', response=response, body=None)
+            chunk = SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='Bonjour'))])
+            return SimpleNamespace(headers={'x-ratelimit-remaining-requests': '99'}, parse=lambda: iter([chunk]))
+
+        def fake_groq(api_key):
+            raw = SimpleNamespace(create=lambda **kwargs: create(api_key, **kwargs))
+            return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=raw)))
+
+        keys = ['failover-1', 'failover-2']
+        with mock.patch('groq.Groq', fake_groq):
+            self.assertEqual(GenerationGroq('question', 'contexte', keys), 'Bonjour')
+            self.assertEqual(calls, ['failover-1', 'failover-2'])
+            # The rate-limited key now waits for its retry-after delay
+            self.assertEqual(GenerationGroq('question', 'contexte', keys), 'Bonjour')
+            self.assertEqual(calls[2:], ['failover-2'])
+
+
+class MetricsAccessTests(TestCase):
+    def test_anonymous_and_students_are_refused(self):
+        self.assertEqual(self.client.get(reverse('chat_app:metrics')).status_code, 401)
+        User.objects.create_user('student1', password='student123')
+        self.client.login(username='student1', password='student123')
+        self.assertEqual(self.client.get(reverse('chat_app:metrics')).status_code, 401)
+
+    def test_staff_session(self):
+        User.objects.create_superuser('admin', 'admin@ensa.ma', 'admin123')
+        self.client.login(username='admin', password='admin123')
+        response = self.client.get(reverse('chat_app:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'ensa_chatbot_requests_total', response.content)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_bearer_token(self):
+        url = reverse('chat_app:metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+
+class StreamResumeViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student1', password='student123')
+        self.client.force_login(self.user)
+
+    def test_expired_stream_is_not_regenerated_silently(self):
+        stream = stream_registry.create(StreamTests._answer(), self.user.id)
+        StreamTests._collect(stream)
+        later = time.monotonic() + settings.SSE_RESUME_TTL + 1
+        with mock.patch('chat_app.streams.time', SimpleNamespace(monotonic=lambda: later)), \
+                mock.patch('chat_app.views.generate_answer') as generate_answer:
+            response = self.client.post(reverse('chat_app:handle_query_stream'), {'query': 'Quels sont les clubs ?'},
+                                        content_type='application/json', HTTP_LAST_EVENT_ID=f'{stream.id}:2')
+        self.assertEqual(response.status_code, 410)
+        generate_answer.assert_not_called()
+        self.assertFalse(ChatHistory.objects.exists())
+
+
+class ChatWriterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='student123')
+        self.bob = User.objects.create_user('bob', password='student123')
+        self.batch = [
+            (self.alice.id, 'Question 1', 'Réponse', 'a.txt', ['a']),
+            (self.alice.id, 'Question 2', 'Réponse', 'a.txt', ['a']),
+            (self.bob.id, 'Question 3', 'Réponse', 'b.txt', ['b']),
+        ]
+
+    def total_queries(self, user):
+        return UserProfile.objects.get(user=user).total_queries
+
+    def test_batch_is_one_insert_and_one_update_per_user(self):
+        writer = ChatWriter()
+        with CaptureQueriesContext(connection) as context:
+            writer._write(self.batch)
+        inserts = [q for q in context.captured_queries if q['sql'].startswith('INSERT')]
+        updates = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual((len(inserts), len(updates)), (1, 2))
+        self.assertEqual(ChatHistory.objects.count(), 3)
+        self.assertEqual((self.total_queries(self.alice), self.total_queries(self.bob)), (2, 1))
+        self.assertEqual((writer.written, writer.batches), (3, 1))
+
+    def test_failed_batch_is_written_one_by_one(self):
+        writer = ChatWriter()
+        batch = self.batch[:2] + [(self.bob.id, None, 'Réponse', 'b.txt', ['b'])] + self.batch[2:]
+        with mock.patch.object(ChatHistory.objects, 'bulk_create', side_effect=DatabaseError('locked')):
+            writer._write(batch)
+        # The invalid exchange (no query) is the only one lost
+        self.assertEqual(ChatHistory.objects.count(), 3)
+        self.assertEqual((self.total_queries(self.alice), self.total_queries(self.bob)), (2, 1))
+        self.assertEqual((writer.written, writer.failed, writer.batches), (3, 1, 0))
+
+
+class ChatWriterThreadTests(SimpleTestCase):
+    def flush(self, writer):
+        done = threading.Thread(target=writer.flush, daemon=True)
+        done.start()
+        done.join(5)
+        self.assertFalse(done.is_alive(), 'flush() never returned')
+
+    def test_thread_survives_errors(self):
+        writer = ChatWriter(flush_interval=0.01)
+        written = []
+
+        def write(batch):
+            if not written and batch[0][1] == 'Question 1':
+                raise RuntimeError('boom')
+            written.extend(batch)
+
+        with mock.patch('chat_app.persistence.close_old_connections', side_effect=OperationalError('gone')), \
+                mock.patch.object(writer, '_write', side_effect=write):
+            writer.submit(1, 'Question 1', 'Réponse', '', [])
+            self.flush(writer)
+            writer.submit(1, 'Question 2', 'Réponse', '', [])
+            self.flush(writer)
+        self.assertTrue(writer._thread.is_alive())
+        self.assertEqual([item[1] for item in written], ['Question 2'])
+        self.assertEqual(writer.failed, 1)
+
+    def test_dead_thread_is_restarted(self):
+        writer = ChatWriter(flush_interval=0.01)
+        written = []
+        with mock.patch('chat_app.persistence.close_old_connections'), \
+                mock.patch.object(writer, '_write', side_effect=written.extend):
+            writer.submit(1, 'Question 1', 'Réponse', '', [])
+            self.flush(writer)
+            dead = threading.Thread(target=lambda: None)
+            dead.start()
+            dead.join()
+            writer._thread = dead
+            writer.submit(1, 'Question 2', 'Réponse', '', [])
+            self.flush(writer)
+        self.assertIsNot(writer._thread, dead)
+        self.assertEqual(len(written), 2)
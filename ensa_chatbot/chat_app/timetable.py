@@ -0,0 +1,340 @@
+import re
+import threading
+from collections import namedtuple
+
+from .sources import source_store
+from .utils import SECTION_CODES, FRENCH_STOPWORDS, strip_accents
+
+
+DAYS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi")
+TIMETABLE_FOLDER = "emploi-temps/"
+
+# One session of a timetable; start/end are minutes since midnight (None if the file has no valid time)
+Slot = namedtuple("Slot", ["section", "day", "start", "end", "time", "module", "professor",
+                           "room", "group", "event", "source"])
+
+_WORD_RE = re.compile(r"[\w&]+", re.UNICODE)
+_SLOT_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$")
+_QUERY_TIME_RE = re.compile(r"\b(\d{1,2})\s*(?:h|:)\s*(\d{2})?\b")
+_FILE_CODE_RE = re.compile(r"-([0-9A-Za-z]+)\.json$")
+_FILE_YEAR_RE = re.compile(r"(\d)e?[rm]?e annee")
+_FILE_PART_RE = re.compile(r"section-(\d)")
+_MODULE_PREFIX_RE = re.compile(r"^(?:TP|TD)\s*-?\s*\d?\s*-?\s*", re.IGNORECASE)
+
+# Explicit timetable intent: the timetable itself, a session, a room, or where a class takes place.
+# Words such as "quand" or "cours" alone also start general questions (exams, semesters, programs)
+_INTENT_RE = re.compile(r"\bemplois? du temps\b|\bseances?\b|\bsalles?\b"
+                        r"|\bou (?:est|sont|a lieu|ont lieu|se deroulen?t?) (?:le |la |les )?(?:cours|td|tp)\b")
+
+ORDINALS = {"premiere": "1ere", "1re": "1ere", "1er": "1ere", "deuxieme": "2eme", "2ere": "2eme", "2e": "2eme"}
+
+MAX_ROWS = 40
+
+
+def _words(text):
+    words = _WORD_RE.findall(strip_accents(text.lower()))
+    return [ORDINALS.get(w, w) for w in words]
+
+
+def _content_words(text):
+    return {w for w in _words(text) if w not in FRENCH_STOPWORDS and len(w) > 2}
+
+
+def _parse_time(text):
+    match = _SLOT_TIME_RE.match(text or "")
+    if not match:
+        return None, None
+    h1, m1, h2, m2 = (int(g) for g in match.groups())
+    return h1 * 60 + m1, h2 * 60 + m2
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60:02d}h{minutes % 60:02d}"
+
+
+def section_of(file_name):
+    """'emploi du temps-genie informatique-1ere annee-GI1.json' → 'GI1'; section files of 2AP get ' S1'/' S2'"""
+    match = _FILE_CODE_RE.search(file_name)
+    if not match:
+        return None
+    code = match.group(1).upper()
+    normalized = strip_accents(file_name.lower())
+    if not code[-1].isdigit():
+        year = _FILE_YEAR_RE.search(normalized)
+        code += year.group(1) if year else ""
+    part = _FILE_PART_RE.search(normalized)
+    return f"{code} S{part.group(1)}" if part else code
+
+
+def _spaced_pattern(key):
+    """Regex matching a code or room with or without a space between letters and digits"""
+    parts = re.findall(r"[a-z]+|\d+", strip_accents(key.lower()))
+    return re.compile(r"\b" + r"\s*".join(parts) + r"\b")
+
+
+def base_module(module):
+    """'TP-2 Java avancé' and 'TD Routes' → 'Java avancé', 'Routes'"""
+    return _MODULE_PREFIX_RE.sub("", module).strip() or module
+
+
+class TimetableIndex:
+    """
+    Every timetable of the data folder as indexed sessions, answering the
+    recognizable timetable questions without retrieval or LLM.
+
+    Built from the documents preloaded by the source store and rebuilt when
+    they are reloaded. answer() returns None for anything it does not
+    recognize, so the caller falls back to the RAG path.
+    """
+
+    def __init__(self, store=source_store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._documents = None
+        self.slots = []
+        self.by_section = {}
+        self.by_professor = {}
+        self.by_room = {}
+        self.modules = {}
+        self.section_aliases = {}
+        self._patterns = {}
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------
+    #   Index
+    # -------------------------
+    def _ensure_fresh(self):
+        documents = self.store.documents()
+        if documents is self._documents:
+            return
+        with self._lock:
+            if documents is not self._documents:
+                self._build(documents)
+                self._documents = documents
+
+    def preload(self):
+        self._ensure_fresh()
+
+    def _build(self, documents):
+        slots = []
+        for key, document in sorted(documents.items()):
+            if not key.startswith(TIMETABLE_FOLDER) or not isinstance(document.content, dict):
+                continue
+            section = section_of(document.name)
+            if section is None:
+                continue
+            for day, entries in document.content.items():
+                if day not in DAYS:
+                    continue
+                for entry in entries or []:
+                    start, end = _parse_time(entry.get("time"))
+                    slots.append(Slot(
+                        section=section,
+                        day=day,
+                        start=start,
+                        end=end,
+                        time=f"{_format_minutes(start)} - {_format_minutes(end)}" if start is not None else None,
+                        module=entry.get("module"),
+                        professor=entry.get("professor"),
+                        room=entry.get("location"),
+                        group=entry.get("group"),
+                        event=entry.get("event"),
+                        source=key,
+                    ))
+
+        by_section, by_professor, by_room, modules = {}, {}, {}, {}
+        for slot in slots:
+            by_section.setdefault(slot.section.split()[0], []).append(slot)
+            for name in (slot.professor or "").split("/"):
+                for word in _words(name):
+                    if len(word) > 3:
+                        by_professor.setdefault(word, []).append(slot)
+            if slot.room:
+                by_room.setdefault(re.sub(r"\s+", "", strip_accents(slot.room.lower())), []).append(slot)
+            if slot.module:
+                modules.setdefault(base_module(slot.module), []).append(slot)
+
+        # Sections are also recognized by their name ('génie informatique 1ère année')
+        aliases = {}
+        for code in by_section:
+            label = SECTION_CODES.get(code)
+            if label:
+                aliases[code] = _content_words(label)
+
+        self.slots = slots
+        self.by_section = by_section
+        self.by_professor = by_professor
+        self.by_room = by_room
+        self.modules = {name: (_content_words(name), members) for name, members in modules.items()}
+        self.section_aliases = aliases
+        # 'GI 1', 'gi1', 'S 005', 's005', 'amphi 2'...
+        self._patterns = {key: _spaced_pattern(key) for key in list(by_section) + list(by_room)}
+
+    # -------------------------
+    #   Question matching
+    # -------------------------
+    def parse(self, query, today=None):
+        """Timetable entities mentioned in the query (empty dict if none)"""
+        words = _words(query)
+        word_set = set(words)
+        normalized = " ".join(words)
+        found = {}
+
+        sections = [code for code in self.by_section if self._patterns[code].search(normalized)]
+        if not sections:
+            sections = [code for code, alias in self.section_aliases.items() if alias and alias <= word_set]
+        if sections:
+            found["sections"] = sections
+            # Part number of the 2AP files ('2AP1 section 1')
+            part = re.search(r"\bsection (\d)\b", normalized)
+            if part:
+                found["part"] = f"S{part.group(1)}"
+        consumed = set()
+        for code in sections:
+            consumed |= self.section_aliases.get(code, set())
+
+        days = [day for day in DAYS if day.lower() in word_set]
+        if "aujourd" in word_set and today is not None and today < len(DAYS):
+            days.append(DAYS[today])
+        elif "demain" in word_set and today is not None and (today + 1) % 7 < len(DAYS):
+            days.append(DAYS[(today + 1) % 7])
+        if days:
+            found["days"] = days
+
+        match = _QUERY_TIME_RE.search(strip_accents(query.lower()))
+        if match and int(match.group(1)) < 24:
+            found["time"] = int(match.group(1)) * 60 + int(match.group(2) or 0)
+
+        professors = {w for w in word_set - consumed if w in self.by_professor}
+        if professors:
+            found["professors"] = professors
+
+        rooms = [room for room in self.by_room if self._patterns[room].search(normalized)]
+        # 'amphi 2' also matches 'amphi': keep the most specific room
+        rooms = [room for room in rooms if not any(other != room and other.startswith(room) for other in rooms)]
+        if rooms:
+            found["rooms"] = rooms
+
+        content = {w for w in word_set - consumed if w not in FRENCH_STOPWORDS and len(w) > 2}
+        covered = [name for name, (module_words, _) in self.modules.items()
+                   if module_words and module_words <= content]
+        if not covered:
+            scored = [(len(module_words & content), name) for name, (module_words, _) in self.modules.items()]
+            best = max((n for n, _ in scored), default=0)
+            covered = [name for n, name in scored if best >= 2 and n == best]
+        if covered:
+            found["modules"] = covered
+
+        return found
+
+    def is_timetable_question(self, query, found):
+        """Only confident timetable questions skip RAG"""
+        if not any(k in found for k in ("sections", "professors", "rooms", "modules")):
+            return False
+        if _INTENT_RE.search(" ".join(_words(query))):
+            return True
+        # Otherwise a day or time slot of a given section or professor
+        return ("days" in found or "time" in found) and ("sections" in found or "professors" in found)
+
+    def lookup(self, found):
+        slots = self.slots
+        if "sections" in found:
+            slots = [s for code in found["sections"] for s in self.by_section[code]]
+            if "part" in found:
+                slots = [s for s in slots if s.section.endswith(found["part"])] or slots
+        if "professors" in found:
+            ids = {id(s) for word in found["professors"] for s in self.by_professor[word]}
+            slots = [s for s in slots if id(s) in ids]
+        if "rooms" in found:
+            ids = {id(s) for room in found["rooms"] for s in self.by_room[room]}
+            slots = [s for s in slots if id(s) in ids]
+        if "modules" in found:
+            ids = {id(s) for name in found["modules"] for s in self.modules[name][1]}
+            slots = [s for s in slots if id(s) in ids]
+        if "days" in found:
+            slots = [s for s in slots if s.day in found["days"]]
+        if "time" in found:
+            t = found["time"]
+            slots = [s for s in slots if s.start is not None and s.start <= t < s.end]
+        return sorted(slots, key=lambda s: (s.section, DAYS.index(s.day), s.start if s.start is not None else 0))
+
+    def answer(self, query, today=None):
+        """
+        (markdown, sources) for a recognized timetable question, None otherwise.
+        `today` is the weekday (0 = Monday) used for "aujourd'hui" / "demain".
+        """
+        self._ensure_fresh()
+        found = self.parse(query, today)
+        if not self.is_timetable_question(query, found):
+            self.misses += 1
+            return None
+
+        slots = self.lookup(found)
+        if not slots:
+            untimed = "time" in found and any(
+                s.start is None for s in self.lookup({k: v for k, v in found.items() if k != "time"}))
+            if untimed or not ("sections" in found and ("days" in found or "time" in found)):
+                # Partial parse, or sessions whose time is missing from the file: let the RAG path try
+                self.misses += 1
+                return None
+
+        self.hits += 1
+        sources = sorted({s.source for s in slots}) or sorted(
+            {s.source for code in found["sections"] for s in self.by_section[code]})
+        return render(found, slots), sources
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "slots": len(self.slots),
+            "sections": len(self.by_section),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def render(found, slots):
+    """Markdown table of the matching sessions"""
+    title = ["Emploi du temps"]
+    if "sections" in found:
+        title.append(", ".join(found["sections"]))
+    if "modules" in found:
+        title.append(", ".join(found["modules"]))
+    if "days" in found:
+        title.append(", ".join(found["days"]))
+    if "time" in found:
+        title.append(f"à {_format_minutes(found['time'])}")
+
+    if not slots:
+        return f"### {' — '.join(title)}\n\nAucune séance n'est prévue."
+
+    columns = []
+    if len({s.section for s in slots}) > 1:
+        columns.append(("Filière", lambda s: s.section))
+    if len({s.day for s in slots}) > 1:
+        columns.append(("Jour", lambda s: s.day))
+    columns += [
+        ("Horaire", lambda s: s.time or "—"),
+        ("Module", lambda s: s.module or (f"*{s.event}*" if s.event else "—")),
+        ("Professeur", lambda s: s.professor or "—"),
+        ("Salle", lambda s: s.room or "—"),
+    ]
+    if any(s.group for s in slots):
+        columns.append(("Groupe", lambda s: s.group or "—"))
+
+    lines = [
+        f"### {' — '.join(title)}",
+        "",
+        "| " + " | ".join(name for name, _ in columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    for slot in slots[:MAX_ROWS]:
+        lines.append("| " + " | ".join(str(value(slot)).replace("|", "/") for _, value in columns) + " |")
+    if len(slots) > MAX_ROWS:
+        lines.append(f"\n*{len(slots) - MAX_ROWS} séances supplémentaires non affichées.*")
+    return "\n".join(lines)
+
+
+timetable_index = TimetableIndex()
@@ -36,6 +36,13 @@ urlpatterns = [
     # API Endpoints (Optional - for AJAX)
     # ========================================================================
     path('api/history/', views.get_chat_history_json, name='get_history'),
+    path('api/history/<int:chat_id>/', views.get_chat_json, name='get_chat'),
+    path('api/cache/stats/', views.cache_stats, name='cache_stats'),
+    path('api/rerank/stats/', views.rerank_stats, name='rerank_stats'),
+    path('api/keys/stats/', views.key_pool_stats, name='key_pool_stats'),
+    path('api/chats/stats/', views.chat_writer_stats, name='chat_writer_stats'),
+    path('health/', views.health, name='health'),
+    path('metrics/', views.metrics, name='metrics'),
 
     
     path('query/', views.handle_query, name='handle_query'), 
@@ -1,30 +1,30 @@
 import os
-from torch import chunk
-from transformers import CamembertTokenizer
+import re
+import asyncio
+import json
+import logging
+import unicodedata
+import hashlib
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
 import numpy as np
-from groq import Groq
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance, HnswConfigDiff
 import uuid
 
-from langchain_core.language_models import LLM
-from langchain_qdrant import QdrantVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
+from typing import Optional, List, TYPE_CHECKING
 
-from langchain.retrievers.self_query.base import SelfQueryRetriever
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.chains.query_constructor.schema import AttributeInfo
+# Heavy dependencies (torch, transformers, LangChain, qdrant models, groq) are
+# imported inside the functions that need them, so importing this module (e.g.
+# from management commands or URL checks) stays fast.
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from qdrant_client import QdrantClient
 
-from typing import Optional, List
-from groq import Groq
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.document_loaders.json_loader import JSONLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_groq import ChatGroq
-
-
-from langchain.llms import HuggingFaceHub
+logger = logging.getLogger(__name__)
 
 
 def load_and_split_json(folder_path, chunk_size=800, overlap=100):
@@ -32,6 +32,9 @@ def load_and_split_json(folder_path, chunk_size=800, overlap=100):
     Load .json schedules using LangChain JSONLoader and split with RecursiveCharacterTextSplitter.
     Returns: chunks list[str], metadata list[dict]
     """
+    from langchain_community.document_loaders import DirectoryLoader
+    from langchain_community.document_loaders.json_loader import JSONLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
     docs = []
 
@@ -48,33 +51,6 @@ def load_and_split_json(folder_path, chunk_size=800, overlap=100):
 
     loaded_docs = loader.load()
 
-    # Convert JSON to readable schedule text
-    converted_docs = []
-    for doc in loaded_docs:
-        file_name = os.path.basename(doc.metadata["source"])
-        json_data = doc.page_content
-
-        lines = []
-
-        if isinstance(json_data, dict):
-            for day, schedule in json_data.items():
-                if schedule:
-                    for entry in schedule:
-                        entry_text = " | ".join(f"{k}: {v}" for k, v in entry.items())
-                        lines.append(f"{day} | {entry_text}")
-
-        text = "\n".join(lines).strip()
-
-        converted_docs.append({
-            "text": text,
-            "metadata": {
-                "name": file_name,
-                "categorie": "emploi du temps",
-                "source": doc.metadata["source"]
-            }
-        })
-
-
     # Split using LangChain splitter
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -84,20 +60,45 @@ def load_and_split_json(folder_path, chunk_size=800, overlap=100):
     chunks = []
     metadatas = []
 
-    for d in converted_docs:
-        texts = splitter.split_text(d["text"])
-        for i, t in enumerate(texts, start=1):
+    for doc in loaded_docs:
+        for t, meta in _split_json_doc(doc, splitter):
             chunks.append(t)
-            meta = d["metadata"].copy()
-            meta["part"] = i
             metadatas.append(meta)
 
     return chunks, metadatas
 
+
+def _split_json_doc(doc, splitter):
+    """(chunk, metadata) pairs of one loaded JSON schedule, converted to readable text"""
+    file_name = os.path.basename(doc.metadata["source"])
+    json_data = doc.page_content
+
+    lines = []
+
+    if isinstance(json_data, dict):
+        for day, schedule in json_data.items():
+            if schedule:
+                for entry in schedule:
+                    entry_text = " | ".join(f"{k}: {v}" for k, v in entry.items())
+                    lines.append(f"{day} | {entry_text}")
+
+    text = "\n".join(lines).strip()
+
+    for i, t in enumerate(splitter.split_text(text), start=1):
+        yield t, {
+            "name": file_name,
+            "categorie": "emploi du temps",
+            "source": doc.metadata["source"],
+            "part": i
+        }
+
+
 def load_and_split_txt(folder_path, chunk_size=800, overlap=100):
     """
     Load all .txt files recursively with LangChain DirectoryLoader and split them.
     """
+    from langchain_community.document_loaders import DirectoryLoader, TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
     loader = DirectoryLoader(
         folder_path,
@@ -117,32 +118,280 @@ def load_and_split_txt(folder_path, chunk_size=800, overlap=100):
     metadatas = []
 
     for doc in docs:
-        texts = splitter.split_text(doc.page_content)
-
-        category = os.path.basename(os.path.dirname(doc.metadata["source"])) or "txt"
-
-        for i, t in enumerate(texts, start=1):
+        for t, meta in _split_txt_doc(doc, splitter):
             chunks.append(t)
-            metadatas.append({
-                "name": f"{os.path.basename(doc.metadata['source'])} (part {i})",
-                "categorie": category,
-                "source": doc.metadata["source"],
-                "part": i
-            })
+            metadatas.append(meta)
 
     return chunks, metadatas
 
 
+def _split_txt_doc(doc, splitter):
+    """(chunk, metadata) pairs of one loaded .txt document"""
+    texts = splitter.split_text(doc.page_content)
+
+    category = os.path.basename(os.path.dirname(doc.metadata["source"])) or "txt"
+
+    for i, t in enumerate(texts, start=1):
+        yield t, {
+            "name": f"{os.path.basename(doc.metadata['source'])} (part {i})",
+            "categorie": category,
+            "source": doc.metadata["source"],
+            "part": i
+        }
+
+
+def _visible_files(folder_path, pattern):
+    """Files matched by `pattern` under folder_path, skipping hidden ones (as DirectoryLoader does)"""
+    from pathlib import Path
+
+    root = Path(folder_path)
+    for path in root.glob(pattern):
+        if path.is_file() and not any(part.startswith(".") for part in path.relative_to(root).parts):
+            yield str(path)
+
+
+def iter_document_chunks(data_path, chunk_size=800, overlap=100):
+    """
+    Stream the (chunk, metadata) pairs of load_and_split_json (emploi-temps/*.json)
+    and load_and_split_txt (**/*.txt), one file at a time in (source, part) order,
+    so indexing can start embedding before every file is loaded.
+    """
+    from langchain_community.document_loaders import TextLoader
+    from langchain_community.document_loaders.json_loader import JSONLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap
+    )
+
+    files = [(source, "json") for source in _visible_files(os.path.join(data_path, "emploi-temps"), "*.json")]
+    files += [(source, "txt") for source in _visible_files(data_path, "**/*.txt")]
+
+    for source, kind in sorted(files):
+        if kind == "json":
+            for doc in JSONLoader(source, jq_schema=".", text_content=False).load():
+                yield from _split_json_doc(doc, splitter)
+        else:
+            for doc in TextLoader(source, encoding="utf-8").load():
+                yield from _split_txt_doc(doc, splitter)
+
+
 
 os.environ["HF_HUB_TIMEOUT"] = "300"
 
-tokenizer = CamembertTokenizer.from_pretrained("dangvantuan/sentence-camembert-base")
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """CamemBERT tokenizer, downloaded/loaded on first use"""
+    from django.conf import settings
+    from transformers import CamembertTokenizer
+    return CamembertTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
 
 def normalize(vector):
     """Normalize embeddings"""
     return vector / np.linalg.norm(vector)
 
-from groq import RateLimitError, APIError
+from .key_pool import get_key_pool
+from .metrics import current_timer, timed, observe_generation
+from .context import build_context, chunk_from_payload, ContextChunk
+
+
+# -------------------------
+#   Local query expansion (no LLM)
+# -------------------------
+# Section codes used in the timetable file names → wording used in the documents
+SECTION_CODES = {
+    "2AP1": "1ère année préparatoire",
+    "2AP2": "2ème année préparatoire",
+    "BDIA1": "Big data & IA 1ère année",
+    "BDIA2": "Big data & IA 2ème année",
+    "GC1": "génie civil 1ère année",
+    "GC2": "génie civil 2ème année",
+    "GCSE1": "génie cybersécurité et systèmes embarqués 1ère année",
+    "GI1": "génie informatique 1ère année",
+    "GI2": "génie informatique 2ème année",
+    "GM1": "génie mécatronique 1ère année",
+    "GM2": "génie mécatronique 2ème année",
+    "GSCM1": "génie supply chain management 1ère année",
+    "GSCM2": "génie supply chain management 2ème année",
+    "GSTR1": "génie systèmes télécommunications et réseaux 1ère année",
+    "GSTR2": "génie systèmes télécommunications et réseaux 2ème année",
+}
+
+FRENCH_STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "dans", "de", "des", "du", "elle", "en", "est",
+    "et", "il", "ils", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", "mes", "mon",
+    "ne", "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses", "son",
+    "sont", "sur", "ta", "te", "tes", "ton", "tu", "un", "une", "vos", "votre", "vous", "y",
+    "quel", "quelle", "quels", "quelles", "quand", "comment", "combien", "ou", "pourquoi",
+    "est-ce", "l", "d", "j", "c", "s", "n", "t", "m", "ensa", "tetouan",
+}
+
+_WORD_RE = re.compile(r"[\w&]+", re.UNICODE)
+_SECTION_FILE_RE = re.compile(r"-([0-9A-Za-z]+?)(?:_reph)?\.(?:json|txt)$")
+_SECTION_YEAR_RE = re.compile(r"(\d)e?[rm]?e annee")
+
+
+def section_code(file_name):
+    """'emploi du temps-...-GI1_reph.txt' → 'GI1'; None for files of no section"""
+    match = _SECTION_FILE_RE.search(file_name or "")
+    if not match:
+        return None
+    code = match.group(1).upper()
+    if code not in SECTION_CODES:
+        # 'emploi du temps-...-2eme annee-GSCM.json': year only in the name
+        year = _SECTION_YEAR_RE.search(strip_accents(file_name.lower()))
+        code += year.group(1) if year else ""
+    return code if code in SECTION_CODES else None
+
+
+def strip_accents(text):
+    """'Génie mécatronique' → 'Genie mecatronique'"""
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def query_keywords(query):
+    """Lowercased, accent-free content words of the query"""
+    words = _WORD_RE.findall(strip_accents(query.lower()))
+    return [w for w in words if w not in FRENCH_STOPWORDS and len(w) > 1]
+
+
+def expand_query(query, max_variants=4):
+    """
+    Build query variants locally: the original question, schedule-code expansion
+    (e.g. 'BDIA1' → 'Big data & IA 1ère année') and an accent/stopword-free keyword form.
+    """
+    variants = [query]
+
+    codes = [w for w in _WORD_RE.findall(query) if w.upper() in SECTION_CODES]
+    if codes:
+        expanded = query
+        for code in codes:
+            expanded = re.sub(rf"\b{re.escape(code)}\b", SECTION_CODES[code.upper()], expanded)
+        variants.append(expanded)
+        variants.append("emploi du temps " + " ".join(SECTION_CODES[c.upper()] for c in codes))
+
+    keywords = query_keywords(query)
+    if keywords:
+        variants.append(" ".join(keywords))
+
+    unique = []
+    for v in variants:
+        if v and v not in unique:
+            unique.append(v)
+    return unique[:max_variants]
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """
+    Fuse several ranked lists of Qdrant points by reciprocal rank.
+    Returns the points sorted by fused score (best first), each point kept once.
+    """
+    scores = {}
+    points = {}
+    for ranked in ranked_lists:
+        for rank, point in enumerate(ranked):
+            scores[point.id] = scores.get(point.id, 0.0) + 1.0 / (k + rank + 1)
+            points.setdefault(point.id, point)
+    return [points[pid] for pid in sorted(scores, key=scores.get, reverse=True)]
+
+
+# Runs the Qdrant request while the lexical index is queried on the caller's thread
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+
+def _format_results(results, context_budget=None, scored=False):
+    """
+    Qdrant points → (context passed to the LLM, source paths).
+    With `context_budget`, the context is de-duplicated and packed to that many
+    tokens; `scored` sorts by the points' scores (comparable only for plain vector search).
+    """
+    sources = [r.payload["source"] for r in results]
+    if context_budget:
+        chunks = [chunk_from_payload(r.payload, r.score if scored else None) for r in results]
+        return _pack_context(chunks, context_budget), sources
+    context = "\n---\n".join(r.payload["chunk"] for r in results)
+    return context, sources
+
+
+def _pack_context(chunks, context_budget):
+    with timed("context"):
+        context, stats = build_context(chunks, context_budget)
+    timer = current_timer.get()
+    if timer is not None:
+        timer.values["context_tokens"] = stats["tokens"]
+        timer.values["context_duplicates"] = stats["duplicates"]
+    return context
+
+
+# Search(filters=...) keys → payload fields (all with a payload index)
+FILTER_FIELDS = {"category": "categorie", "source": "source", "section": "section"}
+
+
+def _filter_values(key, value):
+    if key not in FILTER_FIELDS:
+        raise ValueError(f"Unknown search filter: {key}")
+    values = [value] if isinstance(value, str) else list(value or ())
+    return [v.upper() for v in values] if key == "section" else values
+
+
+def search_filter(filters):
+    """
+    {'category': 'clubs', 'section': ['GI1', 'GI2'], 'source': ...} → Qdrant Filter,
+    fields ANDed, list values ORed; None when there is nothing to filter on
+    """
+    from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny
+
+    conditions = []
+    for key, value in (filters or {}).items():
+        values = _filter_values(key, value)
+        if not values:
+            continue
+        match = MatchValue(value=values[0]) if len(values) == 1 else MatchAny(any=values)
+        conditions.append(FieldCondition(key=FILTER_FIELDS[key], match=match))
+    return Filter(must=conditions) if conditions else None
+
+
+def payload_matches(filters):
+    """Same filters as a predicate over payload dicts (BM25 hits)"""
+    fields = {FILTER_FIELDS[key]: set(values) for key, values in
+              ((key, _filter_values(key, value)) for key, value in (filters or {}).items()) if values}
+    return lambda payload: all(payload.get(field) in values for field, values in fields.items())
+
+
+def _route_filter(query_embedding, router=None, filters=None):
+    """
+    Payload filter on the routed categories plus the caller's `filters`; the caller's
+    category wins, and an unsure router leaves the category unfiltered
+    """
+    if filters and filters.get("category"):
+        return search_filter(filters)
+    if router is None:
+        from .router import get_category_router
+        router = get_category_router()
+    if router is None:
+        return search_filter(filters)
+
+    with timed("route"):
+        categories, score = router.route(query_embedding)
+    timer = current_timer.get()
+    if timer is not None:
+        timer.values["route"] = categories
+        timer.values["route_score"] = round(score, 3)
+    return search_filter({**(filters or {}), "category": categories})
+
+
+def _rerank(query, results, top_k):
+    """Cross-encoder rerank of over-fetched points; vector order if the reranker fails"""
+    from .rerank import get_reranker
+    try:
+        with timed("rerank"):
+            return get_reranker().rerank(query, results, top_k)
+    except Exception as e:
+        logger.error(f"Rerank failed, keeping vector order: {str(e)}")
+        return results[:top_k]
+
+
 # -------------------------
 #   Main unified search()
 # -------------------------
@@ -153,33 +402,140 @@ def Search(
     embedding_model,
     groq_keys=None,
     mode="default",
-    top_k=3
+    top_k=3,
+    lexical_index=None,
+    rerank=False,
+    rerank_candidates=20,
+    context_budget=None,
+    router=None,
+    filters=None,
+    oversampling=None
 ):
     """
     mode='default'  → cosine search (your current method)
+    mode='routed'   → cosine search filtered on the category predicted by the local router (no LLM)
     mode='self'     → Self-Query Retriever (LLM reasons over metadata)
     mode='multi'    → Multi-Query Retriever (LLM generates multiple queries)
+    mode='expand'   → local query variants, one batched vector search, rank fusion (no LLM)
+    mode='hybrid'   → BM25 lexical search + cosine search in parallel, rank fusion
     
     groq_keys: list of API keys or single key string
+    lexical_index: BM25Index used by 'hybrid' (defaults to the persisted index)
+    router: CategoryRouter used by 'routed' (defaults to the persisted router)
+    filters: restrict the search to chunks matching {'category', 'source', 'section'}
+             (str or list of values; not supported by self/multi)
+    oversampling: on a quantized collection, fetch oversampling × limit candidates with the
+                  quantized vectors and rescore them with the originals (not used by self/multi)
+    rerank: over-fetch `rerank_candidates` points and reorder them with the cross-encoder
+            (default/hybrid/expand modes)
+    context_budget: de-duplicate the `top_k` chunks and pack them into that many tokens
     """
+    fetch_k = max(top_k, rerank_candidates) if rerank else top_k
+    query_filter = search_filter(filters)
+    search_params = quantization_search_params(oversampling)
 
     # -------------------------
     # DEFAULT MODE (your old search)
     # -------------------------
     if mode == "default":
-        query_embedding = normalize(embedding_model.encode(query))
+        with timed("embed"):
+            query_embedding = normalize(embedding_model.encode(query))
+
+        with timed("search"):
+            results = client.search(
+                collection_name=collection_name,
+                query_vector=("default", query_embedding),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=fetch_k
+            )
+        results = _rerank(query, results, top_k) if rerank else results
 
-        results = client.search(
-            collection_name=collection_name,
-            query_vector=("default", query_embedding),
-            limit=top_k
-        )
+        return _format_results(results, context_budget, scored=not rerank)
 
-        chunks = [r.payload["chunk"] for r in results]
-        context = "\n---\n".join(chunks)
-        sources = [r.payload["source"] for r in results]
+    # -------------------------
+    # ROUTED MODE (category filter without LLM)
+    # -------------------------
+    if mode == "routed":
+        with timed("embed"):
+            query_embedding = normalize(embedding_model.encode(query))
+
+        query_filter = _route_filter(query_embedding, router, filters)
+        with timed("search"):
+            results = client.search(
+                collection_name=collection_name,
+                query_vector=("default", query_embedding),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=fetch_k
+            )
+        results = _rerank(query, results, top_k) if rerank else results
+
+        return _format_results(results, context_budget, scored=not rerank)
+
+    # -------------------------
+    # HYBRID MODE (lexical + dense)
+    # -------------------------
+    if mode == "hybrid":
+        if lexical_index is None:
+            from .lexical import get_lexical_index
+            lexical_index = get_lexical_index()
+
+        with timed("embed"):
+            query_embedding = normalize(embedding_model.encode(query))
+
+        # Timed here: the executor thread does not see the request's timer
+        with timed("search"):
+            dense_future = _search_executor.submit(
+                client.search,
+                collection_name=collection_name,
+                query_vector=("default", query_embedding),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=fetch_k * 3
+            )
+            lexical_results = lexical_index.search(
+                query, limit=fetch_k * 3, where=payload_matches(filters) if filters else None
+            ) if lexical_index else []
+            dense_results = dense_future.result()
+
+        results = reciprocal_rank_fusion([dense_results, lexical_results])[:fetch_k]
+        results = _rerank(query, results, top_k) if rerank else results
+
+        return _format_results(results, context_budget)
+
+    # -------------------------
+    # EXPAND MODE (multi-query without LLM)
+    # -------------------------
+    if mode == "expand":
+        from qdrant_client.models import SearchRequest, NamedVector
 
-        return context, sources
+        variants = expand_query(query)
+        with timed("embed"):
+            embs = embedding_model.encode(
+                variants, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+            )
+
+        # all variants in a single request to Qdrant
+        with timed("search"):
+            responses = client.search_batch(
+                collection_name=collection_name,
+                requests=[
+                    SearchRequest(
+                        vector=NamedVector(name="default", vector=emb.tolist()),
+                        filter=query_filter,
+                        params=search_params,
+                        limit=fetch_k * 2,
+                        with_payload=True
+                    )
+                    for emb in embs
+                ]
+            )
+
+        results = reciprocal_rank_fusion(responses)[:fetch_k]
+        results = _rerank(query, results, top_k) if rerank else results
+
+        return _format_results(results, context_budget)
 
     # -------------------------
     # LLM is required for self/multi retrievers
@@ -187,111 +543,79 @@ def Search(
     if groq_keys is None:
         raise ValueError("groq_keys is required when using mode='self' or 'multi'")
 
-    # Ensure groq_keys is a list
-    if isinstance(groq_keys, str):
-        groq_keys = [groq_keys]
+    from groq import RateLimitError, APIError
+    from .retrievers import retriever_registry
+
+    # Shared, load-balanced key pool (skips None keys, tracks rate limits)
+    key_pool = get_key_pool(groq_keys)
     
-    if not groq_keys:
+    if not len(key_pool):
         raise ValueError("groq_keys list is empty")
 
-    # Build LangChain VectorStore wrapper for Qdrant
-    embedding = HuggingFaceEmbeddings(model_name="dangvantuan/sentence-camembert-base")
-    vectorstore = QdrantVectorStore(
-        client=client,
-        embedding=embedding,
-        collection_name=collection_name,
-        vector_name="default",
-        content_payload_key="chunk"
-    )
+    if mode not in ("self", "multi"):
+        raise ValueError(f"Unknown search mode: {mode}")
+    if query_filter is not None:
+        raise ValueError(f"filters are not supported by mode='{mode}'")
 
-    # Try each API key until one works
+    # Try keys in pool order until one works
     last_error = None
-    for key_index, groq_key in enumerate(groq_keys):
+    candidates = key_pool.candidates()
+    for attempt, groq_key in enumerate(candidates):
+        label = key_pool.label(groq_key)
         try:
-            print(f"[INFO] Attempting retrieval with API key #{key_index + 1}/{len(groq_keys)}")
-            
-            llm = ChatGroq(
-                groq_api_key=groq_key,
-                model_name="openai/gpt-oss-20b",
-                temperature=0
-            )
-
-            # ------------------------------------------
-            # SELF-QUERY RETRIEVER (LLM filters metadata)
-            # ------------------------------------------
-            if mode == "self":
-                metadata_fields = [
-                    AttributeInfo(name="name", description="Document name", type="string"),
-                    AttributeInfo(name="categorie", description="Document category", type="string"),
-                    AttributeInfo(name="source", description="Original file path", type="string"),
-                    AttributeInfo(name="part", description="Chunk part number", type="integer"),
-                ]
-            
-                self_retriever = SelfQueryRetriever.from_llm(
-                    llm=llm,
-                    vectorstore=vectorstore,
-                    document_contents="ENSA documents",
-                    metadata_field_info=metadata_fields,
-                    verbose=True
-                )
-
-                docs = self_retriever.invoke(query)
-
-                chunks = [d.page_content for d in docs] 
-                sources = [d.metadata.get("source") for d in docs if d.metadata.get("source")]
-                context = "\n---\n".join(chunks)
-
-                print(f"[SUCCESS] Retrieved with API key #{key_index + 1}")
-                return context, sources
-        
-
-            # ------------------------------------------
-            # MULTI-QUERY RETRIEVER (LLM generates multiple queries)
-            # ------------------------------------------
-            elif mode == "multi":
-                from langchain.retrievers.multi_query import MultiQueryRetriever
-                
-                multi_retriever = MultiQueryRetriever.from_llm(
-                    retriever=vectorstore.as_retriever(),
-                    llm=llm
-                )
-
-                docs = multi_retriever.invoke(query)
+            logger.info(f"Attempting retrieval with API key {label}")
 
+            # Vector store, LLM and retriever are built once per process and reused
+            retriever = retriever_registry.retriever(
+                mode, client, collection_name, embedding_model, groq_key
+            )
 
-                chunks = [d.page_content for d in docs] 
-                sources = [d.metadata.get("source") for d in docs if d.metadata.get("source")]
-                context = "\n---\n".join(chunks)
+            # LLM query generation plus the vector searches it triggers
+            with key_pool.using(groq_key), timed("llm_expansion"):
+                docs = retriever.invoke(query)
+            key_pool.record_success(groq_key)
+
+            sources = [d.metadata.get("source") for d in docs if d.metadata.get("source")]
+            if context_budget:
+                context = _pack_context([
+                    ContextChunk(d.page_content, d.metadata.get("source"), d.metadata.get("part"), None)
+                    for d in docs
+                ], context_budget)
+            else:
+                context = "\n---\n".join(d.page_content for d in docs)
 
-                print(f"[SUCCESS] Retrieved with API key #{key_index + 1}")
-                return context, sources
+            logger.info(f"Retrieved with API key {label}")
+            return context, sources
 
         except RateLimitError as e:
             last_error = e
-            print(f"[WARNING] Rate limit hit on API key #{key_index + 1}")
+            key_pool.record_rate_limit(groq_key, e.response.headers)
+            logger.warning(f"Rate limit hit on API key {label}")
             
-            if key_index < len(groq_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 raise Exception(f"All API keys exhausted. Rate limit error: {str(e)}")
 
         except APIError as e:
             last_error = e
-            print(f"[ERROR] API error on key #{key_index + 1}: {str(e)}")
+            key_pool.record_error(groq_key)
+            logger.error(f"API error on key {label}: {str(e)}")
             
-            if key_index < len(groq_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 raise Exception(f"All API keys failed. Last error: {str(e)}")
 
         except Exception as e:
             last_error = e
-            print(f"[ERROR] Error on key #{key_index + 1}: {str(e)}")
+            key_pool.record_error(groq_key)
+            logger.error(f"Error on key {label}: {str(e)}")
             
-            if key_index < len(groq_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 raise Exception(f"All API keys failed. Last error: {str(e)}")
@@ -299,9 +623,135 @@ def Search(
     # Fallback
     raise Exception(f"Could not retrieve results with any API key. Last error: {str(last_error)}")
 
-def GenerationGroq(query, search_results, groq_key, temperature=0.6, max_tokens=2000):
-    """Generate response using Groq API"""
-    client = Groq(api_key=groq_key)
+async def aSearch(
+    query,
+    async_client,
+    collection_name,
+    embedding_model,
+    groq_keys=None,
+    mode="default",
+    top_k=3,
+    lexical_index=None,
+    rerank=False,
+    rerank_candidates=20,
+    client=None,
+    context_budget=None,
+    router=None,
+    filters=None,
+    oversampling=None
+):
+    """
+    Async counterpart of Search() for the ASGI streaming view.
+
+    default/routed/hybrid/expand talk to Qdrant through `async_client`; embedding,
+    BM25 and reranking (CPU work) run in worker threads so the event loop
+    stays free. self/multi go through LangChain and run Search() in a thread
+    with the sync `client`, as does every mode when `async_client` is None
+    (embedded Qdrant, searched in-process).
+    """
+    if mode in ("self", "multi") or async_client is None:
+        return await asyncio.to_thread(
+            Search, query, client, collection_name, embedding_model,
+            groq_keys=groq_keys, mode=mode, top_k=top_k, lexical_index=lexical_index,
+            rerank=rerank, rerank_candidates=rerank_candidates, context_budget=context_budget,
+            router=router, filters=filters, oversampling=oversampling
+        )
+
+    fetch_k = max(top_k, rerank_candidates) if rerank else top_k
+    query_filter = search_filter(filters)
+    search_params = quantization_search_params(oversampling)
+
+    if mode == "default":
+        with timed("embed"):
+            query_embedding = normalize(await asyncio.to_thread(embedding_model.encode, query))
+        with timed("search"):
+            results = await async_client.search(
+                collection_name=collection_name,
+                query_vector=("default", query_embedding),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=fetch_k
+            )
+
+    elif mode == "routed":
+        with timed("embed"):
+            query_embedding = normalize(await asyncio.to_thread(embedding_model.encode, query))
+        query_filter = _route_filter(query_embedding, router, filters)
+        with timed("search"):
+            results = await async_client.search(
+                collection_name=collection_name,
+                query_vector=("default", query_embedding),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=fetch_k
+            )
+
+    elif mode == "hybrid":
+        if lexical_index is None:
+            from .lexical import get_lexical_index
+            lexical_index = await asyncio.to_thread(get_lexical_index)
+
+        with timed("embed"):
+            query_embedding = normalize(await asyncio.to_thread(embedding_model.encode, query))
+        with timed("search"):
+            dense_results, lexical_results = await asyncio.gather(
+                async_client.search(
+                    collection_name=collection_name,
+                    query_vector=("default", query_embedding),
+                    query_filter=query_filter,
+                    search_params=search_params,
+                    limit=fetch_k * 3
+                ),
+                asyncio.to_thread(lexical_index.search, query, fetch_k * 3,
+                                  payload_matches(filters) if filters else None) if lexical_index
+                else asyncio.sleep(0, result=[])
+            )
+        results = reciprocal_rank_fusion([dense_results, lexical_results])[:fetch_k]
+
+    elif mode == "expand":
+        from qdrant_client.models import SearchRequest, NamedVector
+
+        variants = expand_query(query)
+        with timed("embed"):
+            embs = await asyncio.to_thread(
+                embedding_model.encode,
+                variants, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+            )
+        with timed("search"):
+            responses = await async_client.search_batch(
+                collection_name=collection_name,
+                requests=[
+                    SearchRequest(
+                        vector=NamedVector(name="default", vector=emb.tolist()),
+                        filter=query_filter,
+                        params=search_params,
+                        limit=fetch_k * 2,
+                        with_payload=True
+                    )
+                    for emb in embs
+                ]
+            )
+        results = reciprocal_rank_fusion(responses)[:fetch_k]
+
+    else:
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    if rerank:
+        results = await asyncio.to_thread(_rerank, query, results, top_k)
+
+    if context_budget:
+        # Tokenizing is CPU work as well
+        return await asyncio.to_thread(
+            _format_results, results, context_budget, scored=mode in ("default", "routed") and not rerank
+        )
+    return _format_results(results)
+
+
+def GenerationGroq(query, search_results, groq_keys, temperature=0.6, max_tokens=2000):
+    """Generate response using Groq API (keys taken from the shared key pool)"""
+    from groq import Groq, RateLimitError, APIError
+
+    key_pool = get_key_pool(groq_keys)
 
     prompt = f"""
     Vous êtes un assistant utile. Utilisez le contexte suivant pour répondre à la question de l'utilisateur de manière COMPLÈTE et DÉTAILLÉE en français.
@@ -325,108 +775,522 @@ def GenerationGroq(query, search_results, groq_key, temperature=0.6, max_tokens=
     Réponse complète en Markdown:
     """
 
-    completion = client.chat.completions.create(
-        model="openai/gpt-oss-safeguard-20b",
-        messages=[{'role': 'user', 'content': prompt}],
-        temperature=temperature,
-        max_completion_tokens=max_tokens,
-        top_p=1,
-        stream=True,
-        stop=None,
-    )
-    
-    generations = ""
-    for chunk in completion:
-        if chunk.choices[0].delta.content:
-            generations += chunk.choices[0].delta.content
-    
-    return generations.strip()
+    last_error = None
+    for groq_key in key_pool.candidates():
+        client = Groq(api_key=groq_key)
+        try:
+            started = time.perf_counter()
+            first_token_at = None
+            tokens = 0
+            with key_pool.using(groq_key):
+                raw = client.chat.completions.with_raw_response.create(
+                    model="openai/gpt-oss-safeguard-20b",
+                    messages=[{'role': 'user', 'content': prompt}],
+                    temperature=temperature,
+                    max_completion_tokens=max_tokens,
+                    top_p=1,
+                    stream=True,
+                    stop=None,
+                )
+                completion = raw.parse()
 
+                generations = ""
+                for chunk in completion:
+                    if chunk.choices[0].delta.content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        tokens += 1
+                        generations += chunk.choices[0].delta.content
 
-def chunk_Embedd(client: QdrantClient, collection_name: str, embedding_model: SentenceTransformer,
-                 data_path: str, tokenizer=tokenizer, chunk_size=512, overlap=50, batch_size=64):
+            observe_generation(started, first_token_at, tokens)
+            key_pool.record_success(groq_key, raw.headers)
+            return generations.strip()
+
+        except RateLimitError as e:
+            last_error = e
+            key_pool.record_rate_limit(groq_key, e.response.headers)
+            logger.warning(f"Rate limit hit on API key {key_pool.label(groq_key)}")
+        except APIError as e:
+            last_error = e
+            key_pool.record_error(groq_key)
+            logger.error(f"API error on key {key_pool.label(groq_key)}: {str(e)}")
+
+    raise Exception(f"All API keys failed. Last error: {str(last_error)}")
+
+
+# -------------------------
+#   Embedded Qdrant
+# -------------------------
+def open_embedded_client(path, allow_copy=True):
     """
-    Full pipeline: chunk files, deduplicate, embed in batches, create collection and upsert in batches.
-    Returns number of indexed points.
+    Qdrant in local (in-process) mode stored in `path`.
+
+    Local mode keeps an exclusive lock on its folder. When another worker
+    already holds it, this process gets a private copy of the storage instead
+    (the corpus is small) and the copy path is returned; otherwise None.
+    Returns (client, copy_path).
     """
-    # chunk
-    json_folder = os.path.join(data_path, "emploi-temps")
-    chunks_json, metadata_json = load_and_split_json(json_folder)
-    chunks_txt, metadata_txt = load_and_split_txt(data_path)
-
-
-    chunks = chunks_json + chunks_txt
-    metadata = metadata_json + metadata_txt
-
-    # deduplicate while preserving metadata correspondence
-    seen = {}
-    clean_chunks = []
-    clean_metadata = []
-    for c, m in zip(chunks, metadata):
-        key = c.strip()
-        if not key:
-            continue
-        if key in seen:
-            # optionally merge metadata (keep first)
-            continue
-        seen[key] = True
-        clean_chunks.append(key)
-        clean_metadata.append(m)
+    import shutil
+    import tempfile
+    from qdrant_client import QdrantClient
+
+    os.makedirs(path, exist_ok=True)
+    try:
+        return QdrantClient(path=str(path)), None
+    except RuntimeError:
+        if not allow_copy:
+            raise
+        copy_path = tempfile.mkdtemp(prefix="qdrant-worker-")
+        shutil.copytree(path, copy_path, dirs_exist_ok=True, ignore=shutil.ignore_patterns(".lock"))
+        logger.info(f"Embedded Qdrant at {path} is in use, serving from a private copy: {copy_path}")
+        return QdrantClient(path=copy_path), copy_path
 
-    chunks = clean_chunks
-    metadata = clean_metadata
 
-    if len(chunks) == 0:
-        print("No chunks to index.")
-        return 0
+# -------------------------
+#   Indexing helpers
+# -------------------------
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a3e-8d4b-4f5e-9a7c-2b1d0e3f4a5b")
+
+# Payload fields written by chunk_Embedd and their Qdrant index type;
+# bump PAYLOAD_SCHEMA when fields change so incremental runs rewrite old payloads
+PAYLOAD_INDEXES = {
+    "name": "keyword",
+    "source": "keyword",
+    "categorie": "keyword",
+    "section": "keyword",
+    "part": "integer",
+}
+PAYLOAD_SCHEMA = 2
+
+
+# Vector quantization of the collection: None | "scalar" (int8, 4x smaller) | "binary" (1 bit/dim, 32x)
+QUANTIZATION_KINDS = (None, "scalar", "binary")
+
+
+def quantization_config(kind):
+    """Qdrant quantization config; quantized vectors stay in RAM, originals go to disk for rescoring"""
+    from qdrant_client.models import (ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+                                      BinaryQuantization, BinaryQuantizationConfig)
+    if kind not in QUANTIZATION_KINDS:
+        raise ValueError(f"Unknown quantization: {kind}")
+    if kind == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
 
-    print(f"Number of chunks to embed: {len(chunks)}")
 
-    # create collection (delete if exists)
-    if client.collection_exists(collection_name):
-        client.delete_collection(collection_name)
+def create_collection(client, collection_name, size, quantization=None):
+    """Create the chatbot collection (named cosine vector 'default'), optionally quantized"""
+    from qdrant_client.models import VectorParams, Distance, HnswConfigDiff
 
     client.create_collection(
         collection_name=collection_name,
         vectors_config={
-            "default": VectorParams(size=embedding_model.get_sentence_embedding_dimension(), distance=Distance.COSINE)
+            "default": VectorParams(size=size, distance=Distance.COSINE, on_disk=quantization is not None)
         },
-        hnsw_config=HnswConfigDiff(ef_construct=300)
+        hnsw_config=HnswConfigDiff(ef_construct=300),
+        quantization_config=quantization_config(quantization)
     )
 
-    # batch encode + upsert
-    points = []
-    for i in range(0, len(chunks), batch_size):
-        batch_chunks = chunks[i:i+batch_size]
-        batch_meta = metadata[i:i+batch_size]
 
-        embs = embedding_model.encode(batch_chunks, convert_to_numpy=True, show_progress_bar=False)
-        # normalize
-        embs = np.array([v / np.linalg.norm(v) if np.linalg.norm(v) > 0 else v for v in embs])
+def ensure_quantization(client, collection_name, quantization=None):
+    """Switch an existing collection to the requested quantization (Qdrant re-quantizes in the background)"""
+    from qdrant_client.models import ScalarQuantization, BinaryQuantization, Disabled, VectorParamsDiff
 
-        for j, emb in enumerate(embs):
-            idx = i + j
-            meta = metadata[idx]
-            doc_name = os.path.splitext(meta.get('name', 'Unknown'))[0]  # Remove extension
-            chunk_with_meta = f"Cela concerne: {doc_name}\n\n{chunks[idx]}"
-            
-            points.append(
-                PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector={"default": emb.tolist()},
-                    payload={
-                        "chunk": chunk_with_meta,
-                        "name": meta.get('name'),
-                        "source": meta.get('source'),
-                        "categorie": meta.get('categorie'),
-                        "part": meta.get('part')
-                    }
-                )
+    current = client.get_collection(collection_name).config.quantization_config
+    current_kind = ("scalar" if isinstance(current, ScalarQuantization)
+                    else "binary" if isinstance(current, BinaryQuantization) else None)
+    if current_kind == quantization:
+        return
+    logger.info(f"Changing the quantization of {collection_name}: {current_kind} → {quantization}")
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"default": VectorParamsDiff(on_disk=quantization is not None)},
+        quantization_config=quantization_config(quantization) or Disabled.DISABLED
+    )
+
+
+def quantization_search_params(oversampling=None):
+    """
+    Search params for a quantized collection: fetch `oversampling` × limit candidates
+    with the quantized vectors, then rescore them with the original ones.
+    None keeps Qdrant's defaults.
+    """
+    if not oversampling:
+        return None
+    from qdrant_client.models import SearchParams, QuantizationSearchParams
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=oversampling))
+
+
+def ensure_payload_indexes(client, collection_name):
+    """Create the payload indexes used by filtered searches (no-op if they exist)"""
+    from qdrant_client.models import PayloadSchemaType
+
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=PayloadSchemaType(schema),
+                wait=True
             )
 
-        # upsert in smaller batches to avoid huge payloads
-        client.upsert(collection_name=collection_name, points=points)
-        points = []  # clear for next batch
 
-    print("Data indexed successfully!")
-    return len(chunks)
+def rewrite_payloads(client, collection_name, items, batch_size=256):
+    """Overwrite the payload of already indexed (point_id, payload) items, without re-embedding"""
+    from qdrant_client.models import SetPayload, SetPayloadOperation
+
+    for i in range(0, len(items), batch_size):
+        client.batch_update_points(
+            collection_name=collection_name,
+            update_operations=[
+                SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[pid]))
+                for pid, payload in items[i:i+batch_size]
+            ],
+            wait=True
+        )
+
+
+def relative_source(source, data_path):
+    """Source path relative to the data folder, with forward slashes"""
+    try:
+        source = os.path.relpath(source, data_path)
+    except ValueError:
+        pass
+    return source.replace("\\", "/")
+
+
+def point_id(source, part, chunk):
+    """Deterministic point ID derived from (source, part, chunk text)"""
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}|{part}|{digest}"))
+
+
+def load_manifest(manifest_path, collection_name):
+    """Return the manifest of indexed points, or None if missing/for another collection"""
+    if not manifest_path or not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("collection") != collection_name:
+        return None
+    return manifest
+
+
+def save_manifest(manifest_path, collection_name, points):
+    """Atomically write the manifest {point_id: {source, part}} of the collection"""
+    version = hashlib.sha256("".join(sorted(points)).encode("utf-8")).hexdigest()[:16]
+    manifest = {
+        "collection": collection_name,
+        "version": version,
+        "payload_schema": PAYLOAD_SCHEMA,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "points": points,
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def indexed_point_ids(client, collection_name, batch_size=1000):
+    """Scroll every point ID currently stored in the collection"""
+    ids = set()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        ids.update(str(r.id) for r in records)
+        if offset is None:
+            return ids
+
+
+_PIPELINE_DONE = object()
+
+# Timings of the last chunk_Embedd run (read by the reindex command)
+LAST_INDEX_STATS = {}
+
+
+def embed_and_upsert(client, collection_name, embedding_model, items, batch_size=64,
+                     encode_workers=1, upsert_workers=2, queue_size=4, vectors=None):
+    """
+    Embed and upsert (point_id, text, payload) items as a three-stage pipeline:
+    batching → encoding → parallel upserts, connected by bounded queues so
+    encoding of the next batch overlaps the upsert of the previous one.
+    Each upsert waits until Qdrant has applied it, so a server-side failure is
+    raised here instead of being lost after the manifest is written.
+    items may be a lazy iterable (e.g. chunks streamed from the loaders): it is
+    consumed by the batching thread, so loading overlaps encoding as well.
+    vectors: optional dict filled with point_id → embedding.
+    Returns a dict of timings.
+    """
+    from qdrant_client.models import PointStruct, UpdateStatus
+
+    encode_workers = max(1, encode_workers)
+    upsert_workers = max(1, upsert_workers)
+    started = time.perf_counter()
+    batch_queue = queue.Queue(maxsize=queue_size)
+    upsert_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+    timings = {"encode_seconds": 0.0, "upsert_seconds": 0.0}
+    timings_lock = threading.Lock()
+    count = 0
+
+    def produce():
+        nonlocal count
+        try:
+            batch = []
+            for item in items:
+                if errors:
+                    return
+                batch.append(item)
+                count += 1
+                if len(batch) == batch_size:
+                    batch_queue.put(batch)
+                    batch = []
+            if batch:
+                batch_queue.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(encode_workers):
+                batch_queue.put(_PIPELINE_DONE)
+
+    def encode():
+        while True:
+            batch = batch_queue.get()
+            if batch is _PIPELINE_DONE:
+                return
+            if errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                t0 = time.perf_counter()
+                embs = embedding_model.encode(
+                    [text for _, text, _ in batch],
+                    batch_size=len(batch),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+                points = [
+                    PointStruct(id=pid, vector={"default": emb}, payload=payload)
+                    for (pid, _, payload), emb in zip(batch, embs.tolist())
+                ]
+                if vectors is not None:
+                    vectors.update((pid, p.vector["default"]) for (pid, _, _), p in zip(batch, points))
+                with timings_lock:
+                    timings["encode_seconds"] += time.perf_counter() - t0
+                upsert_queue.put(points)
+            except Exception as e:
+                errors.append(e)
+
+    def upsert():
+        while True:
+            points = upsert_queue.get()
+            if points is _PIPELINE_DONE:
+                return
+            if errors:
+                continue
+            try:
+                t0 = time.perf_counter()
+                result = client.upsert(collection_name=collection_name, points=points, wait=True)
+                if result.status != UpdateStatus.COMPLETED:
+                    raise RuntimeError(f"Qdrant upsert of {len(points)} points ended with status {result.status}")
+                with timings_lock:
+                    timings["upsert_seconds"] += time.perf_counter() - t0
+            except Exception as e:
+                errors.append(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    encoders = [threading.Thread(target=encode, daemon=True) for _ in range(encode_workers)]
+    upserters = [threading.Thread(target=upsert, daemon=True) for _ in range(upsert_workers)]
+
+    for t in [producer] + encoders + upserters:
+        t.start()
+    producer.join()
+    for t in encoders:
+        t.join()
+    for _ in upserters:
+        upsert_queue.put(_PIPELINE_DONE)
+    for t in upserters:
+        t.join()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    return {
+        "chunks": count,
+        "seconds": elapsed,
+        "chunks_per_second": count / elapsed if elapsed > 0 else 0.0,
+        **timings,
+    }
+
+
+def chunk_Embedd(client: "QdrantClient", collection_name: str, embedding_model: "SentenceTransformer",
+                 data_path: str, tokenizer=None, chunk_size=512, overlap=50, batch_size=64,
+                 incremental=False, manifest_path=None, encode_workers=1, upsert_workers=2,
+                 lexical_index_path=None, router_path=None, quantization=None):
+    """
+    Full pipeline: chunk files, deduplicate, embed in batches and upsert in batches.
+    Files are loaded and chunked one at a time inside the pipeline, so the first
+    batches are embedded while later files are still being read.
+
+    Point IDs are derived from (source, part, chunk text), so unchanged chunks keep their ID.
+    incremental=False → drop and recreate the collection, then index everything.
+    incremental=True  → keep the collection live, embed/upsert only new or changed chunks
+                        and delete the stale ones.
+    manifest_path: JSON file recording what is indexed (falls back to scrolling the collection).
+    encode_workers / upsert_workers: parallelism of the embedding and upsert stages.
+    lexical_index_path: where to persist the BM25 index built over the same chunks.
+    router_path: where to persist the category centroids of the query router.
+    quantization: None, "scalar" or "binary" vector quantization of the collection
+                  (applied to an existing collection as well).
+    Returns number of indexed points.
+    """
+    from qdrant_client.models import PointIdsList
+
+    started = time.perf_counter()
+    LAST_INDEX_STATS.clear()
+
+    # chunks in (source, part) order, so deduplication keeps the same chunk/source pair on every run
+    def unique_chunks():
+        seen = set()
+        for c, m in iter_document_chunks(data_path):
+            key = c.strip()
+            if not key or key in seen:
+                continue  # keep the first occurrence
+            seen.add(key)
+            yield key, m
+
+    chunks = unique_chunks()
+    first = next(chunks, None)
+    if first is None:
+        logger.info("No chunks to index.")
+        return 0
+
+    collection_exists = client.collection_exists(collection_name)
+
+    payload_schema = PAYLOAD_SCHEMA
+    if incremental and collection_exists:
+        manifest = load_manifest(manifest_path, collection_name)
+        if manifest is not None:
+            existing_ids = set(manifest["points"])
+            payload_schema = manifest.get("payload_schema", 1)
+        else:
+            logger.info("No manifest found, reading indexed IDs from the collection...")
+            existing_ids = indexed_point_ids(client, collection_name)
+            payload_schema = None
+        ensure_quantization(client, collection_name, quantization)
+    else:
+        # create collection (delete if exists)
+        if collection_exists:
+            client.delete_collection(collection_name)
+
+        create_collection(client, collection_name, embedding_model.get_sentence_embedding_dimension(),
+                          quantization=quantization)
+        existing_ids = set()
+
+    ensure_payload_indexes(client, collection_name)
+
+    # filled by the pipeline's batching thread as files are loaded
+    ids = []
+    payloads = []
+    manifest_points = {}
+    todo = []
+
+    def pending():
+        """Content-addressed IDs and payloads of every chunk; yields only new or changed ones"""
+        for c, meta in itertools.chain([first], chunks):
+            rel_source = relative_source(meta["source"], data_path)
+            pid = point_id(rel_source, meta["part"], c)
+            doc_name = os.path.splitext(meta.get('name', 'Unknown'))[0]  # Remove extension
+            payload = {
+                "chunk": f"Cela concerne: {doc_name}\n\n{c}",
+                "name": meta.get('name'),
+                "source": meta.get('source'),
+                "categorie": meta.get('categorie'),
+                "section": section_code(os.path.basename(meta.get('source') or "")),
+                "part": meta.get('part')
+            }
+            manifest_points[pid] = {"source": rel_source, "part": meta["part"]}
+            ids.append(pid)
+            payloads.append(payload)
+            if pid not in existing_ids:
+                todo.append(len(ids) - 1)
+                yield pid, c, payload
+
+    # load + encode + upsert only new or changed chunks, overlapped through bounded queues
+    new_vectors = {} if router_path else None
+
+    stats = embed_and_upsert(
+        client, collection_name, embedding_model, pending(),
+        batch_size=batch_size, encode_workers=encode_workers, upsert_workers=upsert_workers,
+        vectors=new_vectors
+    )
+    stale_ids = existing_ids - set(ids)
+
+    logger.info(f"Number of chunks: {len(ids)} | embedded: {len(todo)} | stale: {len(stale_ids)}")
+    logger.info(f"Embedded {stats['chunks']} chunks in {stats['seconds']:.2f}s "
+                f"({stats['chunks_per_second']:.1f} chunks/s)")
+
+    # points indexed before the current payload fields existed
+    if payload_schema != PAYLOAD_SCHEMA:
+        kept = [(pid, payloads[k]) for k, pid in enumerate(ids) if pid in existing_ids]
+        if kept:
+            logger.info(f"Rewriting the payload of {len(kept)} indexed chunks (payload schema {PAYLOAD_SCHEMA})")
+            rewrite_payloads(client, collection_name, kept)
+
+    # remove chunks whose file was deleted or whose content changed
+    if stale_ids:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=list(stale_ids)),
+            wait=True
+        )
+
+    # lexical index over exactly the same points
+    if lexical_index_path:
+        from .lexical import BM25Index
+        BM25Index.build(
+            ids,
+            [p["chunk"] for p in payloads],
+            [{"chunk": p["chunk"], "source": p["source"], "categorie": p["categorie"], "section": p["section"]}
+             for p in payloads]
+        ).save(lexical_index_path)
+
+    # category centroids of the query router (mode='routed')
+    if router_path:
+        from .router import build_category_router
+        build_category_router(
+            client, collection_name,
+            extra=[(payloads[idx]["categorie"], new_vectors[ids[idx]]) for idx in todo],
+            skip_ids=set(new_vectors) | stale_ids
+        ).save(router_path)
+
+    if manifest_path:
+        save_manifest(manifest_path, collection_name, manifest_points)
+
+    # Cached answers may reference stale chunks, cached documents stale files
+    if todo or stale_ids:
+        from .cache import semantic_cache
+        from .sources import source_store
+        semantic_cache.invalidate()
+        source_store.invalidate()
+
+    elapsed = time.perf_counter() - started
+    LAST_INDEX_STATS.update(stats, total_chunks=len(ids), stale=len(stale_ids), wall_clock_seconds=elapsed)
+
+    logger.info(f"Data indexed successfully! ({len(ids)} chunks, {elapsed:.2f}s end-to-end)")
+    return len(ids)
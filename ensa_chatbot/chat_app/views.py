@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.cache import never_cache
@@ -11,12 +11,29 @@ from django.apps import apps
 from django.conf import settings
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Substr
+from django.utils import timezone
+import hmac
 import json
-import traceback
+import logging
 import re
+import time
 
-from .utils import Search, GenerationGroq
+from django.contrib.admin.views.decorators import staff_member_required
+
+from .utils import Search, aSearch, GenerationGroq
 from .models import ChatHistory, UserProfile
+from .cache import semantic_cache, embed_query, is_cacheable, normalize_query
+from .rerank import get_reranker
+from .key_pool import get_key_pool
+from .sources import source_store
+from .persistence import save_chat, chat_writer
+from .pagination import keyset_page
+from .metrics import registry, start_request_timer, current_timer, timed, observe_generation
+from .timetable import timetable_index
+from .streams import Flight, coalescer, stream_registry
+
+logger = logging.getLogger(__name__)
 
 
 # ============================================================================
@@ -184,7 +201,8 @@ def chatbot_view(request):
 @require_http_methods(["POST"])
 @login_required(login_url='chat_app:login')
 def handle_query(request):
-    """Handle chatbot queries (requires authentication)"""
+    """Handle chatbot queries (requires authentication); stage timings in Server-Timing"""
+    timer = start_request_timer()
     try:
         # Parse request data
         data = json.loads(request.body)
@@ -197,42 +215,49 @@ def handle_query(request):
         if len(query) > 2000:
             return JsonResponse({"error": "Query too long (max 2000 characters)"}, status=400)
         
-        print(f"[{request.user.username}] Query: {query}")
+        logger.info(f"[{request.user.username}] Query: {query}")
+
+        # Timetable questions are answered from the indexed schedules (no retrieval, no LLM)
+        timetable_answer = _answer_from_timetable(query)
+        if timetable_answer is not None:
+            response, valid_sources = timetable_answer
+            _save_chat_history(request.user, query, response, valid_sources, timer)
+            return _timed_response(timer, "timetable", {
+                "response": response,
+                "success": True
+            })
         
-        # Get chatbot components from app config
+        # Get chatbot components from app config (loaded on first use)
         chatbot_config = apps.get_app_config('chat_app')
+        if not chatbot_config.ensure_ready(wait=False):
+            return _not_ready_response(chatbot_config)
         client = chatbot_config.client
         collection_name = chatbot_config.collection_name
         embedding_model = chatbot_config.embedding_model
+
+        # Semantic cache: similar questions reuse the previous answer ("demain" changes every day)
+        query_embedding = None
+        if settings.SEMANTIC_CACHE_ENABLED and is_cacheable(query):
+            with timed("cache_lookup"):
+                query_embedding = embed_query(embedding_model, query)
+                cached = semantic_cache.lookup(query_embedding, query)
+            if cached is not None:
+                logger.info(f"[{request.user.username}] Semantic cache hit")
+                _save_chat_history(request.user, query, cached["response"], cached["sources"], timer)
+                return _timed_response(timer, "cache_hit", {
+                    "response": cached["response"],
+                    "success": True
+                })
         
         # Perform search
-        results, sources = Search(query, client, collection_name, embedding_model, groq_key=settings.GROQ_API_KEY, mode="multi", top_k=3)
+        results, sources = Search(query, client, collection_name, embedding_model,
+                                  groq_keys=settings.GROQ_API_KEY, mode=settings.SEARCH_MODE,
+                                  top_k=settings.SEARCH_TOP_K, context_budget=settings.CONTEXT_TOKEN_BUDGET,
+                                  rerank=settings.RERANK_ENABLED, rerank_candidates=settings.RERANK_CANDIDATES,
+                                  oversampling=settings.QDRANT_OVERSAMPLING if settings.QDRANT_QUANTIZATION else None)
 
-        # Process sources
-        source_data = []
-        valid_sources = []
-        
-        for source in sources:
-            if source is None:
-                continue
-            source = source.replace("\\", "/")
-            try:
-                if source.endswith(".json"):
-                    with open(source, 'r', encoding='utf-8') as f:
-                        data_content = json.load(f)
-                        source_data.append(data_content)
-                        valid_sources.append(source)
-                elif source.endswith(".txt"):
-                    with open(source, "r", encoding="utf-8") as f:
-                        data_content = f.read()
-                        source_data.append(data_content)
-                        valid_sources.append(source)
-            except FileNotFoundError:
-                print(f"[ERROR] Source file not found: {source}")
-                continue
-            except Exception as e:
-                print(f"[ERROR] Error loading source {source}: {str(e)}")
-                continue
+        # Keep the sources that exist in the data folder (preloaded, no disk I/O)
+        valid_sources = source_store.valid_sources(sources)
         
         # Generate response
         if results:
@@ -249,28 +274,12 @@ def handle_query(request):
             if response is None:
                 raise ValueError("GenerationGroq returned None response")
             
-            # Format sources for display (just filenames)
-            formatted_sources = [s.split('/')[-1] for s in valid_sources]
-            
-            # Save to chat history
-            try:
-                chat_history = ChatHistory.objects.create(
-                    user=request.user,
-                    query=query,
-                    response=response,
-                    sources=', '.join(valid_sources)
-                )
-                
-                # Update user profile
-                profile = request.user.profile
-                profile.total_queries = request.user.chat_history.count()
-                profile.save()
-                
-                print(f"[{request.user.username}] Chat saved (ID: {chat_history.id})")
-            except Exception as e:
-                print(f"[ERROR] Failed to save chat history: {str(e)}")
+            semantic_cache.store(query_embedding, response, valid_sources, query)
+
+            # Save to chat history (background writer)
+            _save_chat_history(request.user, query, response, valid_sources, timer)
             
-            return JsonResponse({
+            return _timed_response(timer, "answered", {
                 "response": response,
                 "success": True
             })
@@ -278,22 +287,9 @@ def handle_query(request):
             error_message = "Désolé, je n'ai pas trouvé d'informations pertinentes pour répondre à votre question."
             
             # Still save the query
-            try:
-                ChatHistory.objects.create(
-                    user=request.user,
-                    query=query,
-                    response=error_message,
-                    sources=""
-                )
-                
-                # Update user profile
-                profile = request.user.profile
-                profile.total_queries = request.user.chat_history.count()
-                profile.save()
-            except Exception as e:
-                print(f"[ERROR] Failed to save chat history: {str(e)}")
+            _save_chat_history(request.user, query, error_message, [], timer)
             
-            return JsonResponse({
+            return _timed_response(timer, "no_results", {
                 "response": error_message,
                 "sources": [],
                 "success": False
@@ -302,24 +298,84 @@ def handle_query(request):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON format"}, status=400)
     except Exception as e:
-        print(f"[ERROR] Exception in handle_query:")
-        traceback.print_exc()
-        return JsonResponse({
+        logger.exception("Exception in handle_query")
+        return _timed_response(timer, "error", {
             "error": "Une erreur s'est produite lors du traitement de votre question.",
             "details": str(e) if settings.DEBUG else None
         }, status=500)
 
+
+def _answer_from_timetable(query):
+    """(markdown, sources) when the timetable engine recognizes the question, else None"""
+    if not settings.TIMETABLE_FAST_PATH:
+        return None
+    with timed("timetable"):
+        return timetable_index.answer(query, today=timezone.localdate().weekday())
+
+
+def _timed_response(timer, outcome, data, status=200):
+    """JSON response carrying the request's stage timings in a Server-Timing header"""
+    timer.finish()
+    registry.count_request("query", outcome)
+    response = JsonResponse(data, status=status)
+    response["Server-Timing"] = timer.server_timing()
+    return response
+
 from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+import asyncio
+
+
+def _sse_response(stream, after=None):
+    """Server-sent events of a ResponseStream, from the start or after event `after`"""
+    return StreamingHttpResponse(
+        stream.read(after, heartbeat=settings.SSE_HEARTBEAT_SECONDS),
+        content_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+def _not_ready_response(chatbot_config):
+    """503 while the models are loading or after a failed initialization"""
+    return JsonResponse({
+        "error": "Le chatbot est en cours de démarrage, veuillez réessayer dans quelques instants.",
+        "status": chatbot_config.readiness(),
+    }, status=503)
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
 @login_required(login_url='chat_app:login')
-def handle_query_stream(request):
-    """Stream chatbot responses in real-time like Claude/ChatGPT"""
+async def handle_query_stream(request):
+    """
+    Stream chatbot responses in real-time like Claude/ChatGPT.
+    Async view: served through ensa_chatbot/asgi.py, a stream does not pin a worker thread.
+    """
     if request.method != 'POST':
         return JsonResponse({"error": "Method not allowed"}, status=405)
     
+    timer = start_request_timer()
     try:
+        user = await request.auser()
+
+        # Reconnection: continue the answer still held in memory, no new retrieval/generation
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id:
+            resumed = stream_registry.resume(last_event_id, user.id)
+            if resumed is None:
+                # Expired or held by another worker: the client restarts the answer from scratch
+                logger.info(f"[{user.username}] Cannot resume stream event {last_event_id}")
+                registry.count_request("stream", "expired")
+                return JsonResponse({
+                    "error": "La réponse en cours n'est plus disponible, elle va être régénérée.",
+                }, status=410)
+            stream, seq = resumed
+            logger.info(f"[{user.username}] Resuming stream {stream.id} after event {seq}")
+            return _sse_response(stream, after=seq)
+
         data = json.loads(request.body)
         query = data.get('query', '').strip()
         
@@ -329,162 +385,285 @@ def handle_query_stream(request):
         if len(query) > 2000:
             return JsonResponse({"error": "Query too long"}, status=400)
         
-        print(f"[{request.user.username}] Streaming query: {query}")
-        
-        # Get components
+        logger.info(f"[{user.username}] Streaming query: {query}")
+
+        # Timetable questions: rendered table replayed through the same SSE frames
+        # (off the event loop: the first call and every refresh read the data folder)
+        timetable_answer = await asyncio.to_thread(_answer_from_timetable, query)
+        if timetable_answer is not None:
+            response, valid_sources = timetable_answer
+            return _sse_response(stream_registry.create(
+                generate_cached_stream(user, query, {"response": response, "sources": valid_sources},
+                                       timer, outcome="timetable"),
+                user.id
+            ))
+        
+        # Get components (the first request may still be loading the models)
         chatbot_config = apps.get_app_config('chat_app')
-        client = chatbot_config.client
-        collection_name = chatbot_config.collection_name
-        embedding_model = chatbot_config.embedding_model
-        
-        # Search
-        results, sources = Search(query, client, collection_name, embedding_model, 
-                                 groq_keys=settings.GROQ_API_KEY, mode="multi", top_k=3)
-        print(F"-------resuuuuuuuuuuuuuults---------------{results}")
-        
-        # Process sources
-        valid_sources = []
-        for source in sources:
-            if source is None:
-                continue
-            source = source.replace("\\", "/")
-            try:
-                if source.endswith((".json", ".txt")):
-                    valid_sources.append(source)
-            except:
-                continue
-        
-        # Return streaming response
-        return StreamingHttpResponse(
-            generate_stream(request.user, query, results, valid_sources, settings.GROQ_API_KEY),
-            content_type='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'X-Accel-Buffering': 'no',
-            }
-        )
+        if not await asyncio.to_thread(chatbot_config.ensure_ready, wait=False):
+            return _not_ready_response(chatbot_config)
+
+        # Identical question already being answered: read the same events
+        # (no await from here to create(), so two identical requests cannot both start one)
+        flight = None
+        if settings.STREAM_COALESCING:
+            flight = Flight(_flight_key(query))
+            stream = stream_registry.join(flight.key, user, query)
+            if stream is not None:
+                logger.info(f"[{user.username}] Joining in-flight answer {stream.id}")
+                registry.count_request("stream", "coalesced")
+                return _sse_response(stream)
+
+        # Retrieval and generation run in the background; the response reads their events
+        return _sse_response(stream_registry.create(
+            generate_answer(user, query, chatbot_config, timer, flight=flight), user.id, flight=flight
+        ))
         
     except Exception as e:
-        print(f"[ERROR] Streaming error: {e}")
-        traceback.print_exc()
+        logger.exception(f"Streaming error: {e}")
+        registry.count_request("stream", "error")
         return JsonResponse({"error": str(e)}, status=500)
 
-from groq import Groq
-from groq import APIError, RateLimitError
-import json
-def generate_stream(user, query, results, valid_sources, groq_api_keys):
-    """Generator for streaming response with multiple API key fallback"""
-    
+def _save_chat_history(user, query, response, valid_sources, timer=None):
+    """Queue one chat exchange for the background writer (counter incremented once, atomically)"""
+    formatted_sources = [source_store.display_name(s) for s in valid_sources]
+    try:
+        with timed("db_save", timer):
+            save_chat(user.id, query, response, ', '.join(valid_sources), formatted_sources)
+    except Exception as e:
+        logger.exception(f"Failed to save: {e}")
+
+
+# Inline writes (batching disabled) must leave the event loop
+async def asave_chat_history(user, query, response, valid_sources, timer=None):
+    if settings.CHAT_WRITE_BATCHING:
+        _save_chat_history(user, query, response, valid_sources, timer)
+    else:
+        await sync_to_async(_save_chat_history)(user, query, response, valid_sources, timer)
+
+
+async def asave_flight_history(user, query, response, valid_sources, timer=None, flight=None):
+    """Save the answer for the requesting user and for every user who joined its flight"""
+    followers = flight.seal() if flight is not None else []
+    for member, member_query in [(user, query), *followers]:
+        await asave_chat_history(member, member_query, response, valid_sources, timer)
+
+
+def _display_names(sources):
+    """Document names shown for source paths (may refresh the source store from disk)"""
+    return [source_store.display_name(s) for s in sources]
+
+
+def _flight_key(query):
+    """Requests answered by one shared stream: same normalized question and search mode"""
+    return f"{settings.SEARCH_MODE}:{normalize_query(query)}"
+
+
+def metadata_event(timer, outcome):
+    """Last SSE event of a stream: the request's stage timings in milliseconds"""
+    timer.finish()
+    registry.count_request("stream", outcome)
+    return {'type': 'metadata', 'timings': timer.as_dict()}
+
+
+def build_prompt(query, context):
+    """RAG prompt used for streamed answers"""
+    return f""" Vous êtes un assistant utile. vous êtes integrer dans un system RAG, Utilisez le contexte suivant pour répondre à la question de l'utilisateur de manière COMPLÈTE et DÉTAILLÉE en français. IMPORTANT - FORMAT DE RÉPONSE: - Utilisez le format Markdown pour structurer votre réponse - Utilisez des titres (##, ###) pour organiser les sections - Utilisez des listes à puces ou numérotées pour les énumérations - Utilisez des tableaux Markdown pour présenter des données structurées - Mettez en **gras** les informations importantes - Utilisez des `backticks` pour le code ou les termes techniques - Assurez-vous de terminer complètement vos phrases et tableaux svp évitez de parler hors contexte. Si vous ne connaissez pas la réponse, dites simplement que vous ne savez pas. Utilisez seulement le contexte pertinent selon la question posée. Contexte: {context} Question: {query} Réponse:"""
+
+
+async def generate_answer(user, query, chatbot_config, timer, flight=None):
+    """
+    Async generator of the SSE events of a RAG answer: semantic cache, retrieval,
+    then generation. Runs once per flight, whatever the number of users reading it.
+    """
+    # Runs in the stream's own task: point the stage timings at this request
+    current_timer.set(timer)
+    embedding_model = chatbot_config.embedding_model
+
+    # Semantic cache: replay a previous answer through the same SSE format ("demain" changes every day)
+    query_embedding = None
+    if settings.SEMANTIC_CACHE_ENABLED and is_cacheable(query):
+        with timed("cache_lookup"):
+            query_embedding = await asyncio.to_thread(embed_query, embedding_model, query)
+            cached = semantic_cache.lookup(query_embedding, query)
+        if cached is not None:
+            logger.info(f"[{user.username}] Semantic cache hit")
+            async for event in generate_cached_stream(user, query, cached, timer, flight=flight):
+                yield event
+            return
+
+    try:
+        results, sources = await aSearch(query, chatbot_config.get_async_client(), chatbot_config.collection_name,
+                                         embedding_model, groq_keys=settings.GROQ_API_KEY, mode=settings.SEARCH_MODE,
+                                         top_k=settings.SEARCH_TOP_K, context_budget=settings.CONTEXT_TOKEN_BUDGET,
+                                         rerank=settings.RERANK_ENABLED, rerank_candidates=settings.RERANK_CANDIDATES,
+                                         oversampling=settings.QDRANT_OVERSAMPLING if settings.QDRANT_QUANTIZATION else None,
+                                         client=chatbot_config.client)
+    except Exception as e:
+        logger.exception(f"Search error: {e}")
+        yield {'content': "Erreur lors de la recherche des informations.", 'done': True}
+        yield metadata_event(timer, "error")
+        return
+
+    # Keep the sources that exist in the data folder (off the loop: a refresh rescans the folder)
+    valid_sources = await asyncio.to_thread(source_store.valid_sources, sources)
+
+    async for event in generate_stream(user, query, results, valid_sources, settings.GROQ_API_KEY,
+                                       query_embedding=query_embedding, timer=timer, flight=flight):
+        yield event
+
+
+async def generate_cached_stream(user, query, cached, timer, outcome="cache_hit", flight=None):
+    """Replay a ready answer (semantic cache, timetable) with the same SSE events as generate_stream"""
+    # Split on whitespace boundaries so the client renders it like live tokens
+    frames = coalescer()
+    for piece in re.findall(r"\S+\s*|\s+", cached["response"]):
+        content = frames.add(piece)
+        if content:
+            yield {'content': content, 'type': 'token'}
+    content = frames.flush()
+    if content:
+        yield {'content': content, 'type': 'token'}
+
+    yield {'type': 'done'}
+
+    formatted_sources = await asyncio.to_thread(_display_names, cached["sources"])
+    yield {'sources': formatted_sources, 'type': 'sources'}
+
+    await asave_flight_history(user, query, cached["response"], cached["sources"], timer, flight)
+    yield metadata_event(timer, outcome)
+
+
+async def generate_stream(user, query, results, valid_sources, groq_api_keys, query_embedding=None, timer=None,
+                          flight=None):
+    """
+    Async generator of the SSE events of a streamed answer, with multiple API key fallback.
+    Groq deltas are coalesced into fewer token events (SSE_COALESCE_MS / SSE_COALESCE_CHARS).
+    Ends with a metadata event holding the stage timings (TTFT, tokens/s, ...).
+    """
+    from groq import AsyncGroq, APIError, RateLimitError
+
+    # The generator is iterated after the view returned: the timer is passed explicitly
+    timer = timer or start_request_timer()
+
     if not results:
         error_msg = "Désolé, je n'ai pas trouvé d'informations pertinentes."
-        yield f"data: {json.dumps({'content': error_msg, 'done': True})}\n\n"
+        yield {'content': error_msg, 'done': True}
+        yield metadata_event(timer, "no_results")
         return
     
-    # Ensure groq_api_keys is a list
-    if isinstance(groq_api_keys, str):
-        groq_api_keys = [groq_api_keys]
+    # Shared, load-balanced key pool (skips None keys, tracks rate limits)
+    key_pool = get_key_pool(groq_api_keys)
     
-    context = results
-    prompt = f""" Vous êtes un assistant utile. vous êtes integrer dans un system RAG, Utilisez le contexte suivant pour répondre à la question de l'utilisateur de manière COMPLÈTE et DÉTAILLÉE en français. IMPORTANT - FORMAT DE RÉPONSE: - Utilisez le format Markdown pour structurer votre réponse - Utilisez des titres (##, ###) pour organiser les sections - Utilisez des listes à puces ou numérotées pour les énumérations - Utilisez des tableaux Markdown pour présenter des données structurées - Mettez en **gras** les informations importantes - Utilisez des `backticks` pour le code ou les termes techniques - Assurez-vous de terminer complètement vos phrases et tableaux svp évitez de parler hors contexte. Si vous ne connaissez pas la réponse, dites simplement que vous ne savez pas. Utilisez seulement le contexte pertinent selon la question posée. Contexte: {context} Question: {query} Réponse:"""
+    prompt = build_prompt(query, results)
 
-    # Try each API key until one works
-    for key_index, api_key in enumerate(groq_api_keys):
+    # Try keys in pool order until one works
+    candidates = key_pool.candidates()
+    for attempt, api_key in enumerate(candidates):
+        label = key_pool.label(api_key)
+        groq_client = AsyncGroq(api_key=api_key)
         try:
-            groq_client = Groq(api_key=api_key)
-            
-            print(f"[INFO] Attempting with API key #{key_index + 1}")
+            logger.info(f"Attempting with API key {label}")
             
-            # Stream from Groq
-            completion = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{'role': 'user', 'content': prompt}],
-                temperature=0.6,
-                max_completion_tokens=1500,
-                stream=True
-            )
-            
-            full_response = ""
-            for chunk in completion:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_response += content
-                    # Send each token/word individually for smoother effect
-                    yield f"data: {json.dumps({'content': content, 'type': 'token'})}\n\n"
+            started = time.perf_counter()
+            first_token_at = None
+            tokens = 0
+            with key_pool.using(api_key):
+                # Stream from Groq (raw response to read the rate-limit headers)
+                raw = await groq_client.chat.completions.with_raw_response.create(
+                    model="llama-3.3-70b-versatile",
+                    messages=[{'role': 'user', 'content': prompt}],
+                    temperature=0.6,
+                    max_completion_tokens=1500,
+                    stream=True
+                )
+                key_pool.record_success(api_key, raw.headers)
+                completion = await raw.parse()
+                
+                full_response = ""
+                frames = coalescer()
+                async for chunk in completion:
+                    if chunk.choices[0].delta.content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        tokens += 1
+                        content = chunk.choices[0].delta.content
+                        full_response += content
+                        content = frames.add(content)
+                        if content:
+                            yield {'content': content, 'type': 'token'}
+                content = frames.flush()
+                if content:
+                    yield {'content': content, 'type': 'token'}
+            observe_generation(started, first_token_at, tokens, timer)
             
             # Send completion signal
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield {'type': 'done'}
             
             # Send sources separately
-            formatted_sources = [s.split('/')[-1] for s in valid_sources if s]
-            yield f"data: {json.dumps({'sources': formatted_sources, 'type': 'sources'})}\n\n"
+            formatted_sources = await asyncio.to_thread(_display_names, valid_sources)
+            yield {'sources': formatted_sources, 'type': 'sources'}
             
-            # Save to database
-            try:
-                print(f"[INFO] Saving chat to database...")
-                
-                ChatHistory.objects.create(
-                    user=user,
-                    query=query,
-                    response=full_response,
-                    sources=', '.join(valid_sources),
-                    sources_json=formatted_sources
-                )
-                
-                print(f"[SUCCESS] Chat saved!")
-                
-                profile = user.profile
-                profile.total_queries = user.chat_history.count()
-                profile.save()
-                
-                print(f"[SUCCESS] Profile updated. Total: {profile.total_queries}")
-            except Exception as e:
-                print(f"[ERROR] Failed to save: {e}")
-                import traceback
-                traceback.print_exc()
+            semantic_cache.store(query_embedding, full_response, valid_sources, query)
+
+            # Save to database, for every user who joined this answer
+            await asave_flight_history(user, query, full_response, valid_sources, timer, flight)
+
+            yield metadata_event(timer, "answered")
                         
             # Success - exit the retry loop
             return
         
         except RateLimitError as e:
-            print(f"[WARNING] Rate limit hit on API key #{key_index + 1}")
+            key_pool.record_rate_limit(api_key, e.response.headers)
+            logger.warning(f"Rate limit hit on API key {label}")
             
             # If this isn't the last key, try the next one
-            if key_index < len(groq_api_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 # All keys exhausted
                 error_msg = "Désolé, tous les clés API ont atteint leur limite. Veuillez réessayer plus tard."
-                yield f"data: {json.dumps({'content': error_msg, 'done': True})}\n\n"
+                yield {'content': error_msg, 'done': True}
+                yield metadata_event(timer, "error")
                 return
         
         except APIError as e:
-            print(f"[ERROR] API error on key #{key_index + 1}: {str(e)}")
+            key_pool.record_error(api_key)
+            logger.error(f"API error on key {label}: {str(e)}")
             
             # If this isn't the last key, try the next one
-            if key_index < len(groq_api_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 error_msg = f"Erreur API: {str(e)}"
-                yield f"data: {json.dumps({'content': error_msg, 'done': True})}\n\n"
+                yield {'content': error_msg, 'done': True}
+                yield metadata_event(timer, "error")
                 return
         
         except Exception as e:
-            print(f"[ERROR] Stream generation error on key #{key_index + 1}: {e}")
+            key_pool.record_error(api_key)
+            logger.error(f"Stream generation error on key {label}: {e}")
             
             # If this isn't the last key, try the next one
-            if key_index < len(groq_api_keys) - 1:
-                print(f"[INFO] Switching to next API key...")
+            if attempt < len(candidates) - 1:
+                logger.info("Switching to next API key...")
                 continue
             else:
                 error_msg = f"Erreur lors de la génération: {str(e)}"
-                yield f"data: {json.dumps({'content': error_msg, 'done': True})}\n\n"
+                yield {'content': error_msg, 'done': True}
+                yield metadata_event(timer, "error")
                 return
+
+        finally:
+            await groq_client.close()
     
     # Fallback if loop completes without return (shouldn't happen)
     error_msg = "Impossible de traiter votre demande. Veuillez réessayer."
-    yield f"data: {json.dumps({'content': error_msg, 'done': True})}\n\n"
+    yield {'content': error_msg, 'done': True}
+    yield metadata_event(timer, "error")
 # ============================================================================
 # User Profile & History Views (Protected)
 # ============================================================================
@@ -494,13 +673,9 @@ def profile_view(request):
     """Display user profile and statistics"""
     user = request.user
     
-    # Get or create profile
+    # Get or create profile (total_queries is kept up to date on every chat)
     profile, created = UserProfile.objects.get_or_create(user=user)
     
-    # Update query count
-    profile.total_queries = user.chat_history.count()
-    profile.save()
-    
     # Get chat history
     chat_history = user.chat_history.all()[:20]
     
@@ -514,14 +689,25 @@ def profile_view(request):
     return render(request, 'chatbot/profile.html', context)
 
 
+HISTORY_PAGE_SIZE = 20
+
+
 @login_required(login_url='chat_app:login')
 def history_view(request):
-    """Display user's complete chat history"""
-    chat_history = request.user.chat_history.all()
+    """Display user's chat history, newest first, one keyset page at a time"""
+    cursor = request.GET.get('cursor')
+    chat_history, next_cursor = keyset_page(
+        request.user.chat_history.only('id', 'query', 'response', 'sources', 'created_at'),
+        cursor=cursor,
+        limit=HISTORY_PAGE_SIZE
+    )
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     context = {
         'chat_history': chat_history,
-        'total_queries': chat_history.count(),
+        'total_queries': profile.total_queries,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     }
     
     return render(request, 'chatbot/history.html', context)
@@ -599,29 +785,135 @@ def change_password_view(request):
 
 @login_required(login_url='chat_app:login')
 def get_chat_history_json(request):
-    """Return chat history as JSON for AJAX requests (for sidebar)"""
+    """
+    Sidebar history as JSON: titles only (no response bodies), keyset-paginated.
+    Pass the returned next_cursor as ?cursor= to get older chats.
+    """
     try:
-        limit = int(request.GET.get('limit', 50))
-        offset = int(request.GET.get('offset', 0))
-        
-        chats = request.user.chat_history.all()[offset:offset+limit]
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+        
+        chats, next_cursor = keyset_page(
+            request.user.chat_history
+            .annotate(title=Substr('query', 1, 100))  # Truncate for sidebar display
+            .values('id', 'title', 'created_at'),
+            cursor=request.GET.get('cursor'),
+            limit=limit
+        )
         
         data = [{
-            'id': chat.id,
-            'query': chat.query[:100],  # Truncate for sidebar display
-            'response': chat.response,
-            'sources': chat.sources,
-            'created_at': chat.created_at.isoformat(),
-            'timestamp': int(chat.created_at.timestamp() * 1000)  # JavaScript timestamp
+            'id': chat['id'],
+            'query': chat['title'],
+            'created_at': chat['created_at'].isoformat(),
+            'timestamp': int(chat['created_at'].timestamp() * 1000)  # JavaScript timestamp
         } for chat in chats]
         
+        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        
         return JsonResponse({
             'success': True,
             'chats': data,
-            'total': request.user.chat_history.count()
+            'next_cursor': next_cursor,
+            'total': profile.total_queries
         })
     except Exception as e:
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@login_required(login_url='chat_app:login')
+def get_chat_json(request, chat_id):
+    """Full body of one chat, loaded when it is opened from the sidebar"""
+    chat = request.user.chat_history.filter(id=chat_id).values(
+        'id', 'query', 'response', 'sources', 'sources_json', 'created_at'
+    ).first()
+    if chat is None:
+        return JsonResponse({'success': False, 'error': 'Conversation introuvable'}, status=404)
+    
+    chat['created_at'] = chat['created_at'].isoformat()
+    return JsonResponse({'success': True, 'chat': chat})
+
+
+@staff_member_required
+def cache_stats(request):
+    """Semantic cache hit/miss counters (staff only)"""
+    return JsonResponse({
+        'success': True,
+        'enabled': settings.SEMANTIC_CACHE_ENABLED,
+        'cache': semantic_cache.stats()
+    })
+
+
+@staff_member_required
+def rerank_stats(request):
+    """Rerank timings and score distribution (staff only)"""
+    return JsonResponse({
+        'success': True,
+        'enabled': settings.RERANK_ENABLED,
+        'rerank': get_reranker().stats()
+    })
+
+
+@staff_member_required
+def key_pool_stats(request):
+    """Per-key Groq usage and cooldown state (staff only)"""
+    return JsonResponse({
+        'success': True,
+        'keys': get_key_pool(settings.GROQ_API_KEY).stats()
+    })
+
+
+@staff_member_required
+def chat_writer_stats(request):
+    """Background chat writer queue and batch counters (staff only)"""
+    return JsonResponse({
+        'success': True,
+        'enabled': settings.CHAT_WRITE_BATCHING,
+        'writer': chat_writer.stats()
+    })
+
+
+@never_cache
+def health(request):
+    """Readiness of the chatbot components, without triggering the loading"""
+    readiness = apps.get_app_config('chat_app').readiness()
+    return JsonResponse(readiness, status=200 if readiness['state'] == 'ready' else 503)
+
+
+def _metrics_allowed(request):
+    """Staff session, or the METRICS_TOKEN bearer token of a Prometheus scraper"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@never_cache
+def metrics(request):
+    """Per-process stage latency histograms and counters in Prometheus text format (staff or token only)"""
+    if not _metrics_allowed(request):
+        response = HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    cache = semantic_cache.stats()
+    writer = chat_writer.stats()
+    timetable = timetable_index.stats()
+    streams = stream_registry.stats()
+    ready = apps.get_app_config('chat_app').readiness()['state'] == 'ready'
+    body = registry.render({
+        'ensa_chatbot_ready': ('gauge', "1 when the models and Qdrant are loaded", int(ready)),
+        'ensa_chatbot_semantic_cache_entries': ('gauge', "Answers held by the semantic cache", cache['entries']),
+        'ensa_chatbot_semantic_cache_hits_total': ('counter', "Semantic cache hits", cache['hits']),
+        'ensa_chatbot_semantic_cache_misses_total': ('counter', "Semantic cache misses", cache['misses']),
+        'ensa_chatbot_timetable_answers_total': ('counter', "Questions answered by the timetable engine", timetable['hits']),
+        'ensa_chatbot_sse_streams_active': ('gauge', "Answers being streamed", streams['active']),
+        'ensa_chatbot_sse_resumes_total': ('counter', "Streams resumed with Last-Event-ID", streams['resumed']),
+        'ensa_chatbot_answers_in_flight': ('gauge', "Answers being generated that identical questions can join", streams['in_flight']),
+        'ensa_chatbot_coalesced_requests_total': ('counter', "Questions served by an identical in-flight answer", streams['coalesced']),
+        'ensa_chatbot_sse_events_total': ('counter', "SSE events sent by finished streams", streams['events']),
+        'ensa_chatbot_sse_bytes_total': ('counter', "SSE bytes sent by finished streams", streams['bytes']),
+        'ensa_chatbot_chat_writes_pending': ('gauge', "Chat exchanges waiting for the background writer", writer['pending']),
+        'ensa_chatbot_chat_writes_failed_total': ('counter', "Chat exchanges that could not be saved", writer['failed']),
+    })
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ensa_chatbot.settings')
 
 application = get_asgi_application()
+
+# Load the embedding model and Qdrant in the background so the first request
+# does not pay for it (management commands never import this module)
+if os.getenv('CHATBOT_WARMUP', 'True').lower() == 'true':
+    from django.apps import apps
+    apps.get_app_config('chat_app').warm_up(background=True)
@@ -26,10 +26,29 @@ else:
     QDRANT_URL = None
     QDRANT_API_KEY = None
 
+# "embedded" runs Qdrant in-process on QDRANT_PATH (no server, no network hop);
+# otherwise "cloud" or "server" following QDRANT_USE_CLOUD
+QDRANT_MODE = os.getenv("QDRANT_MODE", "cloud" if QDRANT_USE_CLOUD else "server").lower()
+
 COLLECTION_NAME = "ENSA_chatbot"
 
+# Vector quantization of the collection: "none", "scalar" (int8) or "binary" (1 bit per dimension);
+# applied by reindex. Quantized searches fetch QDRANT_OVERSAMPLING × top_k candidates and
+# rescore them with the original vectors (kept on disk)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION = None if QDRANT_QUANTIZATION == "none" else QDRANT_QUANTIZATION
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", 3.0 if QDRANT_QUANTIZATION == "binary" else 2.0))
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR.parent / 'data' / 'data_final'
+# Storage folder of the embedded Qdrant (QDRANT_MODE=embedded)
+QDRANT_PATH = Path(os.getenv("QDRANT_PATH", BASE_DIR / 'qdrant_data'))
+# Record of the points currently indexed (used for incremental re-indexing)
+INDEX_MANIFEST_PATH = Path(os.getenv("INDEX_MANIFEST_PATH", BASE_DIR / 'index_manifest.json'))
+# BM25 index over the same chunks (hybrid search mode)
+LEXICAL_INDEX_PATH = Path(os.getenv("LEXICAL_INDEX_PATH", BASE_DIR / 'lexical_index.json'))
+# Category centroids of the local query router (routed search mode)
+ROUTER_PATH = Path(os.getenv("ROUTER_PATH", BASE_DIR / 'category_router.json'))
 
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-your-secret-key-here')
 
@@ -81,9 +100,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections between requests instead of reopening the file each time
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL: readers no longer block on the writer; wait instead of failing with "database is locked"
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Chat history is written by a background thread in batches (off the response path)
+CHAT_WRITE_BATCHING = os.getenv("CHAT_WRITE_BATCHING", "True").lower() == "true"
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 50))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", 0.2))  # seconds
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -122,6 +155,79 @@ QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
 COLLECTION_NAME = "ENSA_chatbot"
 
+# Retrieval mode used by the query views: default | routed | expand | hybrid | self | multi
+SEARCH_MODE = os.getenv("SEARCH_MODE", "multi")
+
+# 'routed' mode: filter on the nearest category centroids when the best one scores at least
+# ROUTER_MIN_SCORE and at most ROUTER_MAX_CATEGORIES lie within ROUTER_MARGIN of it;
+# otherwise search unfiltered
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", 0.3))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", 0.02))
+ROUTER_MAX_CATEGORIES = int(os.getenv("ROUTER_MAX_CATEGORIES", 2))
+
+# Chunks retrieved per query, then de-duplicated and packed into at most
+# CONTEXT_TOKEN_BUDGET tokens of LLM context (0 disables the packing)
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", 5))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 900))
+
+# Recognizable timetable questions are answered from the indexed emploi-temps files, without LLM
+TIMETABLE_FAST_PATH = os.getenv("TIMETABLE_FAST_PATH", "True").lower() == "true"
+
+# Streamed answers: Groq deltas are grouped into one SSE event every SSE_COALESCE_MS ms or
+# SSE_COALESCE_CHARS characters (0 ms: one event per delta); events of the last
+# SSE_RESUME_BUFFER positions stay replayable SSE_RESUME_TTL seconds after the end
+# (Last-Event-ID); idle streams send a keep-alive comment every SSE_HEARTBEAT_SECONDS
+SSE_COALESCE_MS = int(os.getenv("SSE_COALESCE_MS", 50))
+SSE_COALESCE_CHARS = int(os.getenv("SSE_COALESCE_CHARS", 64))
+SSE_RESUME_BUFFER = int(os.getenv("SSE_RESUME_BUFFER", 512))
+SSE_RESUME_TTL = int(os.getenv("SSE_RESUME_TTL", 120))  # seconds
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+
+# Identical streamed questions (same normalized text and SEARCH_MODE) arriving while one
+# is being answered share its retrieval and generation instead of starting their own
+STREAM_COALESCING = os.getenv("STREAM_COALESCING", "True").lower() == "true"
+
+# Cross-encoder reranking of over-fetched candidates (default/hybrid/expand modes)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "antoinelouis/crossencoder-camembert-base-mmarcoFR")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", 300))
+
+# /metrics/ is served to staff sessions, and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Semantic answer cache (similar questions reuse the generated answer)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 3600))  # seconds
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+
+# Sentence embedding model and CPU inference backend:
+# "torch" (full precision), "int8" (PyTorch dynamic quantization),
+# "onnx" (ONNX Runtime) or "onnx-int8" (quantized ONNX, exported once into EMBEDDING_ONNX_DIR)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "dangvantuan/sentence-camembert-base")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR", BASE_DIR / 'onnx_models'))
+
+# Logs of the chatbot go through a queue: a listener thread writes them, not the request
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queued_console': {
+            '()': 'chat_app.log.QueueStreamHandler',
+            'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        },
+    },
+    'loggers': {
+        'chat_app': {
+            'handlers': ['queued_console'],
+            'level': os.getenv("CHATBOT_LOG_LEVEL", "INFO"),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Login/Logout URLs
 LOGIN_URL = 'chat_app:login'
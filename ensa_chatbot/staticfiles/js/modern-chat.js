@@ -254,83 +254,67 @@ async function handleSubmit(e) {
     isTyping = true;
     
     try {
-        // Create EventSource for streaming
-        const response = await fetch('/query/stream/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': window.csrfToken
-            },
-            body: JSON.stringify({ query: query })
-        });
-        
-        hideTypingIndicator();
-        
-        if (!response.ok) {
-            throw new Error('Request failed');
-        }
-        
-        // Create bot message container
-        const messageDiv = createBotMessageContainer();
-        const textElement = messageDiv.querySelector('.message-text');
-        
-        // Read stream
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
-        let fullText = '';
-        let sources = null;
-        
-        while (true) {
-            const { done, value } = await reader.read();
-            
-            if (done) break;
-            
-            buffer += decoder.decode(value, { stream: true });
-            const lines = buffer.split('\n');
-            buffer = lines.pop();
-            
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    try {
-                        const data = JSON.parse(line.slice(6));
-                        
-                        // Handle token streaming
-                        if (data.type === 'token' && data.content) {
-                            fullText += data.content;
-                            textElement.innerHTML = renderMarkdown(fullText);
-                            scrollToBottom();
-                        }
-                        
-                        // Handle sources
-                        else if (data.type === 'sources' && data.sources) {
-                            sources = data.sources;
-                        }
-                        
-                        // Handle completion
-                        else if (data.type === 'done') {
-                            if (sources && sources.length > 0) {
-                                const contentDiv = messageDiv.querySelector('.message-content');
-                                const sourcesDiv = document.createElement('div');
-                                sourcesDiv.className = 'message-sources';
-                                sourcesDiv.innerHTML = `
-                                    <strong>📚 Sources:</strong>
-                                    ${sources.map(s => `<span class="source-tag">${escapeHtml(s)}</span>`).join('')}
-                                `;
-                                contentDiv.appendChild(sourcesDiv);
-                            }
-                            
-                            highlightCodeBlocks(messageDiv);
-                            addCopyButtons(messageDiv);
-                            addMessageActions(messageDiv, query, fullText);
-                        }
-                    } catch (e) {
-                        console.error('Parse error:', e);
+        const state = { fullText: '', sources: null, lastEventId: null, complete: false };
+        let messageDiv = null;
+
+        for (let attempt = 0; ; attempt++) {
+            try {
+                // A reconnection sends Last-Event-ID: the server resumes the same answer
+                const headers = {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': window.csrfToken
+                };
+                if (state.lastEventId) {
+                    headers['Last-Event-ID'] = state.lastEventId;
+                }
+                const response = await fetch('/query/stream/', {
+                    method: 'POST',
+                    headers: headers,
+                    body: JSON.stringify({ query: query })
+                });
+
+                hideTypingIndicator();
+
+                // The answer being resumed is gone (expired or on another worker):
+                // drop the partial text and ask for the whole answer again
+                if (response.status === 410 && state.lastEventId) {
+                    console.warn('Stream expired, restarting the answer');
+                    state.fullText = '';
+                    state.sources = null;
+                    state.lastEventId = null;
+                    if (messageDiv) {
+                        messageDiv.querySelector('.message-text').innerHTML = '';
+                    }
+                    if (attempt >= STREAM_MAX_RETRIES) {
+                        throw new Error('Stream expired');
                     }
+                    continue;
+                }
+
+                if (!response.ok) {
+                    throw new Error('Request failed');
+                }
+
+                // Create bot message container
+                if (!messageDiv) {
+                    messageDiv = createBotMessageContainer();
+                }
+                await readStream(response, messageDiv, query, state);
+
+                if (!state.complete) {
+                    throw new Error('Stream interrupted');
+                }
+                break;
+            } catch (error) {
+                // Connection lost mid-answer: retry from the last event received
+                if (!state.lastEventId || state.complete || attempt >= STREAM_MAX_RETRIES) {
+                    throw error;
                 }
+                console.warn('Stream interrupted, resuming...', error);
+                await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
             }
         }
-        
+
         isTyping = false;
         loadChatHistory();
         
@@ -344,6 +328,81 @@ async function handleSubmit(e) {
     focusInput();
 }
 
+const STREAM_MAX_RETRIES = 3;
+
+// Read the SSE events of an answer into messageDiv; `state` survives reconnections
+async function readStream(response, messageDiv, query, state) {
+    const textElement = messageDiv.querySelector('.message-text');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (line.startsWith('id: ')) {
+                state.lastEventId = line.slice(4);
+            }
+            else if (line.startsWith('data: ')) {
+                try {
+                    const data = JSON.parse(line.slice(6));
+
+                    // Handle token streaming
+                    if (data.type === 'token' && data.content) {
+                        state.fullText += data.content;
+                        textElement.innerHTML = renderMarkdown(state.fullText);
+                        scrollToBottom();
+                    }
+
+                    // Resumed too late for the missed tokens: the whole answer so far
+                    else if (data.type === 'replace') {
+                        state.fullText = data.content || '';
+                        textElement.innerHTML = renderMarkdown(state.fullText);
+                        scrollToBottom();
+                    }
+
+                    // Handle sources
+                    else if (data.type === 'sources' && data.sources) {
+                        state.sources = data.sources;
+                    }
+
+                    // Handle completion
+                    else if (data.type === 'done') {
+                        if (state.sources && state.sources.length > 0) {
+                            const contentDiv = messageDiv.querySelector('.message-content');
+                            const sourcesDiv = document.createElement('div');
+                            sourcesDiv.className = 'message-sources';
+                            sourcesDiv.innerHTML = `
+                                <strong>📚 Sources:</strong>
+                                ${state.sources.map(s => `<span class="source-tag">${escapeHtml(s)}</span>`).join('')}
+                            `;
+                            contentDiv.appendChild(sourcesDiv);
+                        }
+
+                        highlightCodeBlocks(messageDiv);
+                        addCopyButtons(messageDiv);
+                        addMessageActions(messageDiv, query, state.fullText);
+                    }
+
+                    // Last event of the stream
+                    if (data.type === 'metadata' || data.done === true) {
+                        state.complete = true;
+                    }
+                } catch (e) {
+                    console.error('Parse error:', e);
+                }
+            }
+        }
+    }
+}
+
 function createBotMessageContainer() {
     const container = document.getElementById('chatContainer');
     const messageDiv = document.createElement('div');
@@ -674,6 +733,11 @@ async function loadChat(chat) {
         const messages = container.querySelectorAll('.message');
         messages.forEach(msg => msg.remove());
         
+        // The sidebar only lists titles: fetch the full conversation on demand
+        const response = await fetch(`/api/history/${chat.id}/`);
+        const data = response.ok ? await response.json() : null;
+        chat = data && data.success ? data.chat : null;
+        
         // Verify we have the data
         if (!chat || !chat.query || !chat.response) {
             console.error('Invalid chat data:', chat);